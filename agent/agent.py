@@ -7,21 +7,37 @@ import os
 import re
 import json
 import shutil
-import subprocess
 import tempfile
+import time
 from pathlib import Path
 from typing import Optional, List
+from contextlib import asynccontextmanager
 from datetime import datetime
 
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from git import Repo
 from pathspec import PathSpec
 from pathspec.patterns.gitwildmatch import GitWildMatchPattern
 
+import batch_analyze
+import build_cache
+import http_pool
+import llm_router
+import metrics
+import profiling
+import project_locks
+import project_registry
+import search_index
+import shared_state
+import symbol_index
+from scheduler import run_cmd, SCHEDULER
+from patching import apply_unified_diff, diff_paths
 from license import activate_license, verify_license, load_license, start_heartbeat, get_hardware_id
 
+VERSION = "0.3.0"
 APP_ROOT = Path(os.environ.get("INFINITY_WORKDIR", str(Path.home() / ".infinity_agent"))).resolve()
 APP_ROOT.mkdir(parents=True, exist_ok=True)
 
@@ -57,13 +73,6 @@ __pycache__/
 *.pdf
 """
 
-def run_cmd(cmd: List[str], cwd: Optional[Path] = None, timeout: int = 1800) -> str:
-    p = subprocess.run(cmd, cwd=str(cwd) if cwd else None, capture_output=True, text=True, timeout=timeout)
-    out = (p.stdout or "") + (p.stderr or "")
-    if p.returncode != 0:
-        raise RuntimeError(f"Command failed: {' '.join(cmd)}\n{out[:5000]}")
-    return out
-
 def load_ignore(repo_dir: Path) -> PathSpec:
     patterns = [line.strip() for line in DEFAULT_IGNORE.splitlines() if line.strip()]
     gitignore = repo_dir / ".gitignore"
@@ -78,16 +87,23 @@ def load_ignore(repo_dir: Path) -> PathSpec:
 def safe_list_files(repo_dir: Path, max_files: int = 4000) -> List[str]:
     spec = load_ignore(repo_dir)
     files = []
-    for p in repo_dir.rglob("*"):
-        if p.is_file():
-            rel = str(p.relative_to(repo_dir)).replace("\\", "/")
+    for root, dirs, names in os.walk(repo_dir):
+        base = os.path.relpath(root, repo_dir).replace("\\", "/")
+        base = "" if base == "." else base + "/"
+        # Não desce em diretórios ignorados (node_modules, .venv...)
+        dirs[:] = sorted(d for d in dirs if not spec.match_file(base + d + "/"))
+        for name in sorted(names):
+            rel = base + name
             if spec.match_file(rel):
                 continue
-            if p.stat().st_size > 2_000_000:
+            try:
+                if os.path.getsize(os.path.join(root, name)) > 2_000_000:
+                    continue
+            except OSError:
                 continue
             files.append(rel)
             if len(files) >= max_files:
-                break
+                return sorted(files)
     return sorted(files)
 
 def detect_stack(repo_dir: Path) -> dict:
@@ -128,6 +144,7 @@ class ApplyPatch(BaseModel):
 
 class RunTests(BaseModel):
     project_id: str
+    package: Optional[str] = None  # sub-project path in a monorepo
 
 class PushGitHub(BaseModel):
     project_id: str
@@ -161,7 +178,21 @@ class BackupRestore(BaseModel):
 
 # ── App ──
 
-app = FastAPI(title="GenLab Engine Agent", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    llm_router.ROUTER.start_health_checks()
+    llm_router.ROUTER.warm_up_background(get_llm_config())
+    yield
+    llm_router.ROUTER.stop_health_checks()
+    llm_metrics.flush()
+    batch_analyze.shutdown()
+    project_locks.shutdown()
+    await http_pool.close_clients()
+
+app = FastAPI(title="GenLab Engine Agent", version=VERSION, lifespan=lifespan)
+
+app.add_middleware(profiling.ProfilingMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -179,17 +210,69 @@ def project_path(project_id: str) -> Path:
         raise HTTPException(404, f"Project '{project_id}' not found")
     return p
 
+def package_path(repo_dir: Path, package: Optional[str]) -> Path:
+    """Sub-project directory inside a monorepo (see analysis["packages"])."""
+    if not package:
+        return repo_dir
+    p = (repo_dir / package).resolve()
+    if not str(p).startswith(str(repo_dir)):
+        raise HTTPException(400, "Invalid package path")
+    if not p.is_dir():
+        raise HTTPException(404, f"Package '{package}' not found")
+    return p
+
 
 # ── Endpoints ──
 
 @app.get("/health")
 def health():
-    return {"ok": True, "workdir": str(APP_ROOT), "version": "0.3.0"}
+    return {"ok": True, "workdir": str(APP_ROOT), "version": VERSION,
+            "uptime_s": round(time.time() - metrics.STARTED_AT, 1),
+            "pid": os.getpid(), "workers": shared_state.WORKERS}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus text exposition: HTTP latency/sizes, subprocesses, pools, locks, caches, LLM."""
+    return PlainTextResponse(metrics.render(VERSION), media_type="text/plain; version=0.0.4")
+
+@app.get("/v1/scheduler/stats")
+def scheduler_stats():
+    """Queue depth, wait times and free capacity of the subprocess scheduler."""
+    return SCHEDULER.stats()
+
+@app.get("/v1/locks/stats")
+def locks_stats():
+    """Per-project lock wait times (read/write), currently held locks and executor sizes."""
+    return project_locks.LOCKS.stats()
+
+@app.get("/v1/profiles")
+async def profiles_list():
+    """Saved request profiles (newest first). Enable with PROFILING_ENABLED=1, then send X-Profile: 1."""
+    return {"enabled": profiling.ENABLED, "profiles": await project_locks.run_io(profiling.list_profiles)}
+
+@app.get("/v1/profiles/{profile_id}")
+def profile_get(profile_id: str):
+    """Profile summary: request, duration and the hottest frames (self and inclusive)."""
+    p = profiling.profile_path(profile_id, ".json")
+    if p is None:
+        raise HTTPException(404, f"Profile '{profile_id}' not found")
+    return json.loads(p.read_text(encoding="utf-8"))
+
+@app.get("/v1/profiles/{profile_id}/collapsed")
+def profile_collapsed(profile_id: str):
+    """Collapsed stacks ("a;b;c count") for flamegraph.pl or speedscope."""
+    p = profiling.profile_path(profile_id, ".collapsed")
+    if p is None:
+        raise HTTPException(404, f"Profile '{profile_id}' not found")
+    return FileResponse(p, media_type="text/plain", filename=p.name)
 
 @app.post("/v1/import/github")
-def import_github(req: ImportGitHub):
+async def import_github(req: ImportGitHub):
     pid = req.project_name or f"proj_{next(tempfile._get_candidate_names())}"
     dest = (APP_ROOT / "projects" / pid).resolve()
+    return await project_locks.writing(dest, _import_github, req, pid, dest, long=True)
+
+def _import_github(req: ImportGitHub, pid: str, dest: Path) -> dict:
     if dest.exists():
         raise HTTPException(409, "Project already exists")
     dest.parent.mkdir(parents=True, exist_ok=True)
@@ -200,28 +283,52 @@ def import_github(req: ImportGitHub):
 
     Repo.clone_from(url, dest, branch=req.branch or None)
     files = safe_list_files(dest)
-    return {"project_id": pid, "stack": detect_stack(dest), "files_count": len(files)}
+    stack = detect_stack(dest)
+    # Credenciais embutidas na URL não vão para o registro
+    project_registry.register("imported", pid, origin=re.sub(r"://[^/@]+@", "://", req.repo_url), stack=stack["type"])
+    return {"project_id": pid, "stack": stack, "files_count": len(files)}
 
 @app.post("/v1/import/zip")
 async def import_zip(file: UploadFile = File(...)):
     pid = f"zip_{next(tempfile._get_candidate_names())}"
     dest = (APP_ROOT / "projects" / pid).resolve()
+    data = await file.read()
+    return await project_locks.writing(dest, _import_zip, pid, dest, data, file.filename, long=True)
+
+def _import_zip(pid: str, dest: Path, data: bytes, filename: Optional[str]) -> dict:
     dest.mkdir(parents=True, exist_ok=True)
     tmp = dest / "upload.zip"
-    tmp.write_bytes(await file.read())
+    tmp.write_bytes(data)
     run_cmd(["bash", "-lc", f"cd '{dest}' && unzip -q upload.zip && rm upload.zip"])
     files = safe_list_files(dest)
-    return {"project_id": pid, "stack": detect_stack(dest), "files_count": len(files)}
+    stack = detect_stack(dest)
+    project_registry.register("imported", pid, origin=f"zip:{filename}", stack=stack["type"])
+    return {"project_id": pid, "stack": stack, "files_count": len(files)}
+
+@app.get("/v1/projects")
+async def list_projects(offset: int = 0, limit: int = 50, sort: str = "name"):
+    """Paginated list of imported projects, served from the project registry."""
+    try:
+        return await project_locks.run_io(project_registry.list_projects, "imported",
+                                          offset=offset, limit=limit, sort=sort)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
 
 @app.get("/v1/project/tree")
-def tree(project_id: str):
+async def tree(project_id: str):
     repo_dir = project_path(project_id)
+    return await project_locks.reading(repo_dir, _tree, project_id, repo_dir)
+
+def _tree(project_id: str, repo_dir: Path) -> dict:
     files = safe_list_files(repo_dir)
     return {"project_id": project_id, "files": files, "stack": detect_stack(repo_dir)}
 
 @app.get("/v1/project/file")
-def read_file(project_id: str, path: str):
+async def read_file(project_id: str, path: str):
     repo_dir = project_path(project_id)
+    return await project_locks.reading(repo_dir, _read_file, repo_dir, path)
+
+def _read_file(repo_dir: Path, path: str) -> dict:
     p = (repo_dir / path).resolve()
     if not str(p).startswith(str(repo_dir)):
         raise HTTPException(400, "Invalid path")
@@ -235,10 +342,42 @@ def read_file(project_id: str, path: str):
     
     return {"path": path, "content": p.read_text(errors="ignore")}
 
+@app.get("/v1/project/search")
+async def search_project(project_id: str, q: str, regex: bool = False, case_sensitive: bool = False, limit: int = 50):
+    """Search file contents (substring or regex) using the project's trigram index."""
+    repo_dir = project_path(project_id)
+    try:
+        return await project_locks.reading(repo_dir, search_index.search, repo_dir, q, regex=regex,
+                                           case_sensitive=case_sensitive, limit=max(1, min(limit, 500)))
+    except re.error as e:
+        raise HTTPException(400, f"Invalid regex: {e}")
+
+@app.get("/v1/project/symbols")
+async def project_symbols(project_id: str, name: Optional[str] = None, file: Optional[str] = None,
+                          kind: Optional[str] = None, prefix: bool = False, limit: int = 200):
+    """Symbol table lookup: definitions by name, or symbols/imports of one file."""
+    repo_dir = project_path(project_id)
+    return await project_locks.reading(repo_dir, _project_symbols, repo_dir, name, file, kind, prefix, limit)
+
+def _project_symbols(repo_dir: Path, name: Optional[str], file: Optional[str],
+                     kind: Optional[str], prefix: bool, limit: int) -> dict:
+    index = symbol_index.get_index(repo_dir)
+    if file:
+        result = index.file_symbols(file)
+        if result is None:
+            raise HTTPException(404, "File not indexed")
+        return result
+    if name:
+        return index.lookup(name, prefix=prefix, kind=kind, limit=max(1, min(limit, 2000)))
+    return index.stats()
+
 @app.get("/v1/project/files-batch")
-def read_files_batch(project_id: str, paths: str):
+async def read_files_batch(project_id: str, paths: str):
     """Read multiple files at once. paths is comma-separated."""
     repo_dir = project_path(project_id)
+    return await project_locks.reading(repo_dir, _read_files_batch, repo_dir, paths)
+
+def _read_files_batch(repo_dir: Path, paths: str) -> dict:
     result = []
     blocked = [".env", "id_rsa", ".pem", ".pfx", ".key"]
     for path in paths.split(","):
@@ -258,20 +397,28 @@ def read_files_batch(project_id: str, paths: str):
     return {"files": result}
 
 @app.post("/v1/project/write-file")
-def write_file(req: WriteFile):
+async def write_file(req: WriteFile):
     """Write a single file to the project."""
     repo_dir = project_path(req.project_id)
+    return await project_locks.writing(repo_dir, _write_file, req, repo_dir)
+
+def _write_file(req: WriteFile, repo_dir: Path) -> dict:
     p = (repo_dir / req.path).resolve()
     if not str(p).startswith(str(repo_dir)):
         raise HTTPException(400, "Invalid path")
     p.parent.mkdir(parents=True, exist_ok=True)
     p.write_text(req.content, encoding="utf-8")
+    symbol_index.notify_changed(repo_dir, [p.relative_to(repo_dir).as_posix()])
+    project_registry.touch("imported", req.project_id)
     return {"ok": True, "path": req.path}
 
 @app.post("/v1/project/write-files")
-def write_files(req: WriteMultipleFiles):
+async def write_files(req: WriteMultipleFiles):
     """Write multiple files to the project at once."""
     repo_dir = project_path(req.project_id)
+    return await project_locks.writing(repo_dir, _write_files, req, repo_dir)
+
+def _write_files(req: WriteMultipleFiles, repo_dir: Path) -> dict:
     written = []
     for f in req.files:
         path = f.get("path", "")
@@ -282,25 +429,32 @@ def write_files(req: WriteMultipleFiles):
         p.parent.mkdir(parents=True, exist_ok=True)
         p.write_text(content, encoding="utf-8")
         written.append(path)
+    symbol_index.notify_changed(repo_dir, [(repo_dir / w).resolve().relative_to(repo_dir).as_posix() for w in written])
+    project_registry.touch("imported", req.project_id)
     return {"ok": True, "written": written}
 
 @app.post("/v1/patch/apply")
-def apply_patch(req: ApplyPatch):
+async def apply_patch(req: ApplyPatch):
     repo_dir = project_path(req.project_id)
-    diff_file = repo_dir / ".infinity.patch"
-    diff_file.write_text(req.unified_diff, encoding="utf-8")
+    return await project_locks.writing(repo_dir, _apply_patch, req, repo_dir)
+
+def _apply_patch(req: ApplyPatch, repo_dir: Path) -> dict:
     try:
-        out = run_cmd(["git", "apply", ".infinity.patch"], cwd=repo_dir)
+        apply_unified_diff(repo_dir, req.unified_diff)
+        symbol_index.notify_changed(repo_dir, diff_paths(req.unified_diff))
+        project_registry.touch("imported", req.project_id)
         return {"ok": True, "message": "Patch applied with git apply"}
     except Exception as e:
         raise HTTPException(400, f"Patch failed: {e}")
-    finally:
-        if diff_file.exists():
-            diff_file.unlink()
 
 @app.post("/v1/tests/run")
-def tests(req: RunTests):
-    repo_dir = project_path(req.project_id)
+async def tests(req: RunTests):
+    root = project_path(req.project_id)
+    repo_dir = package_path(root, req.package)
+    # npm ci / venv write into the tree: serialize with writes and other runs
+    return await project_locks.writing(root, _tests, req, repo_dir, long=True)
+
+def _tests(req: RunTests, repo_dir: Path) -> dict:
     stack = detect_stack(repo_dir)["type"]
     logs = ""
     try:
@@ -323,13 +477,19 @@ def tests(req: RunTests):
                 logs += run_cmd(["bash", "-lc", "mvn -q test"], cwd=repo_dir)
         else:
             raise HTTPException(400, f"Unknown stack '{stack}': cannot run tests automatically")
-        return {"ok": True, "stack": stack, "logs": logs[-20000:]}
+        result = {"ok": True, "stack": stack, "logs": logs[-20000:]}
     except Exception as e:
-        return {"ok": False, "stack": stack, "error": str(e), "logs": logs[-20000:]}
+        result = {"ok": False, "stack": stack, "error": str(e), "logs": logs[-20000:]}
+    project_registry.record("imported", req.project_id, "test", {
+        "ok": result["ok"], "stack": stack, "package": req.package, "error": result.get("error")})
+    return result
 
 @app.post("/v1/github/push")
-def push(req: PushGitHub):
+async def push(req: PushGitHub):
     repo_dir = project_path(req.project_id)
+    return await project_locks.writing(repo_dir, _push, req, repo_dir, long=True)
+
+def _push(req: PushGitHub, repo_dir: Path) -> dict:
     repo = Repo(repo_dir)
     
     if req.branch in [h.name for h in repo.heads]:
@@ -350,38 +510,72 @@ def push(req: PushGitHub):
     return {"ok": True, "push": out}
 
 @app.post("/v1/build")
-def build(req: BuildReq):
+async def build(req: BuildReq):
     repo_dir = project_path(req.project_id)
+    return await project_locks.writing(repo_dir, _build, req, repo_dir, long=True)
+
+def _build(req: BuildReq, repo_dir: Path) -> dict:
+    try:
+        result = _run_build(req, repo_dir)
+    except Exception as e:
+        # A failure is also the project's last build; the error still reaches the client
+        error = e.detail if isinstance(e, HTTPException) else str(e)
+        project_registry.record("imported", req.project_id, "build",
+                                {"ok": False, "target": req.target, "error": str(error)})
+        raise
+    project_registry.record("imported", req.project_id, "build",
+                            {"ok": True, "target": req.target, "cached": result["cached"]})
+    return result
+
+def _run_build(req: BuildReq, repo_dir: Path) -> dict:
     out_dir = (repo_dir / "infinity_dist").resolve()
+
+    if req.target == "python-exe":
+        raise HTTPException(400, "Windows EXE build recommended via GitHub Actions (windows-latest runner).")
+    if req.target not in ("python-linux", "java"):
+        raise HTTPException(400, f"Unknown build target: {req.target}")
+
+    entry = (req.entry or "main.py") if req.target == "python-linux" else req.entry
+    key = build_cache.cache_key(build_cache.source_tree_hash(repo_dir, req.target), req.target, entry)
+    cached = build_cache.restore(key, out_dir)
+    if cached is not None:
+        return {**cached["result"], "artifact_dir": str(out_dir), "cached": True}
+
     if out_dir.exists():
         shutil.rmtree(out_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
 
     if req.target == "python-linux":
-        entry = req.entry or "main.py"
+        work = build_cache.work_dir(repo_dir, "pyinstaller")
         run_cmd(["bash", "-lc", "python3 -m venv .venv && . .venv/bin/activate && pip install -U pip pyinstaller"], cwd=repo_dir)
-        run_cmd(["bash", "-lc", f". .venv/bin/activate && pyinstaller --onefile {entry} --distpath infinity_dist"], cwd=repo_dir)
-        return {"ok": True, "artifact_dir": str(out_dir)}
-    elif req.target == "python-exe":
-        raise HTTPException(400, "Windows EXE build recommended via GitHub Actions (windows-latest runner).")
-    elif req.target == "java":
+        run_cmd(["bash", "-lc", f". .venv/bin/activate && pyinstaller --onefile {entry} --distpath infinity_dist --workpath '{work}' --specpath '{work}'"], cwd=repo_dir)
+        result = {"ok": True, "artifact_dir": str(out_dir)}
+    else:
         if (repo_dir / "pom.xml").exists():
             run_cmd(["bash", "-lc", "mvn -q package -DskipTests"], cwd=repo_dir)
+            jars = (repo_dir / "target").glob("*.jar")
         elif (repo_dir / "gradlew").exists():
             run_cmd(["bash", "-lc", "./gradlew build -x test"], cwd=repo_dir)
+            jars = (repo_dir / "build" / "libs").glob("*.jar")
         else:
             raise HTTPException(400, "No Maven/Gradle build file found")
-        return {"ok": True, "message": "Java package built. Use jpackage on target OS for installer."}
-    else:
-        raise HTTPException(400, f"Unknown build target: {req.target}")
+        for jar in jars:
+            shutil.copy2(jar, out_dir / jar.name)
+        result = {"ok": True, "message": "Java package built. Use jpackage on target OS for installer."}
+
+    build_cache.store(key, out_dir, target=req.target, entry=entry, result=result)
+    return {**result, "cached": False}
 
 
 # ── Backup / Restore ──
 
 @app.post("/v1/backup/create")
-def backup_create(req: BackupCreate):
+async def backup_create(req: BackupCreate):
     """Create a snapshot backup of the project."""
     repo_dir = project_path(req.project_id)
+    return await project_locks.reading(repo_dir, _backup_create, req, repo_dir)
+
+def _backup_create(req: BackupCreate, repo_dir: Path) -> dict:
     ts = datetime.now().strftime("%Y%m%d_%H%M%S")
     label = req.label or "manual"
     label_safe = re.sub(r'[^a-zA-Z0-9_-]', '_', label)[:40]
@@ -418,8 +612,11 @@ def backup_create(req: BackupCreate):
     return meta
 
 @app.get("/v1/backup/list")
-def backup_list(project_id: str):
+async def backup_list(project_id: str):
     """List all backups for a project."""
+    return await project_locks.run_io(_backup_list, project_id)
+
+def _backup_list(project_id: str) -> dict:
     backups = []
     for d in sorted(BACKUPS_ROOT.iterdir(), reverse=True):
         if not d.is_dir():
@@ -432,7 +629,7 @@ def backup_list(project_id: str):
     return {"backups": backups}
 
 @app.post("/v1/backup/restore")
-def backup_restore(req: BackupRestore):
+async def backup_restore(req: BackupRestore):
     """Restore a project from a backup. Creates an auto-backup first."""
     repo_dir = project_path(req.project_id)
     backup_dir = (BACKUPS_ROOT / req.backup_id).resolve()
@@ -440,10 +637,12 @@ def backup_restore(req: BackupRestore):
         raise HTTPException(400, "Invalid backup id")
     if not backup_dir.exists():
         raise HTTPException(404, "Backup not found")
-    
-    # Auto-backup before restore
+    return await project_locks.writing(repo_dir, _backup_restore, req, repo_dir, backup_dir)
+
+def _backup_restore(req: BackupRestore, repo_dir: Path, backup_dir: Path) -> dict:
+    # Auto-backup before restore (already under the write lock)
     auto_req = BackupCreate(project_id=req.project_id, label="pre-restore-auto")
-    backup_create(auto_req)
+    _backup_create(auto_req, repo_dir)
     
     # Restore: remove current files (except .git) and copy backup
     spec = load_ignore(repo_dir)
@@ -466,17 +665,18 @@ def backup_restore(req: BackupRestore):
             shutil.copy2(p, dest)
             files_restored += 1
     
+    project_registry.touch("imported", req.project_id)
     return {"ok": True, "files_restored": files_restored}
 
 @app.delete("/v1/backup/delete")
-def backup_delete(backup_id: str):
+async def backup_delete(backup_id: str):
     """Delete a backup."""
     backup_dir = (BACKUPS_ROOT / backup_id).resolve()
     if not str(backup_dir).startswith(str(BACKUPS_ROOT)):
         raise HTTPException(400, "Invalid backup id")
     if not backup_dir.exists():
         raise HTTPException(404, "Backup not found")
-    shutil.rmtree(backup_dir)
+    await project_locks.run_io(shutil.rmtree, backup_dir)
     return {"ok": True}
 
 
@@ -509,19 +709,30 @@ def api_license_status():
 from project_analyzer import analyze_project as _analyze_project
 from code_generator import (
     recreate_project as _recreate_project,
+    recreate_project_stream as _recreate_project_stream,
     get_llm_config,
-    call_llm,
     GENERATED_ROOT,
 )
+import llm_cache
+import llm_metrics
+from chunked_recreate import recreate_project_chunked as _recreate_project_chunked, should_chunk as _should_chunk
+from auto_fix import auto_fix_project as _auto_fix_project
 from runner import run_project as _run_project, build_installer as _build_installer
 
 
 class AnalyzeReq(BaseModel):
     project_id: str
 
+class AnalyzeBatchReq(BaseModel):
+    project_ids: List[str]
+
 class RecreateReq(BaseModel):
     project_id: str
     output_name: Optional[str] = None
+    use_cache: bool = True
+    chunked: Optional[bool] = None  # None: decide pelo tamanho do código
+    parallelism: Optional[int] = None
+    package: Optional[str] = None  # recria só um subprojeto do monorepo
 
 class RunProjectReq(BaseModel):
     project_id: str
@@ -533,6 +744,20 @@ class BuildInstallerReq(BaseModel):
 
 class AutoFixReq(BaseModel):
     project_id: str
+    use_cache: bool = True
+    max_rounds: Optional[int] = None
+    parallelism: Optional[int] = None
+    edit_mode: Optional[str] = None  # "diff" | "search-replace" | "whole"
+
+class LLMBackend(BaseModel):
+    name: Optional[str] = None
+    base_url: str
+    provider: str = "ollama"
+    models: List[str] = []
+    max_concurrent: int = 2
+
+class LLMBackendsReq(BaseModel):
+    backends: List[LLMBackend]
 
 class LLMConfigReq(BaseModel):
     provider: str = "ollama"
@@ -541,151 +766,216 @@ class LLMConfigReq(BaseModel):
 
 
 @app.post("/v1/genlab/analyze")
-def genlab_analyze(req: AnalyzeReq):
+async def genlab_analyze(req: AnalyzeReq):
     """Analisa e classifica um projeto."""
     repo_dir = project_path(req.project_id)
-    analysis = _analyze_project(repo_dir)
+    analysis = await project_locks.reading(repo_dir, _analyze_project, repo_dir)
     analysis["project_id"] = req.project_id
+    await project_locks.run_io(project_registry.record_analysis, "imported", req.project_id, analysis)
     return analysis
 
 
+@app.post("/v1/genlab/analyze-batch")
+async def genlab_analyze_batch(req: AnalyzeBatchReq):
+    """Analisa vários projetos num pool de processos; um evento SSE por projeto, na ordem em que terminam."""
+    if len(req.project_ids) > batch_analyze.MAX_PROJECTS:
+        raise HTTPException(400, f"At most {batch_analyze.MAX_PROJECTS} projects per batch")
+    start = time.monotonic()
+    items, invalid = [], []
+    for pid in dict.fromkeys(req.project_ids):
+        try:
+            items.append((pid, project_path(pid)))
+        except HTTPException as e:
+            invalid.append({"event": "error", "project_id": pid, "error": e.detail})
+
+    async def events():
+        errors = len(invalid)
+        for ev in invalid:
+            yield f"event: error\ndata: {json.dumps(ev)}\n\n"
+        async for ev in batch_analyze.analyze_many(items):
+            errors += ev["event"] == "error"
+            if ev["event"] == "result":
+                await project_locks.run_io(project_registry.record_analysis, "imported", ev["project_id"],
+                                           ev["analysis"])
+            yield f"event: {ev['event']}\ndata: {json.dumps(ev)}\n\n"
+        done = {"event": "done", "count": len(items) + len(invalid), "errors": errors,
+                "seconds": round(time.monotonic() - start, 2)}
+        yield f"event: done\ndata: {json.dumps(done)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+def _output_name(req: RecreateReq) -> str:
+    if req.package:
+        return f"genlab_{req.project_id}_" + re.sub(r"[^A-Za-z0-9_-]+", "_", req.package).strip("_")
+    return f"genlab_{req.project_id}"
+
+
 @app.post("/v1/genlab/recreate")
-def genlab_recreate(req: RecreateReq):
+async def genlab_recreate(req: RecreateReq):
     """Recria um projeto usando IA local."""
-    repo_dir = project_path(req.project_id)
-    output_name = req.output_name or f"genlab_{req.project_id}"
-    result = _recreate_project(repo_dir, output_name)
+    repo_dir = package_path(project_path(req.project_id), req.package)
+    output_name = req.output_name or _output_name(req)
+    # Trava só a pasta de saída: o lock de leitura da origem bloquearia escritas durante a chamada ao LLM
+    return await project_locks.writing(GENERATED_ROOT / output_name, _genlab_recreate, req, repo_dir, output_name,
+                                       long=True)
+
+def _genlab_recreate(req: RecreateReq, repo_dir: Path, output_name: str) -> dict:
+    chunked = req.chunked
+    if chunked is None:
+        chunked = _should_chunk(_analyze_project(repo_dir))
+    if chunked:
+        result = _recreate_project_chunked(repo_dir, output_name, parallelism=req.parallelism, use_cache=req.use_cache)
+    else:
+        result = _recreate_project(repo_dir, output_name, use_cache=req.use_cache)
+    if result.get("ok"):
+        project_registry.register("generated", output_name, origin=req.project_id,
+                                  stack=result["analysis"].get("project_type"))
     return result
 
 
+@app.post("/v1/genlab/recreate-stream")
+async def genlab_recreate_stream(req: RecreateReq):
+    """Recria um projeto gravando cada arquivo assim que sai do modelo (SSE)."""
+    repo_dir = package_path(project_path(req.project_id), req.package)
+    output_name = req.output_name or _output_name(req)
+    # Mesmo lock de /genlab/recreate, run e auto-fix, segurado até o fim do stream
+    events = project_locks.writing_stream(GENERATED_ROOT / output_name, _recreate_stream_events,
+                                          req, repo_dir, output_name)
+    return StreamingResponse(events, media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+def _recreate_stream_events(req: RecreateReq, repo_dir: Path, output_name: str):
+    stack = None
+    for ev in _recreate_project_stream(repo_dir, output_name, use_cache=req.use_cache):
+        if ev["event"] == "analysis":
+            stack = ev["analysis"].get("project_type")
+        elif ev["event"] == "done":
+            project_registry.register("generated", output_name, origin=req.project_id, stack=stack)
+        yield f"event: {ev['event']}\ndata: {json.dumps(ev)}\n\n"
+
+
 @app.get("/v1/genlab/projects")
-def genlab_list_projects():
-    """Lista projetos gerados pelo GenLab."""
-    projects = []
-    if GENERATED_ROOT.exists():
-        for d in sorted(GENERATED_ROOT.iterdir()):
-            if d.is_dir():
-                file_count = sum(1 for f in d.rglob("*") if f.is_file())
-                projects.append({
-                    "name": d.name,
-                    "dir": str(d),
-                    "file_count": file_count,
-                })
-    return {"projects": projects}
+async def genlab_list_projects(offset: int = 0, limit: int = 50, sort: str = "name"):
+    """Lista projetos gerados pelo GenLab (paginado, a partir do registro)."""
+    try:
+        page = await project_locks.run_io(project_registry.list_projects, "generated",
+                                          offset=offset, limit=limit, sort=sort)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    page["projects"] = [{"name": p["id"], **p} for p in page["projects"]]
+    return page
 
 
 @app.get("/v1/genlab/project/tree")
-def genlab_project_tree(name: str):
+async def genlab_project_tree(name: str):
     """Lista arquivos de um projeto gerado."""
     project_dir = (GENERATED_ROOT / name).resolve()
     if not str(project_dir).startswith(str(GENERATED_ROOT.resolve())):
         raise HTTPException(400, "Invalid name")
     if not project_dir.exists():
         raise HTTPException(404, "Generated project not found")
-    files = safe_list_files(project_dir)
+    files = await project_locks.reading(project_dir, safe_list_files, project_dir)
     return {"name": name, "files": files}
 
 
 @app.post("/v1/genlab/run")
-def genlab_run(req: RunProjectReq):
+async def genlab_run(req: RunProjectReq):
     """Executa um projeto gerado localmente."""
     project_dir = (GENERATED_ROOT / req.project_id).resolve()
     if not str(project_dir).startswith(str(GENERATED_ROOT.resolve())):
         raise HTTPException(400, "Invalid project id")
     if not project_dir.exists():
         raise HTTPException(404, "Generated project not found")
-    return _run_project(project_dir, req.mode)
+    result = await project_locks.writing(project_dir, _run_project, project_dir, req.mode, long=True)
+    await project_locks.run_io(project_registry.record, "generated", req.project_id, "run",
+                               {"ok": result["ok"], "mode": result.get("mode"), "error": result.get("error")})
+    return result
 
 
 @app.post("/v1/genlab/build-installer")
-def genlab_build_installer(req: BuildInstallerReq):
+async def genlab_build_installer(req: BuildInstallerReq):
     """Gera instalador (.exe/.dmg/AppImage) para o projeto."""
     project_dir = (GENERATED_ROOT / req.project_id).resolve()
     if not str(project_dir).startswith(str(GENERATED_ROOT.resolve())):
         raise HTTPException(400, "Invalid project id")
     if not project_dir.exists():
         raise HTTPException(404, "Generated project not found")
-    return _build_installer(project_dir, req.target)
+    result = await project_locks.writing(project_dir, _build_installer, project_dir, req.target, long=True)
+    await project_locks.run_io(project_registry.record, "generated", req.project_id, "build", {
+        "ok": result["ok"], "target": result.get("target"), "cached": result.get("cached"), "error": result.get("error")})
+    return result
 
 
 @app.post("/v1/genlab/auto-fix")
-def genlab_auto_fix(req: AutoFixReq):
+async def genlab_auto_fix(req: AutoFixReq):
     """Detecta erros e corrige automaticamente usando IA."""
     project_dir = (GENERATED_ROOT / req.project_id).resolve()
     if not str(project_dir).startswith(str(GENERATED_ROOT.resolve())):
         raise HTTPException(400, "Invalid project id")
     if not project_dir.exists():
         raise HTTPException(404, "Generated project not found")
-
-    errors_found = []
-    fixes_applied = 0
-    logs = ""
-
-    # 1. Try to build/lint and collect errors
     try:
-        if (project_dir / "package.json").exists():
-            try:
-                logs += run_cmd(["bash", "-lc", "npm install 2>&1"], cwd=project_dir, timeout=120)
-            except Exception as e:
-                errors_found.append(f"npm install: {str(e)[:500]}")
-            try:
-                logs += run_cmd(["bash", "-lc", "npx tsc --noEmit 2>&1 || true"], cwd=project_dir, timeout=60)
-            except Exception as e:
-                errors_found.append(f"tsc: {str(e)[:500]}")
-        elif (project_dir / "requirements.txt").exists():
-            try:
-                logs += run_cmd(["bash", "-lc", "python3 -m py_compile main.py 2>&1 || python3 -m py_compile app.py 2>&1 || true"], cwd=project_dir, timeout=30)
-            except Exception as e:
-                errors_found.append(f"python compile: {str(e)[:500]}")
+        return await project_locks.writing(project_dir, _auto_fix_project, project_dir, max_rounds=req.max_rounds,
+                                           use_cache=req.use_cache, parallelism=req.parallelism,
+                                           edit_mode=req.edit_mode, long=True)
     except Exception as e:
-        errors_found.append(str(e)[:500])
-
-    if not errors_found:
-        return {"ok": True, "fixes_applied": 0, "errors_found": [], "logs": "No errors detected!"}
-
-    # 2. Ask LLM to fix
-    error_context = "\n".join(errors_found)
-    # Read problematic files
-    source_files = []
-    for p in project_dir.rglob("*"):
-        if p.is_file() and p.stat().st_size < 50_000:
-            rel = str(p.relative_to(project_dir))
-            if any(rel.startswith(d) for d in [".git", "node_modules", ".venv", "dist"]):
-                continue
-            try:
-                source_files.append({"path": rel, "content": p.read_text(errors="ignore")})
-            except Exception:
-                continue
-            if len(source_files) >= 30:
-                break
+        # Sem errors_found: a falha pode ter vindo antes da coleta, e lista vazia diria "sem erros"
+        return {"ok": False, "error": f"LLM fix failed: {e}"}
+    finally:
+        await project_locks.run_io(project_registry.touch, "generated", req.project_id)
 
-    files_context = "\n".join(f"### {f['path']}\n```\n{f['content'][:3000]}\n```" for f in source_files[:20])
 
-    fix_prompt = f"""Corrija os seguintes erros neste projeto. Retorne APENAS o JSON com os arquivos corrigidos.
+@app.get("/v1/genlab/llm-cache")
+def genlab_llm_cache_stats():
+    """Estatísticas do cache de respostas do LLM (hits/misses, tamanho)."""
+    return llm_cache.stats()
 
-ERROS:
-{error_context}
 
-ARQUIVOS:
-{files_context}
+@app.delete("/v1/genlab/llm-cache")
+def genlab_llm_cache_clear():
+    """Esvazia o cache de respostas do LLM."""
+    return {"ok": True, "removed": llm_cache.clear()}
+
+
+@app.get("/v1/genlab/llm-metrics")
+def genlab_llm_metrics(recent: int = 50):
+    """Telemetria do LLM por modelo e endpoint: prompt, TTFT, latência, tokens/s, parse."""
+    return llm_metrics.summary(recent=recent)
 
-Responda com JSON: {{"files": [{{"path": "...", "content": "..."}}]}}
-"""
-    try:
-        response = call_llm(fix_prompt)
-        from code_generator import extract_files_json, save_generated_project
-        fixed_files = extract_files_json(response)
-        if fixed_files:
-            for f in fixed_files:
-                fp = (project_dir / f["path"]).resolve()
-                if str(fp).startswith(str(project_dir.resolve())):
-                    fp.parent.mkdir(parents=True, exist_ok=True)
-                    fp.write_text(f["content"], encoding="utf-8")
-                    fixes_applied += 1
-    except Exception as e:
-        return {"ok": False, "error": f"LLM fix failed: {e}", "errors_found": errors_found}
 
-    return {"ok": True, "fixes_applied": fixes_applied, "errors_found": errors_found, "logs": logs[-5000:]}
+@app.delete("/v1/genlab/llm-metrics")
+def genlab_llm_metrics_reset():
+    """Zera a telemetria do LLM."""
+    llm_metrics.reset()
+    return {"ok": True}
+
+
+@app.get("/v1/genlab/llm-backends")
+def genlab_llm_backends():
+    """Backends LLM configurados, com carga, latência e tokens/s."""
+    return {"backends": llm_router.ROUTER.stats(), "queue_depth": llm_router.ROUTER.queue_depth(),
+            "routing": llm_router.ROUTING}
+
+
+@app.post("/v1/genlab/llm-backends")
+def genlab_llm_backends_set(req: LLMBackendsReq):
+    """Define o pool de backends (lista vazia volta ao backend único do llm-config)."""
+    llm_router.ROUTER.configure([b.model_dump() for b in req.backends])
+    llm_router.ROUTER.warm_up_background(get_llm_config())
+    return genlab_llm_backends()
+
+
+@app.post("/v1/genlab/llm-backends/health")
+async def genlab_llm_backends_health():
+    """Força um health check em todos os backends."""
+    return {"backends": await llm_router.ROUTER.check_health()}
+
+
+@app.post("/v1/genlab/llm-warmup")
+async def genlab_llm_warmup():
+    """Carrega o modelo configurado em todos os backends e mede o tempo de carga."""
+    config = await project_locks.run_io(get_llm_config)
+    return {"results": await llm_router.ROUTER.warm_up(config)}
 
 
 @app.get("/v1/genlab/llm-config")
@@ -696,17 +986,35 @@ def genlab_llm_config_get():
 
 @app.post("/v1/genlab/llm-config")
 def genlab_llm_config_set(req: LLMConfigReq):
-    """Atualiza configuração do LLM via env vars."""
-    os.environ["LLM_PROVIDER"] = req.provider
-    os.environ["LLM_MODEL"] = req.model
+    """Atualiza configuração do LLM (estado compartilhado: vale para todos os workers)."""
+    saved = shared_state.get_setting("llm_config") or {}
+    saved.update(provider=req.provider, model=req.model)
     if req.base_url:
-        os.environ["LLM_BASE_URL"] = req.base_url
-    return get_llm_config()
+        saved["base_url"] = req.base_url
+    shared_state.set_setting("llm_config", saved)
+    config = get_llm_config()
+    llm_router.ROUTER.warm_up_background(config)
+    return config
 
 
 if __name__ == "__main__":
+    import argparse
     import uvicorn
+    parser = argparse.ArgumentParser(description="GenLab Engine Agent")
+    parser.add_argument("--workers", type=int, default=shared_state.WORKERS,
+                        help="uvicorn worker processes (state is shared through APP_ROOT)")
+    args = parser.parse_args()
     start_heartbeat()
     print("🧬 GenLab Engine running at http://127.0.0.1:8787")
     print(f"📁 Workspace: {APP_ROOT}")
-    uvicorn.run(app, host="127.0.0.1", port=8787)
+    if args.workers > 1:
+        # Workers herdam o ambiente: shared_state liga os locks e as vagas entre processos
+        os.environ["AGENT_WORKERS"] = str(args.workers)
+        print(f"⚙️  Workers: {args.workers}")
+        if not shared_state.cross_process_locks():
+            print("⚠️  No flock on this platform: project locks, LLM slots and the job queue "
+                  "are enforced per worker, so limits multiply by --workers")
+        uvicorn.run("agent:app", host="127.0.0.1", port=8787, workers=args.workers,
+                    app_dir=str(Path(__file__).resolve().parent))
+    else:
+        uvicorn.run(app, host="127.0.0.1", port=8787)
@@ -0,0 +1,322 @@
+"""
+GenLab Engine — Auto-Fix
+Loop de correção: localiza erros (arquivo:linha), envia só os arquivos
+implicados e seus imports diretos, corrige em paralelo e re-checa de forma
+incremental até N rodadas. Por padrão o modelo devolve só o diff da correção;
+o arquivo inteiro é pedido apenas quando o patch não aplica.
+"""
+import os
+import posixpath
+import re
+import shlex
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Optional
+
+import build_cache
+import context_packer
+import error_parsers
+import llm_metrics
+import llm_router
+import patching
+import profiling
+import search_index
+import symbol_index
+from code_generator import call_llm, extract_files_json, get_llm_config
+from scheduler import run_cmd
+
+
+DEFAULT_ROUNDS = int(os.environ.get("AUTOFIX_MAX_ROUNDS", "3"))
+DEFAULT_PARALLELISM = int(os.environ.get("LLM_PARALLELISM", "2"))
+EDIT_MODES = ("diff", "search-replace", "whole")
+DEFAULT_EDIT_MODE = os.environ.get("AUTOFIX_EDIT_MODE", "diff")
+MAX_TOKENS = 8000
+TSBUILDINFO = ".genlab.tsbuildinfo"
+# python -m py_compile para no primeiro arquivo com erro; este compila todos
+PY_CHECK = (
+    "import py_compile, sys\n"
+    "for f in sys.argv[1:]:\n"
+    "    try:\n"
+    "        py_compile.compile(f, doraise=True)\n"
+    "    except py_compile.PyCompileError as e:\n"
+    "        print(e.msg)\n"
+)
+SKIP_DIRS = {".git", "node_modules", ".venv", "venv", "dist", "build", "__pycache__"}
+
+_JS_IMPORT = re.compile(r"""(?:from\s*|import\s*\(?\s*|require\(\s*)['"](\.{1,2}/[^'"]+)['"]""")
+_PY_IMPORT = re.compile(r"^\s*(?:from\s+(\.*[\w.]*)\s+import\s+\(?([\w, ]+)|import\s+([\w.]+))", re.M)
+_JS_EXTS = ("", ".ts", ".tsx", ".js", ".jsx", ".d.ts", "/index.ts", "/index.tsx", "/index.js")
+# Nomes citados nas mensagens: Cannot find name 'Foo', has no exported member 'bar'...
+_QUOTED_NAME = re.compile(r"""['"`]([A-Za-z_$][\w$]{2,})['"`]""")
+
+
+def _python_files(project_dir: Path) -> List[str]:
+    out = []
+    for root, dirs, files in os.walk(project_dir):
+        dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+        for name in files:
+            if name.endswith(".py"):
+                out.append((Path(root) / name).relative_to(project_dir).as_posix())
+    return sorted(out)
+
+
+def collect_errors(project_dir: Path, changed: Optional[set] = None, install: bool = True) -> tuple:
+    """Roda as checagens e retorna (erros estruturados, logs).
+
+    changed=None: checagem completa. Caso contrário só os arquivos alterados
+    (py_compile) e tsc --incremental, que reaproveita o .tsbuildinfo.
+    """
+    errors: List[dict] = []
+    logs = ""
+    if (project_dir / "package.json").exists():
+        if install:
+            out = run_cmd(["bash", "-lc", f"{build_cache.npm_env_prefix()}npm install 2>&1 || true"],
+                          cwd=project_dir, timeout=300)
+            logs += out
+            errors += error_parsers.parse_npm(out)
+        if (project_dir / "tsconfig.json").exists():
+            out = run_cmd(["bash", "-lc", f"npx tsc --noEmit --incremental --tsBuildInfoFile {TSBUILDINFO} --pretty false 2>&1 || true"],
+                          cwd=project_dir, timeout=300)
+            logs += out
+            errors += error_parsers.parse_tsc(out, project_dir)
+    py_files = _python_files(project_dir)
+    if changed is not None:
+        py_files = [f for f in py_files if f in changed]
+    if py_files:
+        args = " ".join(shlex.quote(f) for f in py_files)
+        out = run_cmd(["bash", "-lc", f"python3 -c {shlex.quote(PY_CHECK)} {args} 2>&1 || true"], cwd=project_dir, timeout=120)
+        logs += out
+        errors += error_parsers.parse_python(out, project_dir)
+    return errors, logs
+
+
+def direct_imports(project_dir: Path, rel: str, content: str) -> List[str]:
+    """Imports locais diretos de um arquivo (relativos em JS/TS, módulos do projeto em Python)."""
+    found = []
+    base = posixpath.dirname(rel)
+    if rel.endswith((".ts", ".tsx", ".js", ".jsx", ".vue")):
+        for spec in _JS_IMPORT.findall(content):
+            target = posixpath.normpath(posixpath.join(base, spec))
+            for ext in _JS_EXTS:
+                if (project_dir / (target + ext)).is_file():
+                    found.append(target + ext)
+                    break
+    elif rel.endswith(".py"):
+        for from_mod, names, plain_mod in _PY_IMPORT.findall(content):
+            mod = from_mod or plain_mod
+            dots = len(mod) - len(mod.lstrip("."))
+            parts = [p for p in mod.lstrip(".").split(".") if p]
+            anchor = base
+            for _ in range(max(0, dots - 1)):
+                anchor = posixpath.dirname(anchor)
+            roots = [anchor] if dots else ["", base]
+            # "from pkg import util" pode ser o submódulo pkg/util.py
+            subs = [[]] + [[n.strip()] for n in names.split(",") if n.strip()]
+            for r in roots:
+                for sub in subs:
+                    stem = posixpath.join(r, *parts, *sub)
+                    for cand in (stem + ".py", posixpath.join(stem, "__init__.py")):
+                        if stem and (project_dir / cand).is_file():
+                            found.append(cand)
+                            break
+    return list(dict.fromkeys(f for f in found if f != rel))
+
+
+FIX_INSTRUCTIONS = {
+    "diff": """Retorne APENAS um unified diff (```diff) com a correção, com 3 linhas de contexto por hunk:
+```diff
+--- a/caminho/do/arquivo
++++ b/caminho/do/arquivo
+@@ ... @@
+```
+Arquivos novos usam --- /dev/null.""",
+    "search-replace": """Retorne APENAS blocos SEARCH/REPLACE com a correção (SEARCH copiado exatamente do arquivo):
+caminho/do/arquivo
+<<<<<<< SEARCH
+linhas atuais
+=======
+linhas corrigidas
+>>>>>>> REPLACE
+Arquivos novos usam SEARCH vazio.""",
+    "whole": """Retorne APENAS o JSON com o arquivo corrigido:
+{"files": [{"path": "caminho/do/arquivo", "content": "..."}]}""",
+}
+
+
+def _fix_prompt(rel: str, content: str, errors: List[dict], context: List[dict], mode: str = "whole") -> str:
+    """Conteúdo estável primeiro (instruções, imports, arquivo) e os erros no fim:
+    entre rodadas o prefixo se repete e o servidor reaproveita o KV cache."""
+    error_text = "\n".join(error_parsers.format_error(e) for e in errors)
+    ctx = "\n\n".join(f"### {f['path']} (somente leitura)\n```\n{f['content']}\n```"
+                       for f in sorted(context, key=lambda f: f["path"]))
+    return f"""Você corrige erros de compilação em um arquivo de um projeto. Altere só o necessário;
+crie arquivos novos apenas se algum import apontar para um arquivo que não existe.
+{FIX_INSTRUCTIONS[mode]}
+
+IMPORTS DIRETOS:
+{ctx or '(nenhum)'}
+
+ARQUIVO:
+### {rel}
+```
+{content}
+```
+
+ERROS:
+{error_text}
+
+Corrija os erros acima no arquivo `{rel}`.
+"""
+
+
+def _allowed(project_dir: Path, rel: str, path: str, locked: set) -> bool:
+    """Só o arquivo-alvo ou arquivos novos: evita dois workers editando o mesmo arquivo."""
+    fp = (project_dir / path).resolve()
+    if not str(fp).startswith(str(project_dir)):
+        return False
+    return path == rel or not (fp.exists() or path in locked)
+
+
+def _apply_edits(project_dir: Path, rel: str, response: str, locked: set) -> List[str]:
+    """Aplica o diff ou os blocos SEARCH/REPLACE da resposta; erro se nada aplicar."""
+    blocks = patching.parse_search_replace(response)
+    if blocks:
+        paths = list(dict.fromkeys(b["path"] for b in blocks))
+        if not all(_allowed(project_dir, rel, p, locked) for p in paths):
+            raise ValueError(f"Edit touches files outside {rel}")
+        return patching.apply_search_replace(project_dir, blocks)
+    diff = patching.extract_diff(response)
+    if not diff:
+        raise ValueError("No diff in response")
+    paths = patching.diff_paths(diff)
+    if not paths or not all(_allowed(project_dir, rel, p, locked) for p in paths):
+        raise ValueError(f"Diff touches files outside {rel}")
+    patching.apply_unified_diff(project_dir, diff, lenient=True)
+    return paths
+
+
+def _write_files(project_dir: Path, rel: str, files: list, locked: set) -> List[str]:
+    written = []
+    for f in files:
+        path = f.get("path") if isinstance(f, dict) else None
+        if not path or "content" not in f or not _allowed(project_dir, rel, path, locked):
+            continue
+        fp = (project_dir / path).resolve()
+        fp.parent.mkdir(parents=True, exist_ok=True)
+        fp.write_text(f["content"], encoding="utf-8")
+        written.append(path)
+    return written
+
+
+def _fix_file(project_dir: Path, rel: str, errors: List[dict], budget: int, max_tokens: int, use_cache: bool,
+              mode: str, locked: set) -> dict:
+    target = project_dir / rel
+    content = target.read_text(errors="ignore") if target.is_file() else ""
+    used = context_packer.estimate_tokens(content) + 400 * (1 + len(errors) // 10)
+    context = []
+    for dep in direct_imports(project_dir, rel, content):
+        dep_text = (project_dir / dep).read_text(errors="ignore")
+        cost = context_packer.estimate_tokens(dep_text) + 8
+        if used + cost > budget:
+            continue
+        context.append({"path": dep, "content": dep_text})
+        used += cost
+    # Nomes citados nos erros: primeiro onde são definidos (índice de símbolos),
+    # depois os arquivos que mais os citam (índice de busca)
+    names = [n for e in errors for n in _QUOTED_NAME.findall(e["message"])]
+    if names:
+        known = {rel, *(c["path"] for c in context)}
+        defs = [f for f in symbol_index.get_index(project_dir).definition_files(names) if f not in known][:3]
+        cited = search_index.relevant_files(project_dir, names, limit=3, exclude=known | set(defs))
+        for extra in defs + cited[:max(0, 3 - len(defs))]:
+            extra_text = (project_dir / extra).read_text(errors="ignore")
+            cost = context_packer.estimate_tokens(extra_text) + 8
+            if used + cost > budget:
+                continue
+            context.append({"path": extra, "content": extra_text})
+            used += cost
+    model = get_llm_config()["model"]
+    edit_error = ""
+    if mode != "whole" and target.is_file():
+        response = call_llm(_fix_prompt(rel, content, errors, context, mode), max_tokens=max_tokens,
+                            use_cache=use_cache, priority=llm_router.PRIORITY_INTERACTIVE, endpoint=f"auto-fix/{mode}")
+        try:
+            changed = _apply_edits(project_dir, rel, response, locked)
+            llm_metrics.record_parse(model, f"auto-fix/{mode}", True)
+            return {"path": rel, "changed": changed, "mode": mode}
+        except Exception as e:
+            # Patch não aplicou: cai para o arquivo inteiro
+            llm_metrics.record_parse(model, f"auto-fix/{mode}", False)
+            edit_error = str(e)[:300]
+    response = call_llm(_fix_prompt(rel, content, errors, context), max_tokens=max_tokens,
+                        use_cache=use_cache, priority=llm_router.PRIORITY_INTERACTIVE, endpoint="auto-fix/whole")
+    files = extract_files_json(response) or []
+    llm_metrics.record_parse(model, "auto-fix/whole", bool(files))
+    return {"path": rel, "changed": _write_files(project_dir, rel, files, locked),
+            "mode": "whole", "edit_error": edit_error}
+
+
+def auto_fix_project(project_dir: Path, max_rounds: Optional[int] = None, use_cache: bool = True,
+                     parallelism: Optional[int] = None, edit_mode: Optional[str] = None) -> dict:
+    """Loop: checa → corrige arquivos implicados em paralelo → re-checa só o que mudou."""
+    project_dir = Path(project_dir).resolve()
+    edit_mode = edit_mode or DEFAULT_EDIT_MODE
+    if edit_mode not in EDIT_MODES:
+        raise ValueError(f"Unknown edit mode: {edit_mode}")
+    max_rounds = max(1, max_rounds or DEFAULT_ROUNDS)
+    parallelism = max(1, parallelism or DEFAULT_PARALLELISM)
+    budget, max_tokens = context_packer.prompt_budget(get_llm_config()["model"], MAX_TOKENS)
+
+    errors, logs = collect_errors(project_dir)
+    initial = [error_parsers.format_error(e) for e in errors]
+    rounds = []
+    fixes_applied = 0
+
+    for n in range(1, max_rounds + 1):
+        grouped = {f: errs for f, errs in error_parsers.group_by_file(errors).items()
+                   if str((project_dir / f).resolve()).startswith(str(project_dir))}
+        if not grouped:
+            break
+        changed = set()
+        failures = []
+        modes: dict = {}
+        locked = set(grouped)
+        with ThreadPoolExecutor(max_workers=parallelism) as pool:
+            fix = profiling.follow(_fix_file)
+            futures = {pool.submit(fix, project_dir, rel, errs, budget, max_tokens, use_cache, edit_mode, locked): rel
+                       for rel, errs in grouped.items()}
+            for fut in as_completed(futures):
+                rel = futures[fut]
+                try:
+                    result = fut.result()
+                except Exception as e:
+                    failures.append({"file": rel, "error": str(e)[:300]})
+                    continue
+                changed.update(result["changed"])
+                symbol_index.notify_changed(project_dir, result["changed"])
+                modes[rel] = result["mode"]
+                if result.get("edit_error"):
+                    failures.append({"file": rel, "error": f"edit fallback: {result['edit_error']}"})
+        fixes_applied += len(changed)
+        rounds.append({"round": n, "errors": sum(len(v) for v in grouped.values()), "files": sorted(grouped),
+                       "fixed": sorted(changed), "modes": modes, "failures": failures})
+        if not changed:
+            break
+        reinstall = "package.json" in changed
+        # Erros de arquivos que não foram re-checados continuam valendo
+        carried = [e for e in errors
+                   if (e["tool"] in ("py_compile", "pyright") and e["file"] not in changed)
+                   or (e["tool"] == "npm" and not reinstall)]
+        errors, out = collect_errors(project_dir, changed=changed, install=reinstall)
+        errors = carried + errors
+        logs += out
+
+    return {
+        "ok": True,
+        "fixes_applied": fixes_applied,
+        "errors_found": initial,
+        "remaining_errors": [error_parsers.format_error(e) for e in errors],
+        "rounds": rounds,
+        "edit_mode": edit_mode,
+        "logs": logs[-5000:] if initial else "No errors detected!",
+    }
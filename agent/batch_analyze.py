@@ -0,0 +1,105 @@
+"""
+GenLab Engine — Batch Analyze
+Análise de muitos projetos num pool de processos compartilhado, com limite
+global de concorrência e resultados entregues à medida que terminam.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import AsyncIterator, List, Optional, Tuple
+
+
+WORKERS = int(os.environ.get("ANALYZE_BATCH_WORKERS", str(max(1, min(4, (os.cpu_count() or 2) // 2)))))
+MAX_PROJECTS = 500
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_slots: Optional[asyncio.Semaphore] = None
+
+
+def _analyze_one(path: str) -> dict:
+    from project_analyzer import analyze_project
+    return analyze_project(Path(path))
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: o servidor tem threads vivas, fork poderia herdar locks presos
+            _pool = ProcessPoolExecutor(max_workers=WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _discard(pool: ProcessPoolExecutor) -> None:
+    """Um processo do pool morreu (OOM, kill): o executor não serve mais, o próximo get_pool cria outro."""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def pool_map(fn, items, chunksize: int = 1) -> list:
+    """map no pool compartilhado; se o pool quebrar, recria e tenta mais uma vez."""
+    for attempt in range(2):
+        pool = get_pool()
+        try:
+            return list(pool.map(fn, items, chunksize=chunksize))
+        except BrokenProcessPool:
+            _discard(pool)
+            if attempt:
+                raise
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+async def analyze_many(items: List[Tuple[str, Path]]) -> AsyncIterator[dict]:
+    """items: [(project_id, dir)]. Yield de um evento por projeto, na ordem em que terminam.
+
+    O semáforo é global: lotes simultâneos dividem os mesmos WORKERS slots em vez
+    de enfileirar tudo no pool de uma vez.
+    """
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(WORKERS)
+    loop = asyncio.get_running_loop()
+
+    async def run(project_id: str, path: Path) -> dict:
+        async with _slots:
+            t0 = time.monotonic()
+            for attempt in range(2):
+                pool = get_pool()
+                try:
+                    analysis = await loop.run_in_executor(pool, _analyze_one, str(path))
+                    break
+                except BrokenProcessPool as e:
+                    # Outro projeto pode ter derrubado o pool: uma nova tentativa num pool novo
+                    _discard(pool)
+                    if attempt:
+                        return {"event": "error", "project_id": project_id,
+                                "error": f"Analysis worker died: {e}"[:500]}
+                except Exception as e:
+                    return {"event": "error", "project_id": project_id, "error": str(e)[:500]}
+            return {"event": "result", "project_id": project_id, "analysis": analysis,
+                    "seconds": round(time.monotonic() - t0, 3)}
+
+    tasks = [asyncio.ensure_future(run(pid, path)) for pid, path in items]
+    try:
+        for fut in asyncio.as_completed(tasks):
+            yield await fut
+    finally:
+        # Cliente desconectou: libera os slots dos que ainda não começaram
+        for t in tasks:
+            t.cancel()
@@ -0,0 +1,86 @@
+"""
+GenLab Engine — Benchmark: extract_files_json
+Compara o extrator linear com o antigo fallback por regex em saídas patológicas.
+
+Rode com: python benchmarks/bench_extract.py  (a partir de agent/)
+--legacy inclui a versão antiga (quadrática: pode levar minutos nos casos grandes).
+"""
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from code_generator import extract_files_json  # noqa: E402
+
+
+def legacy_extract_files_json(text: str):
+    """Implementação anterior (regex com backtracking), só para comparação."""
+    try:
+        data = json.loads(text)
+        if isinstance(data, dict) and "files" in data:
+            return data["files"]
+        if isinstance(data, list):
+            return data
+    except json.JSONDecodeError:
+        pass
+    patterns = [
+        r'```json\s*\n(.*?)\n```',
+        r'```\s*\n(.*?)\n```',
+        r'\{[\s\S]*"files"\s*:\s*\[[\s\S]*\]\s*\}',
+    ]
+    for pattern in patterns:
+        for match in re.findall(pattern, text, re.DOTALL):
+            try:
+                data = json.loads(match)
+                if isinstance(data, dict) and "files" in data:
+                    return data["files"]
+                if isinstance(data, list):
+                    return data
+            except json.JSONDecodeError:
+                continue
+    return None
+
+
+def _files(n: int, size: int) -> list:
+    body = ("const x = { a: [1, 2, 3] };\n" * (size // 28 + 1))[:size]
+    return [{"path": f"src/file_{i}.ts", "content": body} for i in range(n)]
+
+
+def cases() -> dict:
+    files = _files(40, 2500)
+    doc = json.dumps({"files": files})
+    return {
+        "clean_json": doc,
+        "fenced_with_prose": "Aqui está o projeto:\n```json\n" + doc + "\n```\nPronto!",
+        "truncated_max_tokens": doc[: len(doc) * 3 // 4],
+        "unbalanced_braces_100kb": "{ " * 2000 + '"files": [' + "{ [ " * 20000,
+        "many_fences_no_json": "```\n{ \"files\": [ {\n```\n" * 3000,
+        "prose_then_truncated": "Claro! { vou gerar\n```json\n" + doc[: len(doc) // 2],
+    }
+
+
+def bench(fn, text: str, repeat: int = 3) -> dict:
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(text)
+        best = min(best, time.perf_counter() - t0)
+    return {"seconds": round(best, 5), "files": len(result) if result else 0}
+
+
+def main() -> None:
+    out = []
+    for name, text in cases().items():
+        row = {"case": name, "bytes": len(text), "linear": bench(extract_files_json, text)}
+        if "--legacy" in sys.argv:
+            row["legacy"] = bench(legacy_extract_files_json, text, repeat=1)
+        out.append(row)
+    print(json.dumps({"benchmark": "extract_files_json", "results": out}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
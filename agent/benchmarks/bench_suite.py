@@ -0,0 +1,189 @@
+"""
+GenLab Engine — Benchmark suite
+Mede as operações de disco e parsing do agente em repositórios sintéticos
+(benchmarks/synthetic_repo.py) e em saídas grandes/patológicas do LLM.
+O resultado sai em JSON para comparar versões na mesma máquina.
+
+Rode com: python benchmarks/bench_suite.py --shapes small,large -o antes.json  (a partir de agent/)
+Tudo roda num INFINITY_WORKDIR temporário; nada toca ~/.infinity_agent.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from synthetic_repo import SHAPES, generate  # noqa: E402
+
+BATCH_READ_FILES = 200
+
+
+def timed(fn, repeat: int, setup=None) -> tuple:
+    """Melhor e mediana de repeat execuções; setup() roda antes de cada uma, fora do tempo."""
+    runs = []
+    result = None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        t0 = time.perf_counter()
+        result = fn()
+        runs.append(time.perf_counter() - t0)
+    return {"seconds_min": round(min(runs), 5), "seconds_median": round(statistics.median(runs), 5),
+            "runs": repeat}, result
+
+
+def _cold_analysis() -> None:
+    """Esvazia os caches da análise (memória, SQLite compartilhado e linhas por arquivo)."""
+    import code_stats
+    import project_analyzer
+    import shared_state
+    with project_analyzer._cache_lock:
+        project_analyzer._cache.clear()
+    with code_stats._lock:
+        code_stats._cache.clear()
+    shared_state._db().execute("DELETE FROM cache WHERE ns = 'analysis'")
+
+
+def bench_repo(shape_name: str, shape: dict, repeat: int, seed: int) -> dict:
+    import agent
+    from project_analyzer import analyze_project
+
+    project_id = f"bench_{shape_name}"
+    repo_dir = agent.APP_ROOT / "projects" / project_id
+    shutil.rmtree(repo_dir, ignore_errors=True)
+    t0 = time.perf_counter()
+    repo = generate(repo_dir, seed=seed, **shape)
+    repo["generate_s"] = round(time.perf_counter() - t0, 3)
+    repo_dir = repo_dir.resolve()
+
+    results = []
+
+    def add(name: str, fn, setup=None, **extra):
+        timing, result = timed(fn, repeat, setup)
+        row = {"name": name, **timing}
+        for key, get in extra.items():
+            row[key] = get(result)
+        results.append(row)
+        return result
+
+    add("load_ignore", lambda: agent.load_ignore(repo_dir))
+    listed = add("safe_list_files", lambda: agent.safe_list_files(repo_dir), files=len)
+    add("safe_list_files_unbounded", lambda: agent.safe_list_files(repo_dir, max_files=10 ** 7), files=len)
+    add("analyze_project_cold", lambda: analyze_project(repo_dir), setup=_cold_analysis,
+        file_count=lambda a: a["file_count"], packages=lambda a: len(a.get("packages", [])))
+    add("analyze_project_warm", lambda: analyze_project(repo_dir))
+    paths = ",".join(listed[:BATCH_READ_FILES])
+    add("read_files_batch", lambda: agent._read_files_batch(repo_dir, paths), files=lambda r: len(r["files"]))
+
+    labels = iter(range(repeat))
+    backup = add("backup_create",
+                 lambda: agent._backup_create(agent.BackupCreate(project_id=project_id, label=f"bench{next(labels)}"),
+                                              repo_dir),
+                 files=lambda m: m["files_count"])
+    backup_dir = agent.BACKUPS_ROOT / backup["backup_id"]
+    req = agent.BackupRestore(project_id=project_id, backup_id=backup["backup_id"])
+    # Inclui o backup automático "pre-restore-auto", como no endpoint
+    add("backup_restore", lambda: agent._backup_restore(req, repo_dir, backup_dir),
+        files=lambda r: r["files_restored"])
+
+    for d in agent.BACKUPS_ROOT.glob(f"{project_id}_*"):
+        shutil.rmtree(d, ignore_errors=True)
+    return {"shape": shape_name, "repo": repo, "results": results}
+
+
+def _generated_files(n: int, size: int) -> list:
+    body = ("export const value = { a: [1, 2, 3] };\n" * (size // 39 + 1))[:size]
+    return [{"path": f"src/feature_{i % 25}/part_{i % 7}/file_{i}.ts", "content": body} for i in range(n)]
+
+
+def bench_save(repeat: int) -> list:
+    from code_generator import save_generated_project
+    results = []
+    for name, n, size in (("save_generated_project_100x2kb", 100, 2_000),
+                          ("save_generated_project_1000x8kb", 1000, 8_000)):
+        files = _generated_files(n, size)
+        timing, out = timed(lambda: save_generated_project(f"bench_{n}", files), repeat)
+        results.append({"name": name, **timing, "files": out["count"]})
+    return results
+
+
+def extract_cases() -> dict:
+    """Casos do bench_extract + saídas grandes (centenas de arquivos, MBs)."""
+    import bench_extract
+    cases = bench_extract.cases()
+    doc = json.dumps({"files": _generated_files(800, 2_500)})
+    cases.update({
+        "large_clean_json": doc,
+        "large_fenced_with_prose": "Segue o projeto completo:\n```json\n" + doc + "\n```\n",
+        "large_truncated_max_tokens": doc[: len(doc) * 9 // 10],
+        "large_unbalanced_braces_1mb": "{ " * 20000 + '"files": [' + "{ [ " * 240000,
+        "large_many_fences_no_json": "```\n{ \"files\": [ {\n```\n" * 40000,
+    })
+    return cases
+
+
+def bench_extract_cases(repeat: int) -> list:
+    from code_generator import extract_files_json
+    results = []
+    for name, text in extract_cases().items():
+        timing, out = timed(lambda: extract_files_json(text), repeat)
+        results.append({"name": f"extract_files_json/{name}", **timing, "bytes": len(text),
+                        "files": len(out) if out else 0})
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks do agente em repositórios sintéticos")
+    parser.add_argument("--shapes", default="small,large",
+                        help=f"formatos separados por vírgula ({', '.join(SHAPES)})")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--skip-llm-output", action="store_true",
+                        help="pula save_generated_project e extract_files_json")
+    parser.add_argument("-o", "--output", type=Path, help="grava o JSON neste arquivo (padrão: stdout)")
+    parser.add_argument("--keep", action="store_true", help="mantém o workdir temporário")
+    args = parser.parse_args()
+    shapes = [s.strip() for s in args.shapes.split(",") if s.strip()]
+    unknown = [s for s in shapes if s not in SHAPES]
+    if unknown:
+        parser.error(f"formato desconhecido: {', '.join(unknown)}")
+
+    # Antes de importar o agente: cada módulo lê INFINITY_WORKDIR no import
+    workdir = Path(tempfile.mkdtemp(prefix="genlab_bench_"))
+    os.environ["INFINITY_WORKDIR"] = str(workdir)
+    try:
+        import agent
+        report = {
+            "benchmark": "suite",
+            "version": agent.VERSION,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "repeat": args.repeat,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "repos": [bench_repo(s, SHAPES[s], args.repeat, args.seed) for s in shapes],
+        }
+        if not args.skip_llm_output:
+            report["llm_output"] = bench_save(args.repeat) + bench_extract_cases(args.repeat)
+    finally:
+        if args.keep:
+            print(f"workdir: {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+GenLab Engine — Benchmark: repositório sintético
+Gera repositórios de formato configurável para os benchmarks: número de
+arquivos, profundidade, node_modules grande, binários e .gitignore aninhados.
+A geração é determinística (seed), então dois runs comparam a mesma árvore.
+
+Rode com: python benchmarks/synthetic_repo.py DEST --shape large  (a partir de agent/)
+"""
+import argparse
+import json
+import random
+import sys
+from pathlib import Path
+
+
+SHAPES = {
+    # files: código-fonte; depth: níveis de pastas; node_modules: arquivos dentro dele;
+    # binaries: assets binários (parte acima do limite de 2 MB); gitignores: .gitignore aninhados
+    "small": {"files": 300, "depth": 3, "node_modules": 1000, "binaries": 10, "gitignores": 3},
+    "large": {"files": 3000, "depth": 5, "node_modules": 20000, "binaries": 60, "gitignores": 12},
+    "deep": {"files": 1500, "depth": 25, "node_modules": 2000, "binaries": 10, "gitignores": 25},
+    "wide": {"files": 6000, "depth": 1, "node_modules": 0, "binaries": 0, "gitignores": 0},
+}
+
+SOURCE_KINDS = (
+    (".ts", "export function f{i}(x: number): number {{\n  return x * {i};\n}}\n"),
+    (".tsx", "export const C{i} = () => <div className=\"c{i}\">{i}</div>;\n"),
+    (".py", "def f{i}(x):\n    return x * {i}\n"),
+    (".css", ".c{i} {{ margin: {i}px; }}\n"),
+    (".md", "# Doc {i}\n\nTexto de exemplo.\n"),
+)
+BINARY_KINDS = (".png", ".jpg", ".woff2", ".mp4", ".wasm", ".bin")
+BIG_BINARY = 2_500_000  # acima do limite de 2 MB da listagem e do backup
+
+
+def _write(path: Path, data) -> int:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if isinstance(data, bytes):
+        path.write_bytes(data)
+    else:
+        path.write_text(data, encoding="utf-8")
+    return path.stat().st_size
+
+
+def _dirs(rng: random.Random, depth: int, count: int) -> list:
+    """count pastas em src/, com profundidade entre 1 e depth."""
+    out = []
+    for d in range(count):
+        parts = [f"mod{d % 17}"]
+        for level in range(1, rng.randint(1, max(1, depth))):
+            parts.append(f"l{level}_{rng.randint(0, 3)}")
+        out.append("src/" + "/".join(parts))
+    return out
+
+
+def generate(root: Path, files: int = 300, depth: int = 3, node_modules: int = 1000, binaries: int = 10,
+             gitignores: int = 3, line_repeat: int = 20, seed: int = 0) -> dict:
+    """Cria o repositório em root (que não deve existir) e devolve o que foi gerado."""
+    rng = random.Random(seed)
+    root = Path(root)
+    root.mkdir(parents=True)
+    stats = {"source_files": 0, "node_modules_files": 0, "binary_files": 0, "gitignores": 0,
+             "ignored_files": 0, "bytes": 0}
+
+    stats["bytes"] += _write(root / "package.json", json.dumps({
+        "name": "synthetic", "version": "1.0.0", "workspaces": ["packages/*"],
+        "dependencies": {"react": "^18.2.0", "vite": "^5.0.0"},
+        "scripts": {"build": "vite build", "test": "vitest"},
+    }, indent=2))
+    stats["bytes"] += _write(root / "packages" / "ui" / "package.json", json.dumps({"name": "ui"}))
+    stats["bytes"] += _write(root / "requirements.txt", "fastapi\nuvicorn\n")
+    stats["bytes"] += _write(root / ".gitignore", "dist/\n*.log\ncoverage/\n")
+
+    # Código-fonte
+    dirs = _dirs(rng, depth, max(1, files // 20))
+    for i in range(files):
+        ext, template = SOURCE_KINDS[i % len(SOURCE_KINDS)]
+        base = "packages/ui/src" if i % 10 == 0 else rng.choice(dirs)
+        stats["bytes"] += _write(root / base / f"file_{i}{ext}", template.format(i=i) * line_repeat)
+        stats["source_files"] += 1
+
+    # .gitignore aninhados, cada um com arquivos que ele ignora
+    for g in range(gitignores):
+        base = root / rng.choice(dirs)
+        stats["bytes"] += _write(base / ".gitignore", f"generated_{g}/\n*.tmp\n!keep.tmp\n")
+        for k in range(5):
+            stats["bytes"] += _write(base / f"generated_{g}" / f"out_{k}.js", "// gerado\n" * 50)
+            stats["ignored_files"] += 1
+        stats["bytes"] += _write(base / f"scratch_{g}.tmp", "tmp\n")
+        stats["gitignores"] += 1
+
+    # node_modules: muitos pacotes rasos (package.json + lib/*.js)
+    per_pkg = 4
+    for n in range(node_modules):
+        pkg = root / "node_modules" / f"pkg_{n // per_pkg}"
+        name = "package.json" if n % per_pkg == 0 else f"lib/part_{n % per_pkg}.js"
+        body = json.dumps({"name": f"pkg_{n // per_pkg}"}) if name == "package.json" else "module.exports = 1;\n" * 30
+        stats["bytes"] += _write(pkg / name, body)
+        stats["node_modules_files"] += 1
+
+    # Binários: pequenos (ignorados pela extensão) e alguns acima do limite de tamanho
+    for b in range(binaries):
+        ext = BINARY_KINDS[b % len(BINARY_KINDS)]
+        size = BIG_BINARY if b % 10 == 9 else rng.randint(2_000, 200_000)
+        stats["bytes"] += _write(root / "assets" / f"asset_{b}{ext}", rng.randbytes(size))
+        stats["binary_files"] += 1
+
+    # Saída de build e logs cobertos pelo .gitignore da raiz
+    for k in range(min(200, files // 10)):
+        stats["bytes"] += _write(root / "dist" / f"chunk_{k}.js", "var a=1;" * 200)
+        stats["ignored_files"] += 1
+    stats["bytes"] += _write(root / "debug.log", "log\n" * 1000)
+
+    return {"root": str(root), "seed": seed, "shape": {"files": files, "depth": depth, "node_modules": node_modules,
+                                                       "binaries": binaries, "gitignores": gitignores}, **stats}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Gera um repositório sintético para os benchmarks")
+    parser.add_argument("dest", type=Path)
+    parser.add_argument("--shape", choices=sorted(SHAPES), default="small")
+    for key in SHAPES["small"]:
+        parser.add_argument(f"--{key.replace('_', '-')}", type=int, help="sobrescreve o valor do --shape")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.dest.exists():
+        sys.exit(f"{args.dest} já existe")
+    shape = {k: getattr(args, k) if getattr(args, k) is not None else v for k, v in SHAPES[args.shape].items()}
+    print(json.dumps(generate(args.dest, seed=args.seed, **shape), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+GenLab Engine — Build Cache
+Cache de artefatos de build indexado pelo hash da árvore de código-fonte.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+
+APP_ROOT = Path(os.environ.get("INFINITY_WORKDIR", str(Path.home() / ".infinity_agent"))).resolve()
+BUILD_CACHE_ROOT = APP_ROOT / "build_cache"
+ARTIFACTS_ROOT = BUILD_CACHE_ROOT / "artifacts"
+WORK_ROOT = BUILD_CACHE_ROOT / "work"
+NPM_CACHE_DIR = BUILD_CACHE_ROOT / "npm-cache"
+MAX_ENTRIES = int(os.environ.get("BUILD_CACHE_MAX_ENTRIES", "20"))
+DIGEST_MEMO_MAX = int(os.environ.get("BUILD_CACHE_DIGEST_MEMO", "100000"))
+
+# Diretórios que nunca entram no hash (dependências, VCS, saída do /v1/build)
+SKIP_DIRS = {".git", "node_modules", ".venv", "venv", "__pycache__", ".gradle", "infinity_dist"}
+
+# path -> (size, mtime_ns, sha256) para não reler arquivos inalterados (LRU)
+_digest_memo: "OrderedDict[str, tuple[int, int, str]]" = OrderedDict()
+_memo_lock = threading.Lock()
+_lock = threading.Lock()
+_counters = {"hits": 0, "misses": 0}
+
+
+def _file_digest(path: Path, st: os.stat_result) -> str:
+    key = str(path)
+    with _memo_lock:
+        memo = _digest_memo.get(key)
+        if memo and memo[0] == st.st_size and memo[1] == st.st_mtime_ns:
+            _digest_memo.move_to_end(key)
+            return memo[2]
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+    with _memo_lock:
+        _digest_memo[key] = (st.st_size, st.st_mtime_ns, digest)
+        _digest_memo.move_to_end(key)
+        while len(_digest_memo) > DIGEST_MEMO_MAX:
+            _digest_memo.popitem(last=False)
+    return digest
+
+
+def output_dirs(project_dir: Path, target: str) -> set:
+    """Pastas que a ferramenta do target gera: só essas saem do hash.
+
+    Num projeto de outra stack, build/ ou dist/ podem ser código-fonte de verdade.
+    """
+    if target == "java":
+        return {"target"} if (Path(project_dir) / "pom.xml").exists() else {"build"}
+    if target in ("electron", "electron-wrap", "pyinstaller"):
+        return {"dist"}
+    return set()
+
+
+def source_tree_hash(project_dir: Path, target: str) -> str:
+    """Hash estável do código-fonte (ignora dependências e as saídas de build do target)."""
+    project_dir = Path(project_dir).resolve()
+    skip = SKIP_DIRS | output_dirs(project_dir, target)
+    h = hashlib.sha256()
+    for root, dirs, files in os.walk(project_dir):
+        dirs[:] = sorted(d for d in dirs if d not in skip)
+        for name in sorted(files):
+            p = Path(root) / name
+            try:
+                st = p.stat()
+                digest = _file_digest(p, st)
+            except OSError:
+                continue
+            rel = p.relative_to(project_dir).as_posix()
+            h.update(rel.encode("utf-8", "surrogateescape") + b"\0" + digest.encode() + b"\n")
+    return h.hexdigest()
+
+
+def cache_key(tree_hash: str, target: str, entry: Optional[str] = None) -> str:
+    """Chave do cache: árvore + target + entry point."""
+    raw = f"{tree_hash}|{target}|{entry or ''}"
+    return hashlib.sha256(raw.encode()).hexdigest()[:40]
+
+
+def work_dir(project_dir: Path, tool: str) -> Path:
+    """Diretório de trabalho persistente por projeto (ex.: workpath do PyInstaller)."""
+    pid = hashlib.sha256(str(Path(project_dir).resolve()).encode()).hexdigest()[:16]
+    d = WORK_ROOT / pid / tool
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
+
+def npm_env_prefix() -> str:
+    """Prefixo de shell que aponta o npm para o cache compartilhado."""
+    NPM_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    return f"export npm_config_cache='{NPM_CACHE_DIR}' npm_config_prefer_offline=true && "
+
+
+def lookup(key: str) -> Optional[dict]:
+    """Retorna os metadados da entrada em cache, se existir."""
+    meta_file = ARTIFACTS_ROOT / key / "meta.json"
+    if not meta_file.exists():
+        return None
+    try:
+        meta = json.loads(meta_file.read_text())
+    except Exception:
+        return None
+    os.utime(meta_file)  # marca uso recente para o LRU
+    return meta
+
+
+def restore(key: str, dest_dir: Path) -> Optional[dict]:
+    """Copia o artefato em cache para dest_dir. Retorna metadados ou None."""
+    meta = lookup(key)
+    with _lock:
+        _counters["hits" if meta is not None else "misses"] += 1
+    if meta is None:
+        return None
+    src = ARTIFACTS_ROOT / key / "files"
+    dest_dir = Path(dest_dir)
+    if dest_dir.exists():
+        shutil.rmtree(dest_dir)
+    shutil.copytree(src, dest_dir)
+    return meta
+
+
+def counters() -> dict:
+    with _lock:
+        return dict(_counters)
+
+
+def store(key: str, artifact_dir: Path, **meta) -> None:
+    """Guarda o conteúdo de artifact_dir no cache (escrita atômica)."""
+    artifact_dir = Path(artifact_dir)
+    if not artifact_dir.is_dir():
+        return
+    ARTIFACTS_ROOT.mkdir(parents=True, exist_ok=True)
+    final = ARTIFACTS_ROOT / key
+    tmp = ARTIFACTS_ROOT / f".tmp_{key}_{os.getpid()}_{threading.get_ident()}"
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    shutil.copytree(artifact_dir, tmp / "files")
+    meta = {"key": key, "created_at": time.time(), **meta}
+    (tmp / "meta.json").write_text(json.dumps(meta, indent=2))
+    with _lock:
+        if final.exists():
+            shutil.rmtree(final)
+        tmp.rename(final)
+        _prune()
+
+
+def _prune() -> None:
+    entries = [d for d in ARTIFACTS_ROOT.iterdir() if d.is_dir() and not d.name.startswith(".tmp_")]
+    if len(entries) <= MAX_ENTRIES:
+        return
+    entries.sort(key=lambda d: (d / "meta.json").stat().st_mtime if (d / "meta.json").exists() else 0)
+    for d in entries[: len(entries) - MAX_ENTRIES]:
+        shutil.rmtree(d, ignore_errors=True)
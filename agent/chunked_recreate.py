@@ -0,0 +1,215 @@
+"""
+GenLab Engine — Chunked Recreate
+Recriação map-reduce para projetos grandes: planeja com uma chamada, gera os
+módulos em paralelo no backend LLM e junta/valida o resultado.
+"""
+import json
+import os
+import posixpath
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Optional
+
+import context_packer
+import llm_metrics
+import profiling
+from code_generator import call_llm, extract_files_json, get_llm_config, save_generated_project
+from project_analyzer import analyze_project
+from prompt_templates import build_module_prompt, build_plan_prompt
+from stream_parser import top_level_spans
+
+
+DEFAULT_PARALLELISM = int(os.environ.get("LLM_PARALLELISM", "2"))
+MAX_PARALLELISM = int(os.environ.get("LLM_MAX_PARALLELISM", "8"))
+MAX_TOKENS = 16000
+# Recriação em partes automática quando o código passa de N vezes o orçamento do prompt
+AUTO_CHUNK_FACTOR = float(os.environ.get("RECREATE_AUTO_CHUNK_FACTOR", "3"))
+
+_REL_IMPORT_RE = re.compile(r"""(?:from\s*|import\s*\(?\s*|require\(\s*)['"](\.{1,2}/[^'"]+)['"]""")
+_JS_EXTS = ("", ".ts", ".tsx", ".js", ".jsx", ".vue", ".json", "/index.ts", "/index.tsx", "/index.js")
+
+
+def should_chunk(analysis: dict) -> bool:
+    """Decide pelo tamanho do código (code_stats), antes de ler qualquer arquivo."""
+    budget, _ = context_packer.prompt_budget(get_llm_config()["model"], MAX_TOKENS)
+    return analysis.get("source_bytes", 0) / context_packer.CHARS_PER_TOKEN > AUTO_CHUNK_FACTOR * budget
+
+
+def chunk_sources(root: Path, paths: List[str], budget_tokens: int) -> List[dict]:
+    """Agrupa os arquivos por diretório de topo e divide grupos que não cabem no orçamento."""
+    groups: dict = {}
+    for rel in paths:
+        name = rel.rsplit("/", 1)[-1]
+        if name in context_packer.SKIP_NAMES or name.endswith(context_packer.SKIP_SUFFIXES):
+            continue
+        try:
+            size = (root / rel).stat().st_size
+        except OSError:
+            continue
+        if size == 0 or size > context_packer.MAX_FILE_BYTES:
+            continue
+        top = rel.split("/", 1)[0] if "/" in rel else "root"
+        groups.setdefault(top, []).append((rel, int(size / context_packer.CHARS_PER_TOKEN) + 8))
+
+    chunks = []
+    for top in sorted(groups):
+        part, used, n = [], 0, 1
+        for rel, cost in sorted(groups[top]):
+            if part and used + cost > budget_tokens:
+                chunks.append({"name": f"{top}#{n}", "sources": part})
+                part, used, n = [], 0, n + 1
+            part.append(rel)
+            used += cost
+        if part:
+            name = top if n == 1 else f"{top}#{n}"
+            chunks.append({"name": name, "sources": part})
+    return chunks
+
+
+def _parse_plan(text: str) -> Optional[list]:
+    try:
+        data = json.loads(text)
+        if isinstance(data, dict) and isinstance(data.get("modules"), list):
+            return data["modules"]
+    except json.JSONDecodeError:
+        pass
+    for start, end in top_level_spans(text):
+        try:
+            data = json.loads(text[start:end])
+        except json.JSONDecodeError:
+            continue
+        if isinstance(data, dict) and isinstance(data.get("modules"), list):
+            return data["modules"]
+    return None
+
+
+def _merge_plan(chunks: List[dict], modules: Optional[list]) -> List[dict]:
+    """Plano final: um módulo por chunk; arquivos de destino com dono único."""
+    by_name = {m.get("name"): m for m in modules or [] if isinstance(m, dict)}
+    owned = set()
+    plan = []
+    for c in chunks:
+        m = by_name.get(c["name"], {})
+        # "files": "src/a.py" (string) seria iterado letra por letra
+        raw = m.get("files")
+        files = [f for f in raw if isinstance(f, str) and f not in owned] if isinstance(raw, list) else []
+        owned.update(files)
+        plan.append({"name": c["name"], "files": files, "interfaces": str(m.get("interfaces", ""))[:1000],
+                     "sources": c["sources"]})
+    return plan
+
+
+def check_consistency(plan: List[dict], files: List[dict]) -> dict:
+    """Arquivos planejados que faltam e imports relativos JS/TS sem destino."""
+    produced = {f["path"] for f in files}
+    planned = [p for m in plan for p in m.get("files", [])]
+    missing = sorted(p for p in planned if p not in produced)
+    unresolved = []
+    for f in files:
+        if not f["path"].endswith((".ts", ".tsx", ".js", ".jsx", ".vue")):
+            continue
+        base = posixpath.dirname(f["path"])
+        for spec in _REL_IMPORT_RE.findall(f["content"]):
+            target = posixpath.normpath(posixpath.join(base, spec))
+            if not any(target + ext in produced for ext in _JS_EXTS):
+                unresolved.append(f"{f['path']} -> {spec}")
+    return {"missing": missing, "unresolved_imports": unresolved[:200]}
+
+
+def _generate_module(analysis: dict, plan: List[dict], module: dict, root: Path,
+                     budget: int, max_tokens: int, use_cache: bool) -> dict:
+    packed = context_packer.pack_files(root, module["sources"], analysis, budget)
+    # budget é a metade do prompt reservada ao código; o plano usa até metade do resto
+    prompt = build_module_prompt(analysis, plan, module, packed["files"],
+                                 max_plan_chars=int(budget // 2 * context_packer.CHARS_PER_TOKEN))
+    t0 = time.monotonic()
+    response = call_llm(prompt, max_tokens=max_tokens, use_cache=use_cache, endpoint="recreate-chunked")
+    files = extract_files_json(response) or []
+    llm_metrics.record_parse(get_llm_config()["model"], "recreate-chunked", bool(files))
+    return {"name": module["name"], "files": files, "seconds": round(time.monotonic() - t0, 2)}
+
+
+def recreate_project_chunked(source_dir: Path, project_name: str, parallelism: Optional[int] = None,
+                             use_cache: bool = True) -> dict:
+    """Pipeline map-reduce: plano → módulos em paralelo → merge + checagem."""
+    from agent import safe_list_files
+    source_dir = Path(source_dir)
+
+    analysis = analyze_project(source_dir)
+    config = get_llm_config()
+    budget, max_tokens = context_packer.prompt_budget(config["model"], MAX_TOKENS)
+    # Metade do orçamento para o código do módulo; o resto é template + plano
+    chunks = chunk_sources(source_dir, safe_list_files(source_dir), budget // 2)
+    if not chunks:
+        return {"ok": False, "error": "No source files to recreate"}
+
+    # 1. Plan (uma chamada) — resumos cortados para caber no orçamento
+    per_chunk = max(64, budget // (2 * len(chunks)))
+    listing = []
+    for c in chunks:
+        lines, used = [], 0
+        for rel in c["sources"]:
+            try:
+                line = context_packer.summarize(rel, (source_dir / rel).read_text(errors="ignore"))
+            except Exception:
+                continue
+            used += context_packer.estimate_tokens(line)
+            if used > per_chunk:
+                lines.append(f"- ... (+{len(c['sources']) - len(lines)} arquivos)")
+                break
+            lines.append(line)
+        listing.append({"name": c["name"], "summaries": lines})
+    plan_text = call_llm(build_plan_prompt(analysis, listing), max_tokens=min(4000, max_tokens), use_cache=use_cache,
+                         endpoint="recreate-plan")
+    modules = _parse_plan(plan_text)
+    llm_metrics.record_parse(config["model"], "recreate-plan", modules is not None)
+    plan = _merge_plan(chunks, modules)
+
+    # 2. Map: módulos em paralelo (parallelism vem do cliente: limitado aqui)
+    parallelism = max(1, min(parallelism or DEFAULT_PARALLELISM, MAX_PARALLELISM, len(plan)))
+    results, errors = [], []
+    with ThreadPoolExecutor(max_workers=parallelism) as pool:
+        futures = {
+            pool.submit(profiling.follow(_generate_module), analysis, plan, m, source_dir, budget // 2, max_tokens,
+                        use_cache): m["name"]
+            for m in plan
+        }
+        for fut in as_completed(futures):
+            try:
+                results.append(fut.result())
+            except Exception as e:
+                errors.append({"module": futures[fut], "error": str(e)})
+
+    # 3. Reduce: dono do arquivo no plano vence; senão, o primeiro módulo (ordem do plano)
+    owner = {p: m["name"] for m in plan for p in m["files"]}
+    order = {m["name"]: i for i, m in enumerate(plan)}
+    merged: dict = {}
+    duplicates = []
+    for r in sorted(results, key=lambda r: order[r["name"]]):
+        for f in r["files"]:
+            if not isinstance(f, dict) or not f.get("path"):
+                continue
+            path = f["path"]
+            if path in merged:
+                duplicates.append(path)
+                if owner.get(path) != r["name"]:
+                    continue
+            merged[path] = {"path": path, "content": f.get("content", "")}
+    files = [merged[p] for p in sorted(merged)]
+    if not files:
+        return {"ok": False, "error": "No module produced files", "module_errors": errors}
+
+    result = save_generated_project(project_name, files)
+    result.update({
+        "ok": True,
+        "analysis": analysis,
+        "plan_parsed": modules is not None,
+        "modules": [{"name": r["name"], "files": len(r["files"]), "seconds": r["seconds"]}
+                    for r in sorted(results, key=lambda r: order[r["name"]])],
+        "module_errors": errors,
+        "consistency": {**check_consistency(plan, files), "duplicates": sorted(set(duplicates))},
+        "parallelism": parallelism,
+    })
+    return result
@@ -4,180 +4,442 @@ Gera projetos recriados usando IA local (LM Studio / Ollama).
 """
 import json
 import os
-import re
+import shutil
+import time
+import uuid
 from pathlib import Path
 from typing import Optional
-import httpx
 
+import context_packer
+import http_pool
+import httpx
+import llm_router
+import llm_cache
+import llm_metrics
+import shared_state
 from project_analyzer import analyze_project
 from prompt_templates import build_recreation_prompt
+from stream_parser import FileStreamParser, top_level_spans
 
 
 GENERATED_ROOT = Path(os.environ.get("INFINITY_WORKDIR", str(Path.home() / ".infinity_agent"))) / "generated_projects"
 GENERATED_ROOT.mkdir(parents=True, exist_ok=True)
+# Saída do recreate-stream em andamento; fora de GENERATED_ROOT para não aparecer nas listagens
+STAGING_ROOT = GENERATED_ROOT.parent / "generated_staging"
 
 
 def get_llm_config() -> dict:
-    """Retorna configuração do LLM a partir de variáveis de ambiente."""
-    provider = os.environ.get("LLM_PROVIDER", "ollama")
-    model = os.environ.get("LLM_MODEL", "gemma3")
+    """Retorna configuração do LLM: a salva via /v1/genlab/llm-config (vale para todos os
+    workers) ou, na falta dela, as variáveis de ambiente."""
+    saved = shared_state.get_setting("llm_config") or {}
+    provider = saved.get("provider") or os.environ.get("LLM_PROVIDER", "ollama")
+    model = saved.get("model") or os.environ.get("LLM_MODEL", "gemma3")
 
     if provider == "lmstudio":
-        base_url = os.environ.get("LLM_BASE_URL", "http://127.0.0.1:1234/v1")
+        base_url = saved.get("base_url") or os.environ.get("LLM_BASE_URL", "http://127.0.0.1:1234/v1")
     elif provider == "ollama":
-        base_url = os.environ.get("LLM_BASE_URL", "http://127.0.0.1:11434/v1")
+        base_url = saved.get("base_url") or os.environ.get("LLM_BASE_URL", "http://127.0.0.1:11434/v1")
     else:
-        base_url = os.environ.get("LLM_BASE_URL", "http://127.0.0.1:11434/v1")
+        base_url = saved.get("base_url") or os.environ.get("LLM_BASE_URL", "http://127.0.0.1:11434/v1")
+
+    return {
+        "provider": provider,
+        "model": model,
+        "base_url": base_url,
+        "context_tokens": context_packer.context_window(model),
+    }
 
-    return {"provider": provider, "model": model, "base_url": base_url}
 
+SYSTEM_PROMPT = "Você é um gerador de código. Responda APENAS com JSON válido no formato solicitado."
+TEMPERATURE = 0.3
+# Providers que aceitam stream_options (uso de tokens no último chunk); nos outros o
+# total de tokens é estimado pelo texto
+STREAM_USAGE_PROVIDERS = {p.strip() for p in os.environ.get("LLM_STREAM_USAGE_PROVIDERS", "openai,vllm").split(",")
+                          if p.strip()}
 
-def call_llm(prompt: str, max_tokens: int = 16000) -> str:
-    """Chama o LLM local e retorna a resposta."""
-    config = get_llm_config()
-    url = f"{config['base_url']}/chat/completions"
 
-    payload = {
+def _build_payload(config: dict, prompt: str, max_tokens: int) -> dict:
+    # Ordem fixa: system prompt constante antes do prompt do projeto, para o
+    # cache de prefixo (KV cache) do servidor reaproveitar entre chamadas
+    return {
         "model": config["model"],
         "messages": [
-            {"role": "system", "content": "Você é um gerador de código. Responda APENAS com JSON válido no formato solicitado."},
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": prompt},
         ],
         "max_tokens": max_tokens,
-        "temperature": 0.3,
-        "stream": False,
+        "temperature": TEMPERATURE,
+        "stream": True,
     }
 
-    resp = httpx.post(url, json=payload, timeout=300)
-    resp.raise_for_status()
-    data = resp.json()
-    return data["choices"][0]["message"]["content"]
 
+def _backend_payload(payload: dict, backend) -> dict:
+    if backend.provider in STREAM_USAGE_PROVIDERS:
+        return {**payload, "stream_options": {"include_usage": True}}
+    return payload
+
+
+def _is_backend_failure(e: Exception) -> bool:
+    """Falhas que justificam tentar outro backend (rede, timeout, 5xx)."""
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code >= 500
+    return isinstance(e, (httpx.TransportError, TimeoutError))
+
+
+def call_llm(prompt: str, max_tokens: int = 16000, use_cache: bool = True,
+             priority: int = llm_router.PRIORITY_BULK, endpoint: str = "other") -> str:
+    """Chama o LLM local e retorna a resposta (com cache em disco e failover entre backends).
+
+    Usa streaming por baixo para medir o time-to-first-token de todas as chamadas.
+    """
+    return "".join(call_llm_stream(prompt, max_tokens=max_tokens, use_cache=use_cache, priority=priority,
+                                   endpoint=endpoint))
 
-def call_llm_stream(prompt: str, max_tokens: int = 16000):
-    """Chama o LLM com streaming e yield chunks."""
+
+def call_llm_stream(prompt: str, max_tokens: int = 16000, use_cache: bool = True,
+                    priority: int = llm_router.PRIORITY_BULK, endpoint: str = "other"):
+    """Chama o LLM com streaming e yield chunks (resposta completa vai para o cache).
+
+    endpoint: rótulo da telemetria (recreate, auto-fix...).
+    """
     config = get_llm_config()
-    url = f"{config['base_url']}/chat/completions"
+    payload = _build_payload(config, prompt, max_tokens)
+    prompt_chars = len(SYSTEM_PROMPT) + len(prompt)
+    prompt_tokens = context_packer.estimate_tokens(SYSTEM_PROMPT + prompt)
 
-    payload = {
-        "model": config["model"],
-        "messages": [
-            {"role": "system", "content": "Você é um gerador de código. Responda APENAS com JSON válido no formato solicitado."},
-            {"role": "user", "content": prompt},
-        ],
-        "max_tokens": max_tokens,
-        "temperature": 0.3,
-        "stream": True,
-    }
+    cache_key = None
+    if use_cache and llm_cache.enabled():
+        # Mesma chave do call_llm: as duas formas compartilham o cache
+        cache_key = llm_cache.make_key(config["provider"], config["model"], TEMPERATURE, max_tokens, payload["messages"])
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            llm_metrics.record_call(config["model"], endpoint, prompt_chars, prompt_tokens, cached=True)
+            yield cached
+            return
+    else:
+        llm_cache.record_bypass()
 
-    with httpx.stream("POST", url, json=payload, timeout=300) as resp:
-        resp.raise_for_status()
-        for line in resp.iter_lines():
-            if not line or not line.startswith("data: "):
-                continue
-            data_str = line[6:].strip()
-            if data_str == "[DONE]":
-                break
+    parts = []
+    answered = False
+    # Só resposta com [DONE] ou finish_reason vai para o cache; conexão fechada antes é truncada
+    finished = False
+    tried, last_error = [], None
+    while not answered:
+        try:
+            backend = llm_router.ROUTER.acquire(config, priority, exclude=tried)
+        except llm_router.NoBackendError:
+            if last_error is not None:
+                raise last_error
+            raise
+        report: dict = {}
+        status, failure = None, ""
+        try:
+            t0 = time.monotonic()
+            first = None
+            usage = None
+            deadline = t0 + http_pool.TOTAL_TIMEOUT
+            client = http_pool.get_client()
             try:
-                chunk = json.loads(data_str)
-                content = chunk.get("choices", [{}])[0].get("delta", {}).get("content", "")
-                if content:
-                    yield content
-            except json.JSONDecodeError:
+                with client.stream("POST", f"{backend.base_url}/chat/completions",
+                                   json=_backend_payload(payload, backend),
+                                   timeout=http_pool.request_timeout()) as resp:
+                    status = resp.status_code
+                    resp.raise_for_status()
+                    for line in resp.iter_lines():
+                        if time.monotonic() > deadline:
+                            raise TimeoutError(f"LLM stream exceeded {http_pool.TOTAL_TIMEOUT:.0f}s")
+                        if not line or not line.startswith("data: "):
+                            continue
+                        data_str = line[6:].strip()
+                        if data_str == "[DONE]":
+                            finished = True
+                            break
+                        try:
+                            chunk = json.loads(data_str)
+                            if chunk.get("usage"):
+                                usage = chunk["usage"]
+                            choice = (chunk.get("choices") or [{}])[0]
+                            if choice.get("finish_reason"):
+                                finished = True
+                            content = (choice.get("delta") or {}).get("content", "")
+                            if content:
+                                if first is None:
+                                    first = time.monotonic()
+                                parts.append(content)
+                                yield content
+                        except json.JSONDecodeError:
+                            continue
+            except Exception as e:
+                failure = str(e) or type(e).__name__
+                # Só dá para trocar de backend antes do primeiro chunk
+                if first is not None or not _is_backend_failure(e):
+                    raise
+                report.update(ok=False, error=str(e))
+                tried.append(backend.name)
+                last_error = e
                 continue
+            end = time.monotonic()
+            answered = True
+            report.update(ok=True, latency=end - t0, ttft=(first - t0) if first else None,
+                          tokens=(usage or {}).get("completion_tokens") or context_packer.estimate_tokens("".join(parts)),
+                          gen_seconds=(end - first) if first else 0.0)
+        finally:
+            llm_router.ROUTER.release(backend, **report)
+            # Sem report nem falha: o consumidor abandonou o stream
+            if report or failure:
+                llm_metrics.record_call(
+                    config["model"], endpoint, prompt_chars, prompt_tokens, backend=backend.name,
+                    status=status, ok=bool(report.get("ok")), latency=report.get("latency", time.monotonic() - t0),
+                    ttft=report.get("ttft"), output_tokens=report.get("tokens", 0),
+                    gen_seconds=report.get("gen_seconds", 0.0), error=failure,
+                )
+
+    if cache_key and parts and finished:
+        llm_cache.put(cache_key, "".join(parts), model=config["model"], provider=config["provider"])
+
+
+def _as_file_list(data) -> Optional[list]:
+    if isinstance(data, dict) and "files" in data:
+        return data["files"]
+    if isinstance(data, list):
+        return data
+    return None
 
 
 def extract_files_json(text: str) -> Optional[list]:
-    """Extrai o JSON de arquivos da resposta do LLM."""
+    """Extrai o JSON de arquivos da resposta do LLM.
+
+    Tempo linear: uma varredura ciente de strings localiza os objetos de nível 0
+    (json.loads só roda nos candidatos que mencionam "files"/"path"). Se a saída
+    foi truncada (max_tokens), salva os arquivos que chegaram completos.
+    """
     # Try direct parse
     try:
-        data = json.loads(text)
-        if isinstance(data, dict) and "files" in data:
-            return data["files"]
-        if isinstance(data, list):
-            return data
+        files = _as_file_list(json.loads(text))
+        if files is not None:
+            return files
     except json.JSONDecodeError:
         pass
 
-    # Try extracting JSON from markdown code blocks
-    patterns = [
-        r'```json\s*\n(.*?)\n```',
-        r'```\s*\n(.*?)\n```',
-        r'\{[\s\S]*"files"\s*:\s*\[[\s\S]*\]\s*\}',
-    ]
-    for pattern in patterns:
-        matches = re.findall(pattern, text, re.DOTALL)
-        for match in matches:
-            try:
-                data = json.loads(match)
-                if isinstance(data, dict) and "files" in data:
-                    return data["files"]
-                if isinstance(data, list):
-                    return data
-            except json.JSONDecodeError:
-                continue
+    # Prose before a fence can desync the string state (a stray quote),
+    # so the text after the first fence is scanned as a second candidate.
+    candidates = [text]
+    fence = text.find("```")
+    if fence >= 0:
+        candidates.append(text[text.find("\n", fence) + 1:])
+
+    for candidate in candidates:
+        files = _parse_top_level(candidate)
+        if files:
+            return files
+
+    # Truncated or malformed wrapper: keep every complete {"path", "content"}
+    best: list = []
+    for candidate in candidates:
+        parser = FileStreamParser()
+        parser.feed(candidate)
+        if len(parser.files) > len(best):
+            best = parser.files
+    return best or None
 
+
+def _parse_top_level(text: str) -> Optional[list]:
+    # Outermost objects/arrays (covers ```json fences and surrounding prose)
+    for start, end in top_level_spans(text):
+        if text.find('"files"', start, end) < 0 and text.find('"path"', start, end) < 0:
+            continue
+        try:
+            files = _as_file_list(json.loads(text[start:end]))
+        except json.JSONDecodeError:
+            continue
+        if files:
+            return files
     return None
 
 
-def save_generated_project(project_name: str, files: list) -> dict:
-    """Salva os arquivos gerados em disco."""
+def _prepare_project_dir(project_name: str) -> Path:
     project_dir = GENERATED_ROOT / project_name
     if project_dir.exists():
-        import shutil
         shutil.rmtree(project_dir)
     project_dir.mkdir(parents=True, exist_ok=True)
+    return project_dir
+
+
+def _staging_dir(project_name: str) -> Path:
+    staging = STAGING_ROOT / f"{project_name}.{uuid.uuid4().hex[:8]}"
+    staging.mkdir(parents=True)
+    return staging
+
+
+def _recover(project_name: str) -> None:
+    """Publicação interrompida entre os dois renames: a saída anterior volta para o lugar."""
+    old = STAGING_ROOT / f"{project_name}.old"
+    if not old.exists():
+        return
+    if (GENERATED_ROOT / project_name).exists():
+        _discard(old)
+    else:
+        os.replace(old, GENERATED_ROOT / project_name)
+
+
+def _discard(path: Path) -> None:
+    # Rename antes de apagar: um rmtree pela metade nunca fica com o nome de uma saída válida
+    trash = STAGING_ROOT / f".trash.{uuid.uuid4().hex[:8]}"
+    os.replace(path, trash)
+    shutil.rmtree(trash, ignore_errors=True)
+
+
+def _publish_staging(staging: Path, project_name: str) -> Path:
+    """Troca a saída anterior pela nova só no fim (mesmo disco: renames atômicos).
+
+    Entre os dois renames a saída anterior fica em <nome>.old; se o processo cair ali,
+    _recover (no próximo publish ou no import do módulo) a devolve.
+    """
+    project_dir = GENERATED_ROOT / project_name
+    old = STAGING_ROOT / f"{project_name}.old"
+    _recover(project_name)
+    if project_dir.exists():
+        os.replace(project_dir, old)
+    os.replace(staging, project_dir)
+    if old.exists():
+        _discard(old)
+    return project_dir
+
+
+def _recover_interrupted() -> None:
+    if not STAGING_ROOT.exists():
+        return
+    for old in STAGING_ROOT.glob("*.old"):
+        name = old.name[:-len(".old")]
+        # Mesmo lock do recreate-stream: outro worker pode estar publicando este projeto agora
+        with shared_state.file_lock(str((GENERATED_ROOT / name).resolve()), "write"):
+            try:
+                _recover(name)
+            except OSError:
+                pass
+
+
+_recover_interrupted()
+
+
+def _write_generated_file(project_dir: Path, f: dict) -> Optional[str]:
+    """Grava um arquivo gerado. Retorna o path salvo ou None se inválido."""
+    path = f.get("path", "")
+    content = f.get("content", "")
+    if not path:
+        return None
+    file_path = (project_dir / path).resolve()
+    # Security: ensure within project dir
+    if not str(file_path).startswith(str(project_dir.resolve())):
+        return None
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    file_path.write_text(content, encoding="utf-8")
+    return path
+
+
+def save_generated_project(project_name: str, files: list) -> dict:
+    """Salva os arquivos gerados em disco."""
+    project_dir = _prepare_project_dir(project_name)
 
     saved = []
     for f in files:
-        path = f.get("path", "")
-        content = f.get("content", "")
-        if not path:
-            continue
-        file_path = (project_dir / path).resolve()
-        # Security: ensure within project dir
-        if not str(file_path).startswith(str(project_dir.resolve())):
-            continue
-        file_path.parent.mkdir(parents=True, exist_ok=True)
-        file_path.write_text(content, encoding="utf-8")
-        saved.append(path)
+        path = _write_generated_file(project_dir, f)
+        if path:
+            saved.append(path)
 
     return {"project_name": project_name, "dir": str(project_dir), "files_saved": saved, "count": len(saved)}
 
 
-def recreate_project(source_dir: Path, project_name: str) -> dict:
+def build_packed_prompt(source_dir: Path, analysis: dict, max_tokens: int = 16000) -> tuple:
+    """Monta o prompt de recriação dentro do orçamento de tokens do modelo.
+
+    Retorna (prompt, packed, max_tokens limitado à janela do modelo).
+    """
+    from agent import safe_list_files
+    config = get_llm_config()
+    budget, max_tokens = context_packer.prompt_budget(config["model"], max_tokens)
+    budget -= context_packer.estimate_tokens(build_recreation_prompt(analysis, []))
+    packed = context_packer.pack_files(source_dir, safe_list_files(source_dir), analysis, max(budget, 512))
+    prompt = build_recreation_prompt(analysis, packed["files"], packed["summaries"], max_chars=None)
+    return prompt, packed, max_tokens
+
+
+def recreate_project(source_dir: Path, project_name: str, use_cache: bool = True) -> dict:
     """Pipeline completo: analisa → gera prompt → chama IA → salva."""
     source_dir = Path(source_dir)
 
     # 1. Analyze
     analysis = analyze_project(source_dir)
 
-    # 2. Collect source files (limited)
-    from agent import safe_list_files, load_ignore
-    file_list = safe_list_files(source_dir, max_files=50)
-    source_files = []
-    for rel in file_list[:50]:
-        p = source_dir / rel
-        if p.stat().st_size > 50_000:
-            continue
-        try:
-            source_files.append({"path": rel, "content": p.read_text(errors="ignore")})
-        except Exception:
-            continue
-
-    # 3. Build prompt
-    prompt = build_recreation_prompt(analysis, source_files)
+    # 2-3. Pick source files within the model's token budget and build prompt
+    prompt, packed, max_tokens = build_packed_prompt(source_dir, analysis)
 
     # 4. Call LLM
-    response_text = call_llm(prompt)
+    response_text = call_llm(prompt, max_tokens=max_tokens, use_cache=use_cache, endpoint="recreate")
 
     # 5. Extract files
     files = extract_files_json(response_text)
+    llm_metrics.record_parse(get_llm_config()["model"], "recreate", bool(files))
     if not files:
         return {"ok": False, "error": "Failed to parse LLM response as file list", "raw": response_text[:2000]}
 
     # 6. Save
     result = save_generated_project(project_name, files)
     result["analysis"] = analysis
+    result["context"] = {"files": len(packed["files"]), "summarized": len(packed["summaries"]),
+                         "elided": packed["elided"], "tokens": packed["tokens"]}
     result["ok"] = True
     return result
+
+
+def recreate_project_stream(source_dir: Path, project_name: str, use_cache: bool = True):
+    """Igual ao recreate_project, mas grava cada arquivo assim que o LLM o fecha.
+
+    Yield de eventos (dicts): analysis → file (um por arquivo) → done | error.
+    """
+    source_dir = Path(source_dir)
+    start = time.monotonic()
+
+    analysis = analyze_project(source_dir)
+    yield {"event": "analysis", "analysis": analysis}
+
+    prompt, packed, max_tokens = build_packed_prompt(source_dir, analysis)
+    yield {"event": "prompt", "files": len(packed["files"]), "summarized": len(packed["summaries"]),
+           "tokens": packed["tokens"]}
+    # Grava numa pasta temporária: erro do LLM ou cliente que cai não apagam a saída anterior
+    staging = _staging_dir(project_name)
+    parser = FileStreamParser()
+    saved = []
+
+    def _save(entries):
+        for f in entries:
+            path = _write_generated_file(staging, f)
+            if path:
+                saved.append(path)
+                # Ainda na pasta temporária: só vai para "dir" (evento done) no fim
+                yield {"event": "file", "path": path, "index": len(saved), "staged": True,
+                       "elapsed": round(time.monotonic() - start, 2)}
+
+    try:
+        try:
+            for chunk in call_llm_stream(prompt, max_tokens=max_tokens, use_cache=use_cache,
+                                         endpoint="recreate-stream"):
+                yield from _save(parser.feed(chunk))
+        except Exception as e:
+            yield {"event": "error", "error": f"LLM stream failed: {e}", "files_saved": saved}
+            return
+
+        if not saved:
+            # Formato inesperado: tenta o extrator completo sobre o texto final
+            yield from _save(extract_files_json(parser.text) or [])
+        llm_metrics.record_parse(get_llm_config()["model"], "recreate-stream", bool(saved))
+        if not saved:
+            yield {"event": "error", "error": "Failed to parse LLM response as file list", "raw": parser.text[:2000]}
+            return
+
+        project_dir = _publish_staging(staging, project_name)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    yield {"event": "done", "ok": True, "project_name": project_name, "dir": str(project_dir),
+           "files_saved": saved, "count": len(saved), "elapsed": round(time.monotonic() - start, 2)}
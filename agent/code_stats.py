@@ -0,0 +1,113 @@
+"""
+GenLab Engine — Code Stats
+Arquivos, bytes e linhas por linguagem. Conta linhas em bytes (sem decodificar)
+num pool de threads, com cache por arquivo (tamanho + mtime).
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional
+
+import profiling
+
+
+LANGUAGES = {
+    ".py": "Python", ".pyi": "Python",
+    ".js": "JavaScript", ".jsx": "JavaScript", ".mjs": "JavaScript", ".cjs": "JavaScript",
+    ".ts": "TypeScript", ".tsx": "TypeScript", ".mts": "TypeScript", ".cts": "TypeScript",
+    ".vue": "Vue", ".svelte": "Svelte",
+    ".html": "HTML", ".htm": "HTML", ".css": "CSS", ".scss": "SCSS", ".sass": "SCSS", ".less": "Less",
+    ".java": "Java", ".kt": "Kotlin", ".kts": "Kotlin", ".gradle": "Gradle",
+    ".swift": "Swift", ".m": "Objective-C", ".go": "Go", ".rs": "Rust",
+    ".c": "C", ".h": "C", ".cpp": "C++", ".cc": "C++", ".hpp": "C++", ".cs": "C#",
+    ".rb": "Ruby", ".php": "PHP", ".dart": "Dart", ".lua": "Lua",
+    ".sh": "Shell", ".bash": "Shell", ".ps1": "PowerShell", ".bat": "Batch",
+    ".sql": "SQL", ".json": "JSON", ".yml": "YAML", ".yaml": "YAML", ".toml": "TOML", ".xml": "XML",
+    ".md": "Markdown",
+}
+SPECIAL_NAMES = {"Dockerfile": "Dockerfile", "Makefile": "Makefile"}
+# Fora do "source_bytes": dados, docs e desconhecidos não vão para o prompt como código
+NON_SOURCE = {"JSON", "YAML", "TOML", "XML", "Markdown", "Other"}
+MAX_LINE_COUNT_BYTES = 20_000_000
+WORKERS = int(os.environ.get("STATS_WORKERS", str(min(16, (os.cpu_count() or 2) * 2))))
+CACHE_MAX = 200_000
+BUF_SIZE = 1 << 20
+
+_lock = threading.Lock()
+_cache: dict = {}  # caminho absoluto -> (size, mtime_ns, linhas)
+
+
+def language_of(name: str) -> Optional[str]:
+    if name in SPECIAL_NAMES:
+        return SPECIAL_NAMES[name]
+    return LANGUAGES.get(os.path.splitext(name)[1].lower())
+
+
+def count_lines(path: str, size: int) -> int:
+    """Linhas = número de \\n (+1 se o último byte não for \\n), lendo em blocos de 1 MB."""
+    if size == 0:
+        return 0
+    lines = 0
+    last = b"\n"
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            block = f.read(BUF_SIZE)
+            if not block:
+                break
+            lines += block.count(b"\n")
+            last = block[-1:]
+    return lines + (last != b"\n")
+
+
+def _file_stat(path: str) -> Optional[tuple]:
+    """(bytes, linhas) com cache por tamanho + mtime."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    with _lock:
+        hit = _cache.get(path)
+    if hit and hit[0] == st.st_size and hit[1] == st.st_mtime_ns:
+        return st.st_size, hit[2]
+    try:
+        lines = count_lines(path, st.st_size) if st.st_size <= MAX_LINE_COUNT_BYTES else 0
+    except OSError:
+        return None
+    with _lock:
+        if len(_cache) >= CACHE_MAX:
+            _cache.clear()
+        _cache[path] = (st.st_size, st.st_mtime_ns, lines)
+    return st.st_size, lines
+
+
+def language_stats(paths: Iterable[str]) -> dict:
+    """paths: caminhos absolutos. Arquivos de linguagem desconhecida entram em "Other" sem linhas."""
+    by_lang: dict = {}
+    known, other = [], []
+    for p in paths:
+        lang = language_of(os.path.basename(p))
+        (known if lang else other).append((p, lang))
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        results = pool.map(profiling.follow(lambda item: (item[1], _file_stat(item[0]))), known)
+        for lang, res in results:
+            if res is None:
+                continue
+            entry = by_lang.setdefault(lang, {"files": 0, "bytes": 0, "lines": 0})
+            entry["files"] += 1
+            entry["bytes"] += res[0]
+            entry["lines"] += res[1]
+    for p, _ in other:
+        try:
+            size = os.path.getsize(p)
+        except OSError:
+            continue
+        entry = by_lang.setdefault("Other", {"files": 0, "bytes": 0, "lines": 0})
+        entry["files"] += 1
+        entry["bytes"] += size
+    languages = dict(sorted(by_lang.items(), key=lambda kv: (-kv[1]["bytes"], kv[0])))
+    return {
+        "languages": languages,
+        "bytes": sum(v["bytes"] for v in languages.values()),
+        "lines": sum(v["lines"] for v in languages.values()),
+        "source_bytes": sum(v["bytes"] for k, v in languages.items() if k not in NON_SOURCE),
+    }
@@ -0,0 +1,207 @@
+"""
+GenLab Engine — Context Packer
+Escolhe quais arquivos entram no prompt respeitando o orçamento de tokens
+do modelo: ranqueia por importância e resume/omite o restante.
+"""
+import math
+import os
+import re
+from collections import Counter
+from pathlib import Path
+from typing import List, Optional
+
+
+CHARS_PER_TOKEN = 3.5
+DEFAULT_CONTEXT = 8192
+
+# Janela de contexto por família de modelo (substring do nome → tokens)
+MODEL_CONTEXT = {
+    "qwen2.5-coder": 32768,
+    "qwen": 32768,
+    "mistral": 32768,
+    "deepseek": 16384,
+    "codellama": 16384,
+    "starcoder": 16384,
+    "gemma3": 8192,
+    "gemma": 8192,
+    "llama3": 8192,
+    "phi": 4096,
+}
+
+MANIFESTS = {
+    "package.json", "requirements.txt", "pyproject.toml", "setup.py", "manifest.json",
+    "Dockerfile", "docker-compose.yml", "docker-compose.yaml", "build.gradle", "build.gradle.kts",
+    "settings.gradle", "pom.xml", "go.mod", "Cargo.toml", "tsconfig.json", "vite.config.ts",
+    "vite.config.js", "next.config.js", "angular.json", "Package.swift", "AndroidManifest.xml",
+}
+ENTRY_NAMES = {
+    "main.py", "app.py", "manage.py", "run.py", "index.html", "main.ts", "main.tsx", "main.js",
+    "index.ts", "index.tsx", "index.js", "App.tsx", "App.jsx", "App.vue", "server.js", "server.ts",
+    "background.js", "content.js", "popup.js", "MainActivity.kt", "MainActivity.java",
+}
+SKIP_NAMES = {
+    "package-lock.json", "yarn.lock", "pnpm-lock.yaml", "bun.lockb", "poetry.lock",
+    "Pipfile.lock", "Cargo.lock", "composer.lock", "Gemfile.lock", "go.sum",
+}
+SKIP_SUFFIXES = (".min.js", ".min.css", ".map", ".snap", ".svg", ".lock")
+MAX_FILE_BYTES = 200_000
+MAX_CANDIDATES = 300
+
+_IMPORT_RE = re.compile(
+    r"""(?:import\s[^'"]*?from\s*|import\s*\(?\s*|require\(\s*)['"]([^'"]+)['"]"""
+    r"""|^\s*(?:from\s+([\w.]+)\s+import|import\s+([\w.]+))""",
+    re.MULTILINE,
+)
+_SUMMARY_RE = re.compile(
+    r"^(?:export\s+(?:default\s+)?)?(?:async\s+)?(?:def|class|function|interface|type|const|enum)\s+(\w+)",
+    re.MULTILINE,
+)
+
+
+def estimate_tokens(text: str) -> int:
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def context_window(model: str) -> int:
+    """Janela de contexto do modelo (LLM_CONTEXT_TOKENS tem prioridade)."""
+    env = os.environ.get("LLM_CONTEXT_TOKENS")
+    if env:
+        return int(env)
+    name = (model or "").lower()
+    for key, size in MODEL_CONTEXT.items():
+        if key in name:
+            return size
+    return DEFAULT_CONTEXT
+
+
+def prompt_budget(model: str, max_tokens: int) -> tuple:
+    """(tokens para o prompt, max_tokens limitado à reserva da resposta).
+
+    Mande o segundo valor como max_tokens: prompt + resposta precisam caber na janela
+    (vLLM e llama.cpp recusam a chamada se não couberem).
+    """
+    ctx = context_window(model)
+    completion = min(max_tokens, ctx // 2)
+    return max(1024, ctx - completion), completion
+
+
+def _stem(path: str) -> str:
+    name = path.replace("\\", "/").rsplit("/", 1)[-1]
+    return name.split(".", 1)[0].lower()
+
+
+def _entry_files(analysis: dict) -> set:
+    out = set()
+    for ep in analysis.get("entry_points", []):
+        if ep.startswith("python "):
+            out.add(ep.split(" ", 1)[1])
+        elif ep.startswith("npm"):
+            out.add("package.json")
+    return out
+
+
+def _static_score(rel: str, size: int, entries: set) -> float:
+    name = rel.rsplit("/", 1)[-1]
+    depth = rel.count("/")
+    score = 0.0
+    if rel in entries:
+        score += 12
+    if name in MANIFESTS:
+        score += 10
+    if name in ENTRY_NAMES:
+        score += 6
+    if name.lower().startswith("readme"):
+        score += 3
+    if "test" in rel.lower():
+        score -= 2
+    score -= depth * 0.5
+    # Arquivos grandes custam mais orçamento por unidade de "importância"
+    score -= math.log10(max(size, 10)) * 0.8
+    return score
+
+
+def summarize(path: str, content: str) -> str:
+    """Resumo de uma linha: tamanho e definições de topo."""
+    names = list(dict.fromkeys(_SUMMARY_RE.findall(content)))[:12]
+    lines = content.count("\n") + 1
+    defs = f": {', '.join(names)}" if names else ""
+    return f"- {path} ({lines} linhas){defs}"
+
+
+def pack_files(root: Path, paths: List[str], analysis: dict, budget_tokens: int,
+               max_file_tokens: Optional[int] = None) -> dict:
+    """Seleciona arquivos para caber em budget_tokens.
+
+    Retorna {"files": [{path, content}], "summaries": [str], "tokens": int, "elided": int}.
+    """
+    root = Path(root)
+    entries = _entry_files(analysis)
+    max_file_tokens = max_file_tokens or max(512, budget_tokens // 3)
+
+    candidates = []
+    for rel in paths:
+        name = rel.rsplit("/", 1)[-1]
+        if name in SKIP_NAMES or name.endswith(SKIP_SUFFIXES):
+            continue
+        try:
+            size = (root / rel).stat().st_size
+        except OSError:
+            continue
+        if size == 0 or size > MAX_FILE_BYTES:
+            continue
+        candidates.append((_static_score(rel, size, entries), rel))
+    candidates.sort(key=lambda c: (-c[0], c[1]))
+    candidates = candidates[:MAX_CANDIDATES]
+
+    contents = {}
+    for _, rel in candidates:
+        try:
+            contents[rel] = (root / rel).read_text(errors="ignore")
+        except Exception:
+            continue
+
+    # Referências: quantos arquivos importam algo com o mesmo nome-base
+    refs: Counter = Counter()
+    for rel, text in contents.items():
+        seen = set()
+        for m in _IMPORT_RE.finditer(text):
+            spec = m.group(1) or m.group(2) or m.group(3) or ""
+            stem = _stem(spec.replace(".", "/") if not m.group(1) else spec)
+            if stem and stem != _stem(rel):
+                seen.add(stem)
+        refs.update(seen)
+
+    ranked = sorted(
+        ((score + 1.5 * min(refs.get(_stem(rel), 0), 8), rel) for score, rel in candidates if rel in contents),
+        key=lambda c: (-c[0], c[1]),
+    )
+
+    # ~15% do orçamento fica para os resumos dos arquivos que não couberem
+    file_budget = int(budget_tokens * 0.85)
+    used = 0
+    packed, summaries = [], []
+    for _, rel in ranked:
+        text = contents[rel]
+        cost = estimate_tokens(text) + 8  # cabeçalho ### path + fence
+        if cost > max_file_tokens:
+            keep = int((max_file_tokens - 16) * CHARS_PER_TOKEN)
+            text = text[:keep] + "\n... [truncado]"
+            cost = estimate_tokens(text) + 8
+        if used + cost <= file_budget:
+            packed.append({"path": rel, "content": text})
+            used += cost
+            continue
+        line = summarize(rel, contents[rel])
+        line_cost = estimate_tokens(line)
+        if used + line_cost <= budget_tokens:
+            summaries.append(line)
+            used += line_cost
+
+    # Ordem determinística por path no prompt final
+    packed.sort(key=lambda f: f["path"])
+    return {
+        "files": packed,
+        "summaries": summaries,
+        "tokens": used,
+        "elided": len(ranked) - len(packed) - len(summaries),
+    }
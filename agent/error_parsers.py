@@ -0,0 +1,100 @@
+"""
+GenLab Engine — Error Parsers
+Extrai localizações (arquivo:linha) da saída de tsc, py_compile/pyright e npm.
+"""
+import re
+from pathlib import Path
+from typing import List, Optional
+
+
+# src/a.ts(12,5): error TS2304: Cannot find name 'x'.
+_TSC_PAREN = re.compile(r"^(?P<file>[^\s(][^(\n]*?)\((?P<line>\d+),(?P<col>\d+)\):\s*error\s+(?P<code>TS\d+):\s*(?P<msg>.*)$", re.M)
+# src/a.ts:12:5 - error TS2304: Cannot find name 'x'.   (tsc --pretty)
+_TSC_PRETTY = re.compile(r"^(?P<file>[^\s:][^:\n]*?):(?P<line>\d+):(?P<col>\d+)\s+-\s+error\s+(?P<code>TS\d+):\s*(?P<msg>.*)$", re.M)
+# /abs/main.py:10:5 - error: "foo" is not defined (reportUndefinedVariable)
+_PYRIGHT = re.compile(r"^\s*(?P<file>[^\s:][^:\n]*?\.pyi?):(?P<line>\d+):(?P<col>\d+)\s+-\s+error:\s*(?P<msg>.*)$", re.M)
+#   File "main.py", line 3
+_PY_FILE = re.compile(r'^\s*File "(?P<file>[^"]+)", line (?P<line>\d+)', re.M)
+_PY_ERROR = re.compile(r"^(?P<code>\w*(?:Error|Exception)):\s*(?P<msg>.*)$", re.M)
+# Sorry: IndentationError: ... (main.py, line 4)    — formato do py_compile
+_PY_SORRY = re.compile(r"^Sorry:\s*(?P<code>\w+):\s*(?P<msg>.*)\((?P<file>[^,()]+), line (?P<line>\d+)\)", re.M)
+_NPM_ERR = re.compile(r"^npm (?:ERR!|error)\s+(?P<msg>.*)$", re.M)
+_ANSI = re.compile(r"\x1b\[[0-9;]*m")
+
+
+def _rel(path: str, root: Optional[Path]) -> str:
+    path = path.strip().replace("\\", "/")
+    if root is not None:
+        try:
+            return Path(path).resolve().relative_to(root.resolve()).as_posix() if Path(path).is_absolute() else path
+        except ValueError:
+            return path
+    return path
+
+
+def parse_tsc(output: str, root: Optional[Path] = None) -> List[dict]:
+    output = _ANSI.sub("", output)
+    errors = []
+    for rx in (_TSC_PAREN, _TSC_PRETTY):
+        for m in rx.finditer(output):
+            errors.append({
+                "tool": "tsc", "file": _rel(m["file"], root), "line": int(m["line"]), "col": int(m["col"]),
+                "code": m["code"], "message": m["msg"].strip(),
+            })
+    return errors
+
+
+def parse_python(output: str, root: Optional[Path] = None) -> List[dict]:
+    """py_compile (traceback ou 'Sorry:') e pyright."""
+    output = _ANSI.sub("", output)
+    errors = []
+    for m in _PYRIGHT.finditer(output):
+        errors.append({"tool": "pyright", "file": _rel(m["file"], root), "line": int(m["line"]),
+                       "col": int(m["col"]), "code": "", "message": m["msg"].strip()})
+    for m in _PY_SORRY.finditer(output):
+        errors.append({"tool": "py_compile", "file": _rel(m["file"], root), "line": int(m["line"]),
+                       "col": 0, "code": m["code"], "message": m["msg"].strip()})
+    # Traceback: o último 'File "...", line N' antes da linha XxxError: msg (uma passada só)
+    frames = _PY_FILE.finditer(output)
+    last, pending = None, next(frames, None)
+    for err in _PY_ERROR.finditer(output):
+        while pending is not None and pending.start() < err.start():
+            last, pending = pending, next(frames, None)
+        if last is None:
+            continue
+        errors.append({"tool": "py_compile", "file": _rel(last["file"], root), "line": int(last["line"]),
+                       "col": 0, "code": err["code"], "message": err["msg"].strip()})
+    return _dedupe(errors)
+
+
+def parse_npm(output: str, manifest: str = "package.json") -> List[dict]:
+    """Erros do npm não têm linha: apontam para o package.json."""
+    msgs = [m["msg"].strip() for m in _NPM_ERR.finditer(_ANSI.sub("", output))]
+    msgs = [m for m in msgs if m and not m.startswith(("A complete log", "/"))]
+    if not msgs:
+        return []
+    return [{"tool": "npm", "file": manifest, "line": 0, "col": 0, "code": "npm",
+             "message": " | ".join(msgs[:8])}]
+
+
+def _dedupe(errors: List[dict]) -> List[dict]:
+    seen, out = set(), []
+    for e in errors:
+        key = (e["file"], e["line"], e["message"])
+        if key not in seen:
+            seen.add(key)
+            out.append(e)
+    return out
+
+
+def group_by_file(errors: List[dict]) -> dict:
+    grouped: dict = {}
+    for e in _dedupe(errors):
+        grouped.setdefault(e["file"], []).append(e)
+    return grouped
+
+
+def format_error(e: dict) -> str:
+    loc = f"{e['file']}:{e['line']}" + (f":{e['col']}" if e.get("col") else "")
+    code = f" {e['code']}" if e.get("code") else ""
+    return f"{loc} [{e['tool']}{code}] {e['message']}"
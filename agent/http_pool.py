@@ -0,0 +1,72 @@
+"""
+GenLab Engine — HTTP Pool
+Clientes HTTP compartilhados pelo processo (keep-alive + pool de conexões)
+para o LLM local e o servidor de licenças.
+"""
+import os
+import threading
+from typing import Optional
+
+import httpx
+
+try:
+    import h2  # noqa: F401  — habilita HTTP/2 (só em endpoints https)
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+
+MAX_CONNECTIONS = int(os.environ.get("LLM_HTTP_MAX_CONNECTIONS", "32"))
+MAX_KEEPALIVE = int(os.environ.get("LLM_HTTP_MAX_KEEPALIVE", "16"))
+KEEPALIVE_EXPIRY = float(os.environ.get("LLM_HTTP_KEEPALIVE_EXPIRY", "120"))
+CONNECT_TIMEOUT = float(os.environ.get("LLM_HTTP_CONNECT_TIMEOUT", "5"))
+# Limite total de uma chamada. Vale também como timeout de leitura no streaming:
+# o primeiro byte só chega depois do prefill, que num modelo local pode levar minutos
+TOTAL_TIMEOUT = float(os.environ.get("LLM_HTTP_TOTAL_TIMEOUT", "300"))
+
+_client: Optional[httpx.Client] = None
+_async_client: Optional[httpx.AsyncClient] = None
+_lock = threading.Lock()
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+
+
+def request_timeout() -> httpx.Timeout:
+    """Timeout de conexão separado do de leitura."""
+    return httpx.Timeout(connect=CONNECT_TIMEOUT, read=TOTAL_TIMEOUT, write=30.0, pool=30.0)
+
+
+def get_client() -> httpx.Client:
+    """Cliente síncrono compartilhado (thread-safe)."""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = httpx.Client(http2=HTTP2, limits=_limits(), timeout=request_timeout())
+    return _client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Cliente assíncrono compartilhado (só no event loop do servidor: as conexões ficam presas a ele)."""
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(http2=HTTP2, limits=_limits(), timeout=request_timeout())
+    return _async_client
+
+
+async def close_clients() -> None:
+    """Fecha os pools (chamado no shutdown do servidor)."""
+    global _client, _async_client
+    with _lock:
+        client, _client = _client, None
+    if client is not None:
+        client.close()
+    if _async_client is not None:
+        aclient, _async_client = _async_client, None
+        await aclient.aclose()
@@ -11,7 +11,7 @@ import time
 from pathlib import Path
 from typing import Optional
 
-import requests
+import http_pool
 
 LICENSE_FILE = Path.home() / ".infinity_agent" / ".license"
 HEARTBEAT_INTERVAL = 3600  # 1 hour
@@ -55,7 +55,7 @@ def _call_server(action: str, license_key: str, hardware_id: Optional[str] = Non
         payload["hardware_id"] = hardware_id
     
     try:
-        resp = requests.post(LICENSE_SERVER_URL, json=payload, timeout=10)
+        resp = http_pool.get_client().post(LICENSE_SERVER_URL, json=payload, timeout=10)
         return resp.json()
     except Exception as e:
         # If server unreachable, allow grace period
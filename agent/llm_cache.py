@@ -0,0 +1,180 @@
+"""
+GenLab Engine — LLM Cache
+Cache em disco das respostas do LLM, indexado por provider/modelo/parâmetros
+e hash do prompt, com limite de tamanho e despejo LRU/TTL.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+
+APP_ROOT = Path(os.environ.get("INFINITY_WORKDIR", str(Path.home() / ".infinity_agent"))).resolve()
+CACHE_DIR = APP_ROOT / "llm_cache"
+MAX_BYTES = int(float(os.environ.get("LLM_CACHE_MAX_MB", "256")) * 1024 * 1024)
+TTL_SECONDS = int(os.environ.get("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+
+EVICT_EVERY = 100  # gravações entre varreduras completas (TTL e escritas de outros workers)
+EVICT_TARGET = 0.9
+
+_lock = threading.Lock()
+_evict_lock = threading.Lock()
+_counters = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "bypassed": 0}
+_bytes: Optional[int] = None  # tamanho do cache desde a última varredura; None = ainda não medido
+_puts = 0
+
+
+def enabled() -> bool:
+    return os.environ.get("LLM_CACHE_DISABLED", "").lower() not in ("1", "true", "yes")
+
+
+def make_key(provider: str, model: str, temperature: float, max_tokens: int, messages: list) -> str:
+    """Chave: provider + modelo + temperatura + max_tokens + hash das mensagens."""
+    prompt_hash = hashlib.sha256(json.dumps(messages, ensure_ascii=False, sort_keys=True).encode()).hexdigest()
+    raw = f"{provider}|{model}|{temperature}|{max_tokens}|{prompt_hash}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def _path(key: str) -> Path:
+    return CACHE_DIR / key[:2] / f"{key}.json"
+
+
+def get(key: str) -> Optional[str]:
+    """Retorna a resposta em cache (ou None). Atualiza o mtime para o LRU."""
+    global _bytes
+    p = _path(key)
+    try:
+        st = p.stat()
+        # TTL por inatividade (mtime = último acesso), a mesma regra da varredura
+        expired = time.time() - st.st_mtime > TTL_SECONDS
+        entry = None if expired else json.loads(p.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        with _lock:
+            _counters["misses"] += 1
+        return None
+    if expired:
+        p.unlink(missing_ok=True)
+        with _lock:
+            _counters["misses"] += 1
+            _counters["evictions"] += 1
+            if _bytes is not None:
+                _bytes -= st.st_size
+        return None
+    try:
+        os.utime(p)
+    except OSError:
+        pass
+    with _lock:
+        _counters["hits"] += 1
+    return entry.get("response")
+
+
+def put(key: str, response: str, **meta) -> None:
+    """Grava a resposta (escrita atômica); o limite de tamanho usa o total corrente."""
+    global _bytes, _puts
+    p = _path(key)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        old = p.stat().st_size
+    except OSError:
+        old = 0
+    tmp = p.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_text(json.dumps({"created_at": time.time(), "response": response, **meta}), encoding="utf-8")
+    size = tmp.stat().st_size
+    os.replace(tmp, p)
+    with _lock:
+        _counters["stores"] += 1
+        if _bytes is not None:
+            _bytes += size - old
+        _puts += 1
+        scan = _bytes is None or _bytes > MAX_BYTES or _puts % EVICT_EVERY == 0
+    if scan:
+        _evict()
+
+
+def record_bypass() -> None:
+    with _lock:
+        _counters["bypassed"] += 1
+
+
+def _entries() -> list:
+    out = []
+    if not CACHE_DIR.exists():
+        return out
+    for sub in CACHE_DIR.iterdir():
+        if not sub.is_dir():
+            continue
+        for f in sub.glob("*.json"):
+            try:
+                st = f.stat()
+            except OSError:
+                continue
+            out.append((st.st_mtime, st.st_size, f))
+    return out
+
+
+def _evict() -> None:
+    """Varredura completa: TTL, limite de tamanho e novo total. Uma thread por vez, fora do _lock."""
+    global _bytes
+    if not _evict_lock.acquire(blocking=False):
+        return
+    try:
+        now = time.time()
+        total, evicted = 0, 0
+        live = []
+        for mtime, size, f in _entries():
+            # mtime = último acesso; entradas sem uso além do TTL saem direto
+            if now - mtime > TTL_SECONDS:
+                f.unlink(missing_ok=True)
+                evicted += 1
+            else:
+                live.append((mtime, size, f))
+                total += size
+        live.sort()
+        # Acima do limite, desce até EVICT_TARGET dele: as próximas gravações não varrem de novo
+        limit = MAX_BYTES * EVICT_TARGET if total > MAX_BYTES else MAX_BYTES
+        while total > limit and live:
+            _, size, f = live.pop(0)
+            f.unlink(missing_ok=True)
+            total -= size
+            evicted += 1
+        with _lock:
+            _bytes = total
+            _counters["evictions"] += evicted
+    finally:
+        _evict_lock.release()
+
+
+def counters() -> dict:
+    """Só os contadores (stats() também varre o diretório do cache)."""
+    with _lock:
+        return dict(_counters)
+
+
+def stats() -> dict:
+    entries = _entries()
+    with _lock:
+        counters = dict(_counters)
+    lookups = counters["hits"] + counters["misses"]
+    return {
+        **counters,
+        "hit_rate": round(counters["hits"] / lookups, 3) if lookups else 0.0,
+        "entries": len(entries),
+        "bytes": sum(size for _, size, _ in entries),
+        "max_bytes": MAX_BYTES,
+        "ttl_seconds": TTL_SECONDS,
+        "enabled": enabled(),
+    }
+
+
+def clear() -> int:
+    global _bytes
+    entries = _entries()
+    for _, _, f in entries:
+        f.unlink(missing_ok=True)
+    with _lock:
+        _bytes = None
+    return len(entries)
@@ -0,0 +1,218 @@
+"""
+GenLab Engine — LLM Metrics
+Telemetria das chamadas ao LLM: tamanho do prompt, TTFT, latência, tokens/s,
+status HTTP e sucesso do parse, agregados por modelo e por endpoint.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Optional
+
+import shared_state
+
+
+APP_ROOT = Path(os.environ.get("INFINITY_WORKDIR", str(Path.home() / ".infinity_agent"))).resolve()
+# Um arquivo por worker: cada processo só vê as próprias chamadas
+SUMMARY_FILE = APP_ROOT / (f"llm_metrics.{os.getpid()}.json" if shared_state.multi_worker() else "llm_metrics.json")
+FLUSH_INTERVAL = float(os.environ.get("LLM_METRICS_FLUSH", "10"))
+RECENT_MAX = 200
+SAMPLES_MAX = 1000
+
+# Limites superiores dos buckets dos histogramas (o último é +Inf)
+PROMPT_TOKEN_BUCKETS = (256, 1024, 2048, 4096, 8192, 16384, 32768, 65536)
+LATENCY_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600)
+TTFT_BUCKETS = (0.1, 0.5, 1, 2, 5, 10, 30, 60)
+
+_lock = threading.Lock()
+_series: dict = {}
+_recent: deque = deque(maxlen=RECENT_MAX)
+_last_flush = 0.0
+
+
+class _Series:
+    def __init__(self, model: str, endpoint: str):
+        self.model = model
+        self.endpoint = endpoint
+        self.calls = 0
+        self.errors = 0
+        self.cache_hits = 0
+        self.statuses: dict = {}
+        self.prompt_chars = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.gen_seconds = 0.0
+        self.parse_ok = 0
+        self.parse_failed = 0
+        self.hist = {
+            "prompt_tokens": [0] * (len(PROMPT_TOKEN_BUCKETS) + 1),
+            "latency_s": [0] * (len(LATENCY_BUCKETS) + 1),
+            "ttft_s": [0] * (len(TTFT_BUCKETS) + 1),
+        }
+        self.sums = {"prompt_tokens": 0, "latency_s": 0.0, "ttft_s": 0.0}
+        self.latencies: deque = deque(maxlen=SAMPLES_MAX)
+        self.ttfts: deque = deque(maxlen=SAMPLES_MAX)
+
+    def to_dict(self) -> dict:
+        done = self.calls - self.errors - self.cache_hits
+        return {
+            "model": self.model,
+            "endpoint": self.endpoint,
+            "calls": self.calls,
+            "errors": self.errors,
+            "cache_hits": self.cache_hits,
+            "http_status": dict(sorted(self.statuses.items())),
+            "avg_prompt_chars": round(self.prompt_chars / self.calls) if self.calls else None,
+            "avg_prompt_tokens": round(self.prompt_tokens / self.calls) if self.calls else None,
+            "output_tokens": self.output_tokens,
+            "avg_output_tokens": round(self.output_tokens / done) if done > 0 else None,
+            "tokens_per_sec": round(self.output_tokens / self.gen_seconds, 2) if self.gen_seconds else None,
+            "latency_s": _summary(self.latencies),
+            "ttft_s": _summary(self.ttfts),
+            "parse_ok": self.parse_ok,
+            "parse_failed": self.parse_failed,
+            "histograms": {
+                "prompt_tokens": _buckets(PROMPT_TOKEN_BUCKETS, self.hist["prompt_tokens"]),
+                "latency_s": _buckets(LATENCY_BUCKETS, self.hist["latency_s"]),
+                "ttft_s": _buckets(TTFT_BUCKETS, self.hist["ttft_s"]),
+                "sums": {k: round(v, 3) for k, v in self.sums.items()},
+            },
+        }
+
+
+def _observe(counts: list, bounds: tuple, value: float) -> None:
+    for i, b in enumerate(bounds):
+        if value <= b:
+            counts[i] += 1
+            return
+    counts[-1] += 1
+
+
+def _buckets(bounds: tuple, counts: list) -> dict:
+    labels = [str(b) for b in bounds] + ["+Inf"]
+    return dict(zip(labels, counts))
+
+
+def _summary(samples) -> Optional[dict]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {"avg": round(sum(ordered) / len(ordered), 3), "p50": round(pick(0.5), 3),
+            "p95": round(pick(0.95), 3), "max": round(ordered[-1], 3)}
+
+
+def _get(model: str, endpoint: str) -> _Series:
+    key = (model, endpoint)
+    if key not in _series:
+        _series[key] = _Series(model, endpoint)
+    return _series[key]
+
+
+def record_call(model: str, endpoint: str, prompt_chars: int, prompt_tokens: int, backend: str = "",
+                status: Optional[int] = None, ok: bool = True, latency: float = 0.0,
+                ttft: Optional[float] = None, output_tokens: int = 0, gen_seconds: float = 0.0,
+                cached: bool = False, error: str = "") -> None:
+    """Uma tentativa de chamada (cada failover conta como uma)."""
+    with _lock:
+        s = _get(model, endpoint)
+        s.calls += 1
+        s.prompt_chars += prompt_chars
+        s.prompt_tokens += prompt_tokens
+        _observe(s.hist["prompt_tokens"], PROMPT_TOKEN_BUCKETS, prompt_tokens)
+        s.sums["prompt_tokens"] += prompt_tokens
+        if cached:
+            s.cache_hits += 1
+        elif not ok:
+            s.errors += 1
+        else:
+            s.output_tokens += output_tokens
+            s.gen_seconds += gen_seconds
+            s.latencies.append(latency)
+            _observe(s.hist["latency_s"], LATENCY_BUCKETS, latency)
+            s.sums["latency_s"] += latency
+            if ttft is not None:
+                s.ttfts.append(ttft)
+                _observe(s.hist["ttft_s"], TTFT_BUCKETS, ttft)
+                s.sums["ttft_s"] += ttft
+        if status is not None:
+            s.statuses[str(status)] = s.statuses.get(str(status), 0) + 1
+        _recent.append({
+            "ts": round(time.time(), 3), "model": model, "endpoint": endpoint, "backend": backend,
+            "prompt_chars": prompt_chars, "prompt_tokens": prompt_tokens, "status": status, "ok": ok,
+            "cached": cached, "latency_s": round(latency, 3), "ttft_s": round(ttft, 3) if ttft is not None else None,
+            "output_tokens": output_tokens,
+            "tokens_per_sec": round(output_tokens / gen_seconds, 2) if gen_seconds else None,
+            "error": error[:200],
+        })
+    _maybe_flush()
+
+
+def record_parse(model: str, endpoint: str, ok: bool) -> None:
+    """Resultado do extract_files_json (ou da aplicação do diff) sobre a resposta."""
+    with _lock:
+        s = _get(model, endpoint)
+        if ok:
+            s.parse_ok += 1
+        else:
+            s.parse_failed += 1
+    _maybe_flush()
+
+
+def summary(recent: int = 50) -> dict:
+    with _lock:
+        series = [s.to_dict() for _, s in sorted(_series.items())]
+        events = list(_recent)[-recent:] if recent > 0 else []
+    return {"generated_at": round(time.time(), 3), "series": series, "recent": events}
+
+
+def reset() -> None:
+    with _lock:
+        _series.clear()
+        _recent.clear()
+    flush()
+
+
+def flush() -> None:
+    """Grava o resumo em APP_ROOT/llm_metrics.json (escrita atômica)."""
+    global _last_flush
+    _last_flush = time.monotonic()
+    data = summary(recent=RECENT_MAX)
+    try:
+        SUMMARY_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp = SUMMARY_FILE.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(data, indent=2), encoding="utf-8")
+        os.replace(tmp, SUMMARY_FILE)
+    except OSError:
+        pass
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _prune_dead_workers() -> None:
+    """Apaga os resumos de workers que já morreram (cada restart traz pids novos)."""
+    if os.name == "nt":  # no Windows, os.kill(pid, 0) encerraria o processo
+        return
+    for p in APP_ROOT.glob("llm_metrics.*.json"):
+        pid = p.name.split(".")[1]
+        if pid.isdigit() and int(pid) != os.getpid() and not _pid_alive(int(pid)):
+            p.unlink(missing_ok=True)
+
+
+def _maybe_flush() -> None:
+    if time.monotonic() - _last_flush >= FLUSH_INTERVAL:
+        flush()
+
+
+# Ao subir cada worker: resumos de processos anteriores não se acumulam em APP_ROOT
+_prune_dead_workers()
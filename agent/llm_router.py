@@ -0,0 +1,340 @@
+"""
+GenLab Engine — LLM Router
+Pool de backends LLM (vários Ollama / LM Studio na rede) com limite de
+concorrência por backend, fila com prioridade, health check e failover.
+"""
+import asyncio
+import heapq
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+import http_pool
+import shared_state
+
+
+APP_ROOT = Path(os.environ.get("INFINITY_WORKDIR", str(Path.home() / ".infinity_agent"))).resolve()
+BACKENDS_FILE = APP_ROOT / "llm_backends.json"
+
+PRIORITY_INTERACTIVE = 0   # auto-fix, chamadas do editor
+PRIORITY_BULK = 10         # recreate e jobs em lote
+
+ROUTING = os.environ.get("LLM_ROUTING", "least-loaded")  # ou "round-robin"
+QUEUE_MAX = int(os.environ.get("LLM_QUEUE_MAX", "64"))
+QUEUE_TIMEOUT = float(os.environ.get("LLM_QUEUE_TIMEOUT", "900"))
+DEFAULT_MAX_CONCURRENT = int(os.environ.get("LLM_MAX_CONCURRENT", "2"))
+COOLDOWN = float(os.environ.get("LLM_BACKEND_COOLDOWN", "30"))
+HEALTH_INTERVAL = float(os.environ.get("LLM_HEALTH_INTERVAL", "30"))
+WARMUP = os.environ.get("LLM_WARMUP", "1") != "0"
+KEEP_ALIVE = os.environ.get("LLM_KEEP_ALIVE", "30m")  # Ollama: tempo com o modelo carregado
+WARMUP_TIMEOUT = float(os.environ.get("LLM_WARMUP_TIMEOUT", "300"))
+SLOT_POLL = 0.25
+
+
+class NoBackendError(RuntimeError):
+    pass
+
+
+class Backend:
+    def __init__(self, name: str, base_url: str, provider: str = "ollama",
+                 models: Optional[List[str]] = None, max_concurrent: int = DEFAULT_MAX_CONCURRENT):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.provider = provider
+        self.models = list(models or [])
+        # Limite do backend somando todos os workers (vagas em shared_state)
+        self.max_concurrent = max(1, int(max_concurrent))
+        self.in_flight = 0
+        self.slots: list = []
+        self.healthy = True
+        self.down_until = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.latency_total = 0.0
+        self.ttft_total = 0.0
+        self.ttft_count = 0
+        self.tokens_total = 0
+        self.gen_seconds = 0.0
+        self.last_error = ""
+        self.warm_seconds: Optional[float] = None
+        self.warmed_at: Optional[float] = None
+
+    def serves(self, model: str) -> bool:
+        return not self.models or model in self.models
+
+    def usable(self, now: float) -> bool:
+        # Backend fora do ar volta a receber uma tentativa depois do cooldown
+        return self.healthy or now >= self.down_until
+
+    def to_dict(self) -> dict:
+        done = self.requests - self.errors
+        return {
+            "name": self.name,
+            "provider": self.provider,
+            "base_url": self.base_url,
+            "models": self.models,
+            "max_concurrent": self.max_concurrent,
+            "in_flight": self.in_flight,
+            "healthy": self.healthy,
+            "requests": self.requests,
+            "errors": self.errors,
+            "last_error": self.last_error,
+            "avg_latency_s": round(self.latency_total / done, 3) if done > 0 else None,
+            "avg_ttft_s": round(self.ttft_total / self.ttft_count, 3) if self.ttft_count else None,
+            "tokens_per_sec": round(self.tokens_total / self.gen_seconds, 2) if self.gen_seconds else None,
+            "warm_seconds": round(self.warm_seconds, 3) if self.warm_seconds is not None else None,
+            "warmed_at": self.warmed_at,
+        }
+
+
+class LLMRouter:
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._configured: List[Backend] = []
+        self._defaults: dict = {}   # base_url -> Backend (modo de backend único via env)
+        self._waiters: list = []
+        self._seq = 0
+        self._rr = 0
+        self._health_task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._file_stamp: Optional[int] = None
+
+    # ── Configuração ──
+
+    def configure(self, backends: List[dict], persist: bool = True) -> None:
+        built = [
+            Backend(
+                name=b.get("name") or b["base_url"],
+                base_url=b["base_url"],
+                provider=b.get("provider", "ollama"),
+                models=b.get("models"),
+                max_concurrent=b.get("max_concurrent", DEFAULT_MAX_CONCURRENT),
+            )
+            for b in backends
+        ]
+        with self._cond:
+            self._configured = built
+            self._cond.notify_all()
+        if persist:
+            BACKENDS_FILE.parent.mkdir(parents=True, exist_ok=True)
+            tmp = BACKENDS_FILE.with_suffix(f".{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(backends, indent=2))
+            os.replace(tmp, BACKENDS_FILE)
+            self._file_stamp = self._stamp()
+
+    def load(self) -> None:
+        raw = os.environ.get("LLM_BACKENDS")
+        self._file_stamp = self._stamp()
+        if not raw and BACKENDS_FILE.exists():
+            raw = BACKENDS_FILE.read_text()
+        if raw:
+            try:
+                self.configure(json.loads(raw), persist=False)
+            except (ValueError, KeyError, TypeError):
+                pass
+
+    @staticmethod
+    def _stamp() -> Optional[int]:
+        try:
+            return BACKENDS_FILE.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def sync(self) -> None:
+        """Multi-worker: recarrega o pool se outro worker gravou um novo llm_backends.json."""
+        if not shared_state.multi_worker():
+            return
+        stamp = self._stamp()
+        if stamp == self._file_stamp:
+            return
+        self._file_stamp = stamp
+        try:
+            self.configure(json.loads(BACKENDS_FILE.read_text()) if stamp else [], persist=False)
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+    def _backends(self, config: dict) -> List[Backend]:
+        if self._configured:
+            return self._configured
+        url = config["base_url"].rstrip("/")
+        if url not in self._defaults:
+            self._defaults[url] = Backend("default", url, config.get("provider", "ollama"))
+        return [self._defaults[url]]
+
+    # ── Seleção ──
+
+    def _pick(self, config: dict, exclude: Iterable[str]):
+        """Retorna (backend livre ou None, existe algum candidato?)."""
+        now = time.monotonic()
+        serving = [b for b in self._backends(config) if b.serves(config["model"]) and b.name not in exclude]
+        # Cooldown só serve para desviar para outro backend: sem alternativa, tenta mesmo assim
+        # (com um backend só, um erro passageiro bloquearia todas as chamadas por COOLDOWN segundos)
+        candidates = [b for b in serving if b.usable(now)] or serving
+        free = [b for b in candidates if b.in_flight < b.max_concurrent]
+        if not free:
+            return None, bool(candidates)
+        if ROUTING == "round-robin":
+            self._rr += 1
+            start = self._rr % len(free)
+            order = free[start:] + free[:start]
+        else:
+            order = sorted(free, key=lambda b: (b.in_flight / b.max_concurrent, b.latency_total / max(1, b.requests)))
+        for b in order:
+            # Outros workers podem estar usando as vagas que este processo vê livres
+            slot = shared_state.try_slots(f"llm:{b.base_url}", b.max_concurrent)
+            if slot is not None:
+                b.slots.append(slot)
+                return b, True
+        return None, True
+
+    def acquire(self, config: dict, priority: int = PRIORITY_BULK, exclude: Iterable[str] = ()) -> Backend:
+        exclude = set(exclude)
+        self.sync()
+        with self._cond:
+            if len(self._waiters) >= QUEUE_MAX:
+                raise NoBackendError("LLM queue is full")
+            self._seq += 1
+            entry = (priority, self._seq)
+            heapq.heappush(self._waiters, entry)
+            deadline = time.monotonic() + QUEUE_TIMEOUT
+            try:
+                while True:
+                    if self._waiters[0] == entry:
+                        backend, any_candidate = self._pick(config, exclude)
+                        if backend is not None:
+                            backend.in_flight += 1
+                            return backend
+                        if not any_candidate:
+                            raise NoBackendError(f"No healthy LLM backend serves model '{config['model']}'")
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError("Timed out waiting for an LLM backend slot")
+                    # Vagas soltas por outro worker não notificam: consulta de novo em pouco tempo
+                    self._cond.wait(timeout=min(remaining, SLOT_POLL if shared_state.multi_worker() else 1.0))
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    def release(self, backend: Backend, ok: Optional[bool] = None, latency: float = 0.0, tokens: int = 0,
+                gen_seconds: float = 0.0, ttft: Optional[float] = None, error: str = "") -> None:
+        """ok=None: sem resultado (cancelado / erro do cliente) — só libera o slot."""
+        with self._cond:
+            backend.in_flight -= 1
+            if backend.slots:
+                backend.slots.pop().release()
+            self._cond.notify_all()
+            if ok is None:
+                return
+            backend.requests += 1
+            if ok:
+                backend.healthy = True
+                backend.latency_total += latency
+                backend.tokens_total += tokens
+                backend.gen_seconds += gen_seconds
+                if ttft is not None:
+                    backend.ttft_total += ttft
+                    backend.ttft_count += 1
+            else:
+                backend.errors += 1
+                backend.healthy = False
+                backend.down_until = time.monotonic() + COOLDOWN
+                backend.last_error = error[:300]
+
+    # ── Health checks ──
+
+    async def _probe(self, b: Backend) -> None:
+        try:
+            resp = await http_pool.get_async_client().get(f"{b.base_url}/models", timeout=3)
+            ok = resp.status_code < 500
+        except Exception as e:
+            ok = False
+            b.last_error = str(e)[:300]
+        with self._cond:
+            b.healthy = ok
+            if not ok:
+                b.down_until = time.monotonic() + COOLDOWN
+            self._cond.notify_all()
+
+    async def check_health(self) -> List[dict]:
+        """Testa todos os backends em paralelo, no event loop (sem ocupar threads)."""
+        with self._cond:
+            backends = list(self._configured) or list(self._defaults.values())
+        await asyncio.gather(*(self._probe(b) for b in backends))
+        return self.stats()
+
+    def start_health_checks(self) -> None:
+        """Chamado no startup do servidor: health checks e warm-ups rodam no event loop dele."""
+        if self._health_task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+
+        async def loop():
+            while True:
+                await asyncio.sleep(HEALTH_INTERVAL)
+                if len(self._configured) > 1:
+                    try:
+                        await self.check_health()
+                    except Exception:
+                        pass
+
+        self._health_task = self._loop.create_task(loop())
+
+    def stop_health_checks(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        self._loop = None
+
+    # ── Warm-up ──
+
+    async def _warm_one(self, backend: Backend, model: str) -> dict:
+        t0 = time.monotonic()
+        client = http_pool.get_async_client()
+        try:
+            if backend.provider == "ollama":
+                # API nativa: sem prompt só carrega o modelo e fixa o keep_alive
+                root = backend.base_url[:-3] if backend.base_url.endswith("/v1") else backend.base_url
+                resp = await client.post(f"{root}/api/generate", json={"model": model, "keep_alive": KEEP_ALIVE},
+                                         timeout=WARMUP_TIMEOUT)
+            else:
+                resp = await client.post(f"{backend.base_url}/chat/completions", timeout=WARMUP_TIMEOUT, json={
+                    "model": model, "messages": [{"role": "user", "content": "ok"}], "max_tokens": 1,
+                })
+            resp.raise_for_status()
+        except Exception as e:
+            return {"backend": backend.name, "ok": False, "error": str(e)[:300]}
+        elapsed = time.monotonic() - t0
+        with self._cond:
+            backend.warm_seconds = elapsed
+            backend.warmed_at = time.time()
+        return {"backend": backend.name, "ok": True, "seconds": round(elapsed, 3)}
+
+    async def warm_up(self, config: dict) -> List[dict]:
+        """Carrega o modelo em todos os backends que o servem (em paralelo)."""
+        with self._cond:
+            backends = [b for b in self._backends(config) if b.serves(config["model"])]
+        results = await asyncio.gather(*(self._warm_one(b, config["model"]) for b in backends))
+        return sorted(results, key=lambda r: r["backend"])
+
+    def warm_up_background(self, config: dict) -> None:
+        """Agenda o warm-up no loop do servidor; pode ser chamado de qualquer thread."""
+        if WARMUP and self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self.warm_up(config), self._loop)
+
+    def stats(self) -> List[dict]:
+        self.sync()
+        with self._cond:
+            backends = list(self._configured) or list(self._defaults.values())
+            return [b.to_dict() for b in backends]
+
+    def queue_depth(self) -> int:
+        with self._cond:
+            return len(self._waiters)
+
+
+ROUTER = LLMRouter()
+ROUTER.load()
@@ -0,0 +1,241 @@
+"""
+GenLab Engine — Metrics
+Métricas no formato texto do Prometheus (/metrics): latência, tamanho da
+resposta e requisições em andamento por rota, duração dos subprocessos por
+tipo, saturação dos pools de threads, locks e taxas de acerto dos caches.
+"""
+import os
+import threading
+import time
+from typing import List, Tuple
+
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+CMD_BUCKETS = (0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1800)
+WAIT_BUCKETS = (0.01, 0.1, 0.5, 1, 5, 15, 60, 300)
+
+STARTED_AT = time.time()
+# Cada worker tem seus próprios contadores: o pid separa as séries de cada um no Prometheus
+WORKER = str(os.getpid())
+
+
+def _labels(names: Tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'worker="{WORKER}"'] + [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...], buckets: tuple):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series: dict = {}  # labels -> [contagem por bucket..., +Inf, soma]
+
+    def observe(self, values: tuple, value: float) -> None:
+        with self._lock:
+            row = self._series.get(values)
+            if row is None:
+                row = self._series[values] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    row[i] += 1
+                    break
+            else:
+                row[len(self.buckets)] += 1
+            row[-1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        return histogram_lines(self.name, self.help, self.labels, self.buckets, series)
+
+
+def histogram_lines(name: str, help: str, labels: Tuple[str, ...], buckets: tuple, series: dict) -> List[str]:
+    """series: labels -> [contagem por bucket (não cumulativa)..., +Inf, soma]."""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} histogram"]
+    for values, row in sorted(series.items()):
+        cumulative = 0
+        for b, count in zip(list(buckets) + ["+Inf"], row[:-1]):
+            cumulative += count
+            le = 'le="+Inf"' if b == "+Inf" else f'le="{_fmt(b)}"'
+            lines.append(f"{name}_bucket{_labels(labels, values, le)} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labels, values)} {_fmt(row[-1])}")
+        lines.append(f"{name}_count{_labels(labels, values)} {cumulative}")
+    return lines
+
+
+def metric_lines(name: str, kind: str, help: str, samples: list) -> List[str]:
+    """samples: [(nomes dos labels, valores, número)]."""
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for names, values, value in samples:
+        if value is not None:
+            lines.append(f"{name}{_labels(names, values)} {_fmt(value)}")
+    return lines
+
+
+REQUEST_DURATION = Histogram("genlab_http_request_duration_seconds", "HTTP request latency by route.",
+                             ("method", "route", "status"), REQUEST_BUCKETS)
+RESPONSE_SIZE = Histogram("genlab_http_response_size_bytes", "HTTP response body size by route.",
+                          ("method", "route"), SIZE_BUCKETS)
+CMD_DURATION = Histogram("genlab_cmd_duration_seconds", "Subprocess run time by command type.",
+                         ("kind", "ok"), CMD_BUCKETS)
+CMD_WAIT = Histogram("genlab_cmd_queue_wait_seconds", "Time a subprocess waited for a scheduler slot.",
+                     ("kind",), WAIT_BUCKETS)
+
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+
+
+def observe_cmd(kind: str, seconds: float, ok: bool, waited: float) -> None:
+    CMD_DURATION.observe((kind, "true" if ok else "false"), seconds)
+    CMD_WAIT.observe((kind,), waited)
+
+
+class MetricsMiddleware:
+    """ASGI puro (não bufferiza respostas em streaming): mede do início ao último byte."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global _in_flight
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status, size = 500, 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        with _in_flight_lock:
+            _in_flight += 1
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            with _in_flight_lock:
+                _in_flight -= 1
+            # Template da rota ("/v1/project/tree"), não o path com ids: cardinalidade fixa
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            REQUEST_DURATION.observe((scope["method"], route, str(status)), time.perf_counter() - start)
+            RESPONSE_SIZE.observe((scope["method"], route), size)
+
+
+def _cache_lines() -> List[str]:
+    import build_cache
+    import llm_cache
+    import project_analyzer
+    llm, analysis, build = llm_cache.counters(), project_analyzer.cache_counters(), build_cache.counters()
+    caches = {
+        "llm": (llm["hits"], llm["misses"]),
+        "analysis": (analysis["hits"] + analysis["shared_hits"], analysis["misses"]),
+        "build": (build["hits"], build["misses"]),
+    }
+    names = ("cache", "result")
+    lines = metric_lines("genlab_cache_requests_total", "counter", "Cache lookups by result.",
+                         [(names, (c, r), v) for c, (h, m) in caches.items() for r, v in (("hit", h), ("miss", m))])
+    lines += metric_lines("genlab_cache_hit_ratio", "gauge", "Hits / lookups since start.",
+                          [(("cache",), (c,), round(h / (h + m), 4) if h + m else None) for c, (h, m) in caches.items()])
+    return lines
+
+
+def _pool_lines() -> List[str]:
+    import anyio.to_thread
+    import project_locks
+    from scheduler import SCHEDULER
+    names = ("pool",)
+    pools = project_locks.pool_stats()
+    # Pool padrão do Starlette: endpoints sync e respostas em streaming sync
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    pools["starlette"] = {"max": limiter.total_tokens, "busy": limiter.borrowed_tokens,
+                          "queued": limiter.statistics().tasks_waiting}
+    lines = metric_lines("genlab_threadpool_max_workers", "gauge", "Thread pool size.",
+                         [(names, (n,), p["max"]) for n, p in pools.items()])
+    lines += metric_lines("genlab_threadpool_busy", "gauge", "Threads running a task.",
+                          [(names, (n,), p["busy"]) for n, p in pools.items()])
+    lines += metric_lines("genlab_threadpool_queued", "gauge", "Tasks waiting for a thread.",
+                          [(names, (n,), p["queued"]) for n, p in pools.items()])
+    lines += metric_lines("genlab_threadpool_saturation", "gauge", "busy / max.",
+                          [(names, (n,), round(p["busy"] / p["max"], 4)) for n, p in pools.items() if p["max"]])
+    sched = SCHEDULER.stats()
+    lines += metric_lines("genlab_scheduler_slots", "gauge", "Subprocess scheduler CPU slots.",
+                          [(("state",), ("capacity",), sched["capacity"]), (("state",), ("used",), sched["used"])])
+    lines += metric_lines("genlab_scheduler_running", "gauge", "Subprocesses running.", [((), (), sched["running"])])
+    lines += metric_lines("genlab_scheduler_queue_depth", "gauge", "Subprocesses waiting.",
+                          [((), (), sched["queue_depth"])])
+    lines += metric_lines("genlab_free_memory_bytes", "gauge", "Available memory.",
+                          [((), (), sched["free_memory_mb"] * 1024 * 1024 if sched["free_memory_mb"] else None)])
+    locks = project_locks.LOCKS.stats()
+    modes = ("read", "write")
+    lines += metric_lines("genlab_project_lock_acquired_total", "counter", "Project lock acquisitions.",
+                          [(("mode",), (m,), locks[m]["acquired"]) for m in modes])
+    lines += metric_lines("genlab_project_lock_contended_total", "counter", "Acquisitions that had to wait.",
+                          [(("mode",), (m,), locks[m]["contended"]) for m in modes])
+    lines += metric_lines("genlab_project_lock_wait_seconds_total", "counter", "Total time waiting for project locks.",
+                          [(("mode",), (m,), round(locks[m]["wait_total_s"], 6)) for m in modes])
+    return lines
+
+
+def _llm_lines() -> List[str]:
+    import llm_metrics
+    import llm_router
+    series = llm_metrics.summary(recent=0)["series"]
+    names = ("model", "endpoint")
+    calls = []
+    for s in series:
+        key = (s["model"], s["endpoint"])
+        calls += [(names + ("result",), key + ("ok",), s["calls"] - s["errors"] - s["cache_hits"]),
+                  (names + ("result",), key + ("error",), s["errors"]),
+                  (names + ("result",), key + ("cached",), s["cache_hits"])]
+    lines = metric_lines("genlab_llm_calls_total", "counter", "LLM call attempts by result.", calls)
+    lines += metric_lines("genlab_llm_output_tokens_total", "counter", "Generated tokens.",
+                          [(names, (s["model"], s["endpoint"]), s["output_tokens"]) for s in series])
+    lines += metric_lines("genlab_llm_parse_total", "counter", "Parse of LLM output into files/edits.",
+                          [(names + ("ok",), (s["model"], s["endpoint"], ok), v) for s in series
+                           for ok, v in (("true", s["parse_ok"]), ("false", s["parse_failed"]))])
+    for metric, key, buckets, help in (
+        ("genlab_llm_latency_seconds", "latency_s", llm_metrics.LATENCY_BUCKETS, "LLM call latency."),
+        ("genlab_llm_ttft_seconds", "ttft_s", llm_metrics.TTFT_BUCKETS, "LLM time to first token."),
+    ):
+        hist = {(s["model"], s["endpoint"]): list(s["histograms"][key].values()) + [s["histograms"]["sums"][key]]
+                for s in series}
+        lines += histogram_lines(metric, help, names, buckets, hist)
+    backends = llm_router.ROUTER.stats()
+    lines += metric_lines("genlab_llm_backend_in_flight", "gauge", "Requests running on each LLM backend.",
+                          [(("backend",), (b["name"],), b["in_flight"]) for b in backends])
+    lines += metric_lines("genlab_llm_queue_depth", "gauge", "Requests waiting for an LLM backend slot.",
+                          [((), (), llm_router.ROUTER.queue_depth())])
+    return lines
+
+
+def render(version: str) -> str:
+    """Chamado no event loop (lê o limiter do anyio)."""
+    lines = metric_lines("genlab_build_info", "gauge", "Agent version.", [(("version",), (version,), 1)])
+    lines += metric_lines("genlab_uptime_seconds", "gauge", "Seconds since the worker started.",
+                          [((), (), round(time.time() - STARTED_AT, 3))])
+    lines += metric_lines("genlab_http_requests_in_flight", "gauge", "HTTP requests being served.",
+                          [((), (), _in_flight)])
+    for hist in (REQUEST_DURATION, RESPONSE_SIZE, CMD_DURATION, CMD_WAIT):
+        lines += hist.render()
+    lines += _pool_lines()
+    lines += _cache_lines()
+    lines += _llm_lines()
+    return "\n".join(lines) + "\n"
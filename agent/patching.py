@@ -0,0 +1,138 @@
+"""
+GenLab Engine — Patching
+Aplicação de unified diffs (git apply) e de blocos SEARCH/REPLACE vindos do LLM.
+"""
+import re
+import uuid
+from pathlib import Path
+from typing import List, Optional
+
+from scheduler import run_cmd
+
+
+_FENCE = re.compile(r"```(?:diff|patch|udiff)?\s*\n(.*?)```", re.S)
+_SR_BLOCK = re.compile(
+    r"(?:^|\n)(?P<path>[^\n`<>=]+?)\s*\n(?:```[^\n]*\n)?<<<<<<< SEARCH\n(?P<search>.*?)\n?=======\n(?P<replace>.*?)\n?>>>>>>> REPLACE",
+    re.S,
+)
+
+
+def apply_unified_diff(repo_dir: Path, diff: str, lenient: bool = False) -> str:
+    """Aplica um unified diff com git apply (funciona também fora de repositórios git).
+
+    lenient: recalcula contagens dos hunks e ignora espaços — diffs de LLM raramente
+    trazem cabeçalhos @@ exatos.
+    """
+    repo_dir = Path(repo_dir)
+    # Nome único: vários workers podem aplicar patches no mesmo projeto
+    diff_file = repo_dir / f".infinity-{uuid.uuid4().hex[:12]}.patch"
+    if not diff.endswith("\n"):
+        diff += "\n"
+    diff_file.write_text(diff, encoding="utf-8")
+    cmd = ["git", "apply"]
+    if lenient:
+        cmd += ["--recount", "--ignore-whitespace"]
+    try:
+        return run_cmd(cmd + [diff_file.name], cwd=repo_dir)
+    finally:
+        if diff_file.exists():
+            diff_file.unlink()
+
+
+def extract_diff(text: str) -> Optional[str]:
+    """Unified diff da resposta (dentro de ```diff ou solto), com prefixos a/ b/ normalizados."""
+    blocks = [b for b in _FENCE.findall(text) if "@@" in b]
+    raw = "\n".join(blocks) if blocks else (text if "@@" in text and "+++ " in text else "")
+    if not raw:
+        return None
+    out = []
+    for line in raw.splitlines():
+        if line.startswith(("--- ", "+++ ")):
+            marker, path = line[:4], line[4:].split("\t")[0].strip()
+            if path != "/dev/null":
+                if path.startswith(("a/", "b/")):
+                    path = path[2:]
+                path = ("a/" if marker == "--- " else "b/") + path
+            line = marker + path
+        out.append(line)
+    return "\n".join(out) + "\n"
+
+
+def _header_path(line: str) -> Optional[str]:
+    path = line[4:].split("\t")[0].strip()
+    if not path or path == "/dev/null":
+        return None
+    return path[2:] if path.startswith(("a/", "b/")) else path
+
+
+def diff_paths(diff: str) -> List[str]:
+    """Arquivos tocados pelo diff (sem o prefixo a/ b/, se houver).
+
+    Aceita git diff, --no-prefix e diff -u. Só conta o par "--- "/"+++ " em linhas
+    seguidas: uma linha removida que começa com "-- " não é cabeçalho.
+    """
+    lines = diff.splitlines()
+    paths = []
+    for old, new in zip(lines, lines[1:]):
+        if old.startswith("--- ") and new.startswith("+++ "):
+            paths += [p for p in (_header_path(new), _header_path(old)) if p]
+    return list(dict.fromkeys(paths))
+
+
+def parse_search_replace(text: str) -> List[dict]:
+    """Blocos no formato:
+
+        caminho/do/arquivo
+        <<<<<<< SEARCH
+        trecho atual
+        =======
+        trecho novo
+        >>>>>>> REPLACE
+    """
+    return [
+        {"path": m["path"].strip().strip("`*# "), "search": m["search"], "replace": m["replace"]}
+        for m in _SR_BLOCK.finditer(text)
+    ]
+
+
+def apply_search_replace(repo_dir: Path, blocks: List[dict]) -> List[str]:
+    """Aplica os blocos; erro (ValueError) se algum trecho não for encontrado. Tudo ou nada por arquivo."""
+    repo_dir = Path(repo_dir).resolve()
+    by_file: dict = {}
+    for b in blocks:
+        by_file.setdefault(b["path"], []).append(b)
+    pending = {}
+    for path, file_blocks in by_file.items():
+        fp = (repo_dir / path).resolve()
+        if not str(fp).startswith(str(repo_dir)):
+            raise ValueError(f"Invalid path in edit: {path}")
+        text = fp.read_text(encoding="utf-8", errors="ignore") if fp.exists() else ""
+        for b in file_blocks:
+            if not b["search"].strip():
+                if fp.exists() and text.strip():
+                    raise ValueError(f"Empty SEARCH for existing file {path}")
+                text = b["replace"]
+                continue
+            if b["search"] in text:
+                text = text.replace(b["search"], b["replace"], 1)
+                continue
+            # Tolerância a espaços no fim das linhas
+            loose = _loose_replace(text, b["search"], b["replace"])
+            if loose is None:
+                raise ValueError(f"SEARCH block not found in {path}")
+            text = loose
+        pending[fp] = text
+    for fp, text in pending.items():
+        fp.parent.mkdir(parents=True, exist_ok=True)
+        fp.write_text(text, encoding="utf-8")
+    return list(by_file)
+
+
+def _loose_replace(text: str, search: str, replace: str) -> Optional[str]:
+    lines = text.split("\n")
+    needle = [l.rstrip() for l in search.split("\n")]
+    stripped = [l.rstrip() for l in lines]
+    for i in range(len(lines) - len(needle) + 1):
+        if stripped[i:i + len(needle)] == needle:
+            return "\n".join(lines[:i] + replace.split("\n") + lines[i + len(needle):])
+    return None
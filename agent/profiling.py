@@ -0,0 +1,219 @@
+"""
+GenLab Engine — Profiling
+Perfil sob demanda de uma requisição (header "X-Profile: 1" ou "?profile=1"),
+só com PROFILING_ENABLED=1. Um sampler amostra as pilhas das threads que
+trabalham para a requisição e grava em APP_ROOT/profiles o resumo (.json) e
+as pilhas no formato collapsed (.collapsed) para flamegraph.pl / speedscope.
+"""
+import asyncio
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from pathlib import Path
+from typing import List, Optional
+
+
+APP_ROOT = Path(os.environ.get("INFINITY_WORKDIR", str(Path.home() / ".infinity_agent"))).resolve()
+PROFILES_DIR = APP_ROOT / "profiles"
+ENABLED = os.environ.get("PROFILING_ENABLED", "0").lower() in ("1", "true", "yes")
+INTERVAL = float(os.environ.get("PROFILE_INTERVAL", "0.005"))
+MAX_SECONDS = float(os.environ.get("PROFILE_MAX_SECONDS", "300"))
+KEEP = int(os.environ.get("PROFILE_KEEP", "50"))
+TOP = 30
+PROFILE_ID = re.compile(r"^[A-Za-z0-9_-]+$")
+# Frames de infraestrutura na base das pilhas (pool de threads, follow), cortados do perfil
+_BASE_FILES = ("threading.py", os.path.join("concurrent", "futures", "thread.py"), "profiling.py")
+
+_session: ContextVar[Optional["Session"]] = ContextVar("profile_session", default=None)
+
+
+class Session:
+    def __init__(self, method: str, path: str):
+        self.id = f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        self.method = method
+        self.path = path
+        self.started_at = time.time()
+        self.samples: Counter = Counter()
+        self.total = 0
+        self._threads: dict = {}  # ident -> contagem de entradas (follow aninhado)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._run, name=f"profiler-{self.id}", daemon=True)
+
+    # ── Threads da requisição ──
+
+    def attach(self, ident: int) -> None:
+        with self._lock:
+            self._threads[ident] = self._threads.get(ident, 0) + 1
+
+    def detach(self, ident: int) -> None:
+        with self._lock:
+            if self._threads.get(ident, 0) <= 1:
+                self._threads.pop(ident, None)
+            else:
+                self._threads[ident] -= 1
+
+    # ── Amostragem ──
+
+    def start(self) -> None:
+        self._sampler.start()
+
+    def stop(self) -> float:
+        self._stop.set()
+        self._sampler.join()
+        return time.time() - self.started_at
+
+    def _run(self) -> None:
+        deadline = time.monotonic() + MAX_SECONDS
+        while not self._stop.wait(INTERVAL) and time.monotonic() < deadline:
+            with self._lock:
+                idents = list(self._threads)
+            if not idents:
+                continue
+            frames = sys._current_frames()
+            for ident in idents:
+                frame = frames.get(ident)
+                if frame is not None:
+                    self.samples[_stack(frame)] += 1
+                    self.total += 1
+
+    # ── Saída ──
+
+    def save(self, status: int, route: str, duration: float) -> dict:
+        self_counts: Counter = Counter()
+        total_counts: Counter = Counter()
+        for stack, n in self.samples.items():
+            self_counts[stack[-1]] += n
+            for frame in set(stack):
+                total_counts[frame] += n
+        pct = lambda n: round(100.0 * n / self.total, 2) if self.total else 0.0
+        meta = {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": route,
+            "status": status,
+            "started_at": round(self.started_at, 3),
+            "duration_s": round(duration, 4),
+            "interval_s": INTERVAL,
+            "samples": self.total,
+            "top_self": [{"frame": f, "samples": n, "pct": pct(n)} for f, n in self_counts.most_common(TOP)],
+            "top_total": [{"frame": f, "samples": n, "pct": pct(n)} for f, n in total_counts.most_common(TOP)],
+        }
+        PROFILES_DIR.mkdir(parents=True, exist_ok=True)
+        lines = [";".join(stack) + f" {n}" for stack, n in sorted(self.samples.items())]
+        (PROFILES_DIR / f"{self.id}.collapsed").write_text("\n".join(lines) + "\n", encoding="utf-8")
+        (PROFILES_DIR / f"{self.id}.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+        _prune()
+        return meta
+
+
+def _label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _stack(frame) -> tuple:
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    frames.reverse()
+    start = 0
+    while start < len(frames) - 1 and frames[start].f_code.co_filename.endswith(_BASE_FILES):
+        start += 1
+    return tuple(_label(f) for f in frames[start:])
+
+
+def _prune() -> None:
+    metas = sorted(PROFILES_DIR.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for old in metas[KEEP:]:
+        old.unlink(missing_ok=True)
+        old.with_suffix(".collapsed").unlink(missing_ok=True)
+
+
+def follow(fn):
+    """Envolve fn para que a thread que a executar entre no perfil da requisição atual.
+
+    Para pools de threads internos (contagem de linhas, subprojetos...): chame no
+    thread que submete o trabalho; pools aninhados dentro de fn também seguem o
+    perfil. Sem perfil ativo, devolve fn sem mudança.
+    """
+    session = _session.get()
+    if session is None:
+        return fn
+
+    def call(*args, **kwargs):
+        ident = threading.get_ident()
+        session.attach(ident)
+        token = _session.set(session)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _session.reset(token)
+            session.detach(ident)
+    return call
+
+
+def _requested(scope) -> bool:
+    for name, value in scope.get("headers", []):
+        if name == b"x-profile":
+            return value.strip().lower() in (b"1", b"true", b"yes")
+    return bool(re.search(rb"(?:^|&)profile=(?:1|true|yes)(?:&|$)", scope.get("query_string", b"")))
+
+
+class ProfilingMiddleware:
+    """Ativa o perfil para a requisição e devolve o id no header X-Profile-Id."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not ENABLED or scope["type"] != "http" or not _requested(scope):
+            await self.app(scope, receive, send)
+            return
+        session = Session(scope["method"], scope["path"])
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message = {**message, "headers": list(message.get("headers", [])) +
+                           [(b"x-profile-id", session.id.encode())]}
+            await send(message)
+
+        token = _session.set(session)
+        session.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _session.reset(token)
+            duration = session.stop()
+            route = getattr(scope.get("route"), "path", None) or scope["path"]
+            await asyncio.get_running_loop().run_in_executor(None, session.save, status, route, duration)
+
+
+def list_profiles() -> List[dict]:
+    out = []
+    if PROFILES_DIR.exists():
+        for p in sorted(PROFILES_DIR.glob("*.json"), reverse=True):
+            try:
+                meta = json.loads(p.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            out.append({k: v for k, v in meta.items() if not k.startswith("top_")})
+    return out
+
+
+def profile_path(profile_id: str, suffix: str) -> Optional[Path]:
+    if not PROFILE_ID.match(profile_id):
+        return None
+    p = PROFILES_DIR / f"{profile_id}{suffix}"
+    return p if p.is_file() else None
@@ -1,11 +1,24 @@
 """
 GenLab Engine — Project Analyzer
 Detecta automaticamente o tipo de projeto e gera metadata estruturada.
+Uma única varredura (sem node_modules/.venv) e cache por mtime dos manifestos.
+Em monorepos, cada subprojeto (workspaces, manifestos aninhados) é analisado
+em paralelo e aparece em "packages". Inclui arquivos/bytes/linhas por linguagem.
 """
+import copy
+import fnmatch
 import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Optional
 
+import code_stats
+import profiling
+import shared_state
 
 PROJECT_TYPES = [
     "react-app",
@@ -21,10 +34,170 @@ PROJECT_TYPES = [
     "unknown",
 ]
 
+# Arquivos cujo conteúdo/existência decide a classificação: o mtime deles é parte da chave do cache
+MANIFESTS = (
+    "package.json", "manifest.json", "requirements.txt", "pyproject.toml", "setup.py",
+    "Dockerfile", "docker-compose.yml", "docker-compose.yaml",
+    "build.gradle", "build.gradle.kts", "settings.gradle", "settings.gradle.kts",
+    "app/src/main/AndroidManifest.xml", "Package.swift",
+    "main.py", "app.py", "manage.py", "run.py", "pnpm-workspace.yaml",
+)
+SKIP_DIRS = {".git", "node_modules", ".venv", "venv", "__pycache__", ".gradle", ".idea", ".next", ".cache"}
+# Um diretório com um destes arquivos é candidato a subprojeto
+PACKAGE_MARKERS = {
+    "package.json", "requirements.txt", "pyproject.toml", "setup.py", "build.gradle", "build.gradle.kts",
+    "pom.xml", "manifest.json", "Dockerfile", "go.mod", "Cargo.toml", "Package.swift",
+}
+PACKAGE_SKIP_DIRS = {"dist", "build", "out", "target", "public", "static", "vendor"}
+PACKAGE_MAX_DEPTH = 3
+PACKAGE_WORKERS = int(os.environ.get("ANALYZE_WORKERS", "8"))
+CACHE_TTL = float(os.environ.get("ANALYZE_CACHE_TTL", "300"))
+CACHE_MAX = 64
 
-def analyze_project(repo_dir: Path) -> dict:
-    """Analisa um repositório e retorna classificação detalhada."""
-    repo_dir = Path(repo_dir)
+_cache_lock = threading.Lock()
+_cache: dict = {}  # repo_dir -> (chave, timestamp, resultado)
+_counters = {"hits": 0, "shared_hits": 0, "misses": 0}
+
+
+def _manifest_stamp(repo_dir: Path) -> tuple:
+    out = []
+    for name in MANIFESTS:
+        try:
+            out.append((name, (repo_dir / name).stat().st_mtime_ns))
+        except OSError:
+            out.append((name, None))
+    return tuple(out)
+
+
+def _tree_stamp(repo_dir: Path) -> tuple:
+    """mtime da raiz e dos diretórios de primeiro nível (entradas criadas/removidas)."""
+    out = []
+    try:
+        with os.scandir(repo_dir) as it:
+            for e in it:
+                if e.is_dir(follow_symlinks=False) and e.name not in SKIP_DIRS:
+                    out.append((e.name, e.stat(follow_symlinks=False).st_mtime_ns))
+        out.append(("", repo_dir.stat().st_mtime_ns))
+    except OSError:
+        pass
+    return tuple(sorted(out))
+
+
+def _walk(repo_dir: Path) -> dict:
+    """Varredura única e podada: conta arquivos, sinais do nível de topo e subprojetos."""
+    file_count = 0
+    top_dirs: List[str] = []
+    nested: List[str] = []
+    paths: List[str] = []
+    root_str = str(repo_dir)
+    for root, dirs, files in os.walk(repo_dir):
+        dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS)
+        file_count += len(files)
+        rel = os.path.relpath(root, repo_dir).replace(os.sep, "/")
+        parts = rel.split("/")
+        # Saída de build (dist/, target/...) não conta nas linguagens nem em source_bytes
+        if not PACKAGE_SKIP_DIRS.intersection(parts):
+            paths.extend(os.path.join(root, f) for f in files)
+        if root == root_str:
+            top_dirs = list(dirs)
+            # Bundles do Xcode são diretórios; não precisam ser percorridos
+            dirs[:] = [d for d in dirs if not d.endswith((".xcodeproj", ".xcworkspace"))]
+            continue
+        if len(parts) > PACKAGE_MAX_DEPTH or PACKAGE_SKIP_DIRS.intersection(parts):
+            continue
+        # Só o subprojeto mais externo: backend/app/requirements.txt fica dentro de backend/
+        if PACKAGE_MARKERS.intersection(files) and not any(rel.startswith(n + "/") for n in nested):
+            nested.append(rel)
+    return {"file_count": file_count, "top_dirs": top_dirs, "nested": nested, "paths": paths}
+
+
+def _workspace_dirs(repo_dir: Path, pkg_json: Optional[dict]) -> List[str]:
+    """Pacotes declarados em workspaces do npm/yarn ou no pnpm-workspace.yaml."""
+    patterns: List[str] = []
+    ws = (pkg_json or {}).get("workspaces")
+    if isinstance(ws, dict):
+        ws = ws.get("packages")
+    if isinstance(ws, list):
+        patterns += [p for p in ws if isinstance(p, str)]
+    pnpm = _read_text(repo_dir / "pnpm-workspace.yaml")
+    patterns += re.findall(r"^\s*-\s*['\"]?([^'\"\n#]+?)['\"]?\s*$", pnpm, re.M)
+    found = []
+    for pattern in patterns:
+        if pattern.startswith("!"):
+            continue
+        for d in repo_dir.glob(pattern.rstrip("/")):
+            rel = d.relative_to(repo_dir).as_posix()
+            if (d / "package.json").is_file() and "node_modules" not in rel.split("/"):
+                found.append(rel)
+    excluded = [p[1:] for p in patterns if p.startswith("!")]
+    return sorted(r for r in set(found) if not any(fnmatch.fnmatch(r, e) for e in excluded))
+
+
+def _cache_key(repo_dir: Path, packages: List[str]) -> tuple:
+    return (_manifest_stamp(repo_dir), _tree_stamp(repo_dir),
+            tuple((p, _manifest_stamp(repo_dir / p)) for p in packages))
+
+
+def analyze_project(repo_dir: Path, packages: bool = True) -> dict:
+    """Analisa um repositório e retorna classificação detalhada (com cache).
+
+    A chave é o mtime dos manifestos (da raiz e dos subprojetos) + o carimbo da
+    árvore de diretórios; o file_count pode ficar até ANALYZE_CACHE_TTL segundos
+    defasado quando só arquivos em subpastas profundas mudam.
+    """
+    repo_dir = Path(repo_dir).resolve()
+    cache_id = (repo_dir, packages)
+    with _cache_lock:
+        hit = _cache.get(cache_id)
+    if hit and time.monotonic() - hit[1] < CACHE_TTL and hit[0] == _cache_key(repo_dir, hit[3]):
+        with _cache_lock:
+            _counters["hits"] += 1
+        return copy.deepcopy(hit[2])
+    # Segundo nível: análise feita por outro worker (ou pelo pool do analyze-batch)
+    shared_id = f"{repo_dir}|{int(packages)}"
+    shared = shared_state.cache_get("analysis", shared_id)
+    key = _cache_key(repo_dir, shared["packages"]) if shared else None
+    if shared and json.dumps(key) == shared["key"]:
+        result, package_dirs = shared["result"], shared["packages"]
+        counter = "shared_hits"
+    else:
+        counter = "misses"
+        present = {name for name, mtime in _manifest_stamp(repo_dir) if mtime is not None}
+        result, package_dirs = _analyze(repo_dir, present, packages)
+        key = _cache_key(repo_dir, package_dirs)
+        shared_state.cache_put("analysis", shared_id, {"key": json.dumps(key), "result": result,
+                                                       "packages": package_dirs}, ttl=CACHE_TTL)
+    with _cache_lock:
+        _counters[counter] += 1
+        _cache[cache_id] = (key, time.monotonic(), result, package_dirs)
+        if len(_cache) > CACHE_MAX:
+            del _cache[min(_cache, key=lambda k: _cache[k][1])]
+    return copy.deepcopy(result)
+
+
+def cache_counters() -> dict:
+    with _cache_lock:
+        return dict(_counters)
+
+
+def _merge_packages(result: dict, packages: List[dict]) -> None:
+    """Raiz de monorepo: herda flags e frameworks dos subprojetos."""
+    result["signals"].append("monorepo")
+    for pkg in packages:
+        for flag in ("has_frontend", "has_backend", "has_tests", "has_docker"):
+            result[flag] = result[flag] or pkg[flag]
+        for fw in pkg["frameworks"]:
+            if fw not in result["frameworks"]:
+                result["frameworks"].append(fw)
+    if result["project_type"] == "unknown":
+        typed = [p for p in packages if p["project_type"] != "unknown"]
+        front = [p for p in typed if p["has_frontend"]]
+        if front or typed:
+            result["project_type"] = (front or typed)[0]["project_type"]
+
+
+def _analyze(repo_dir: Path, present: set, with_packages: bool = True) -> tuple:
+    walk = _walk(repo_dir)
     signals: List[str] = []
     project_type = "unknown"
     frameworks: List[str] = []
@@ -38,7 +211,7 @@ def analyze_project(repo_dir: Path) -> dict:
     pkg_json = _read_json(repo_dir / "package.json")
     
     # Docker
-    if (repo_dir / "Dockerfile").exists() or (repo_dir / "docker-compose.yml").exists() or (repo_dir / "docker-compose.yaml").exists():
+    if present & {"Dockerfile", "docker-compose.yml", "docker-compose.yaml"}:
         has_docker = True
         signals.append("docker")
 
@@ -51,7 +224,7 @@ def analyze_project(repo_dir: Path) -> dict:
         frameworks.append(f"Manifest V{mv}")
 
     # Python
-    has_py_deps = (repo_dir / "requirements.txt").exists() or (repo_dir / "pyproject.toml").exists() or (repo_dir / "setup.py").exists()
+    has_py_deps = bool(present & {"requirements.txt", "pyproject.toml", "setup.py"})
     if has_py_deps:
         signals.append("python-deps")
         has_backend = True
@@ -132,22 +305,20 @@ def analyze_project(repo_dir: Path) -> dict:
             entry_points.append("npm run build")
 
     # Android
-    if (repo_dir / "build.gradle").exists() or (repo_dir / "build.gradle.kts").exists():
-        if (repo_dir / "app" / "src" / "main" / "AndroidManifest.xml").exists():
+    if present & {"build.gradle", "build.gradle.kts"}:
+        if "app/src/main/AndroidManifest.xml" in present:
             project_type = "mobile-android"
             frameworks.append("Android")
             signals.append("AndroidManifest.xml")
-        elif (repo_dir / "settings.gradle").exists() or (repo_dir / "settings.gradle.kts").exists():
+        elif present & {"settings.gradle", "settings.gradle.kts"}:
             signals.append("gradle-project")
 
     # iOS
-    for ext in ["*.xcodeproj", "*.xcworkspace"]:
-        if list(repo_dir.glob(ext)):
-            project_type = "mobile-ios"
-            frameworks.append("iOS/Xcode")
-            signals.append("xcode-project")
-            break
-    if (repo_dir / "Package.swift").exists():
+    if any(d.endswith((".xcodeproj", ".xcworkspace")) for d in walk["top_dirs"]):
+        project_type = "mobile-ios"
+        frameworks.append("iOS/Xcode")
+        signals.append("xcode-project")
+    if "Package.swift" in present:
         if project_type == "unknown":
             project_type = "mobile-ios"
         frameworks.append("Swift Package")
@@ -156,13 +327,10 @@ def analyze_project(repo_dir: Path) -> dict:
     # Python entry points
     if has_py_deps:
         for name in ["main.py", "app.py", "manage.py", "run.py"]:
-            if (repo_dir / name).exists():
+            if name in present:
                 entry_points.append(f"python {name}")
 
-    # Count files
-    file_count = sum(1 for _ in repo_dir.rglob("*") if _.is_file() and ".git" not in str(_))
-
-    return {
+    result = {
         "project_type": project_type,
         "frameworks": frameworks,
         "signals": signals,
@@ -171,8 +339,32 @@ def analyze_project(repo_dir: Path) -> dict:
         "has_tests": has_tests,
         "has_docker": has_docker,
         "entry_points": entry_points,
-        "file_count": min(file_count, 99999),
+        "file_count": min(walk["file_count"], 99999),
     }
+    stats = code_stats.language_stats(walk["paths"])
+    result.update(languages=stats["languages"], bytes=stats["bytes"], lines=stats["lines"],
+                  source_bytes=stats["source_bytes"])
+    if not with_packages:
+        return result, []
+
+    # ── Subprojetos (monorepo) ──
+    workspaces = _workspace_dirs(repo_dir, pkg_json)
+    if workspaces:
+        signals.append("workspaces")
+    candidates = list(dict.fromkeys(workspaces + walk["nested"]))
+    packages = []
+    if candidates:
+        with ThreadPoolExecutor(max_workers=min(PACKAGE_WORKERS, len(candidates))) as pool:
+            analyses = pool.map(profiling.follow(lambda rel: analyze_project(repo_dir / rel, packages=False)),
+                                candidates)
+            for rel, sub in zip(candidates, analyses):
+                # manifest.json de PWA, pasta só com requirements de ferramenta... sem sinal, não é subprojeto
+                if sub["signals"]:
+                    packages.append({"path": rel, **sub})
+    result["packages"] = packages
+    if packages:
+        _merge_packages(result, packages)
+    return result, [p["path"] for p in packages]
 
 
 def _read_json(path: Path) -> Optional[dict]:
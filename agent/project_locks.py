@@ -0,0 +1,260 @@
+"""
+GenLab Engine — Project Locks
+Lock leitor/escritor por pasta de projeto e executores limitados para os
+handlers assíncronos. Leituras rodam em paralelo, escritas são serializadas
+(com preferência para quem escreve) e o tempo de espera fica registrado.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import profiling
+import shared_state
+
+
+IO_WORKERS = int(os.environ.get("IO_WORKERS", "16"))
+TASK_WORKERS = int(os.environ.get("TASK_WORKERS", "8"))
+CONTENDED_S = 0.001
+
+# io: leitura/gravação de arquivos, respostas rápidas
+# task: testes, builds, git, LLM — minutos, sem ocupar os slots de io
+_POOL_SIZES = {"io": IO_WORKERS, "task": TASK_WORKERS}
+_pools: dict = {}
+_pools_lock = threading.Lock()
+_submitted = {name: 0 for name in _POOL_SIZES}
+_started = {name: 0 for name in _POOL_SIZES}
+_finished = {name: 0 for name in _POOL_SIZES}
+
+
+def get_pool(name: str) -> ThreadPoolExecutor:
+    with _pools_lock:
+        pool = _pools.get(name)
+        if pool is None:
+            pool = _pools[name] = ThreadPoolExecutor(max_workers=_POOL_SIZES[name], thread_name_prefix=name)
+        return pool
+
+
+def _tracked(name: str, fn):
+    def call():
+        with _pools_lock:
+            _started[name] += 1
+        try:
+            return fn()
+        finally:
+            with _pools_lock:
+                _finished[name] += 1
+    return call
+
+
+async def _run(name: str, fn, args, kwargs):
+    pool = get_pool(name)
+    with _pools_lock:
+        _submitted[name] += 1
+    # Contexto copiado: pools internos chamados pela thread veem o perfil da requisição
+    call = _tracked(name, profiling.follow(functools.partial(fn, *args, **kwargs)))
+    return await asyncio.get_running_loop().run_in_executor(pool, contextvars.copy_context().run, call)
+
+
+async def run_io(fn, *args, **kwargs):
+    return await _run("io", fn, args, kwargs)
+
+
+async def run_task(fn, *args, **kwargs):
+    return await _run("task", fn, args, kwargs)
+
+
+def pool_stats() -> dict:
+    """Por pool: tamanho, threads ocupadas e tarefas na fila (saturação = busy / max)."""
+    with _pools_lock:
+        return {name: {"max": size, "busy": _started[name] - _finished[name],
+                       "queued": _submitted[name] - _started[name]} for name, size in _POOL_SIZES.items()}
+
+
+class RWLock:
+    """Leitor/escritor para o event loop; escritor esperando barra novos leitores."""
+
+    def __init__(self):
+        self._cond = asyncio.Condition()
+        self.readers = 0
+        self.writer = False
+        self.waiting_writers = 0
+        self.waiting_readers = 0
+
+    async def acquire_read(self) -> None:
+        async with self._cond:
+            self.waiting_readers += 1
+            try:
+                await self._cond.wait_for(lambda: not self.writer and not self.waiting_writers)
+            finally:
+                self.waiting_readers -= 1
+            self.readers += 1
+
+    async def release_read(self) -> None:
+        async with self._cond:
+            self.readers -= 1
+            if not self.readers:
+                self._cond.notify_all()
+
+    async def acquire_write(self) -> None:
+        async with self._cond:
+            self.waiting_writers += 1
+            try:
+                await self._cond.wait_for(lambda: not self.writer and not self.readers)
+            except BaseException:
+                # Cancelado na fila: leitores barrados por este escritor podem seguir
+                self.waiting_writers -= 1
+                self._cond.notify_all()
+                raise
+            self.waiting_writers -= 1
+            self.writer = True
+
+    async def release_write(self) -> None:
+        async with self._cond:
+            self.writer = False
+            self._cond.notify_all()
+
+    def idle(self) -> bool:
+        return not (self.readers or self.writer or self.waiting_readers or self.waiting_writers)
+
+
+class ProjectLocks:
+    def __init__(self):
+        self._locks: dict = {}
+        self._stats_lock = threading.Lock()
+        self._stats = {mode: {"acquired": 0, "contended": 0, "wait_total": 0.0, "wait_max": 0.0,
+                              "recent": deque(maxlen=500)} for mode in ("read", "write")}
+
+    def _get(self, key: str) -> RWLock:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = RWLock()
+        return lock
+
+    def record(self, mode: str, wait: float) -> None:
+        with self._stats_lock:
+            s = self._stats[mode]
+            s["acquired"] += 1
+            s["contended"] += wait > CONTENDED_S
+            s["wait_total"] += wait
+            s["wait_max"] = max(s["wait_max"], wait)
+            s["recent"].append(wait)
+
+    @asynccontextmanager
+    async def hold(self, key: str, mode: str):
+        """Lock do processo; o lock entre workers (flock) é pego depois, na thread do pool."""
+        lock = self._get(key)
+        if mode == "write":
+            await lock.acquire_write()
+        else:
+            await lock.acquire_read()
+        try:
+            yield
+        finally:
+            if mode == "write":
+                await lock.release_write()
+            else:
+                await lock.release_read()
+            if lock.idle() and self._locks.get(key) is lock:
+                del self._locks[key]
+
+    def stats(self) -> dict:
+        out = {}
+        with self._stats_lock:
+            stats = {mode: {**s, "recent": sorted(s["recent"])} for mode, s in self._stats.items()}
+        for mode, s in stats.items():
+            recent = s["recent"]
+            out[mode] = {
+                "acquired": s["acquired"],
+                "contended": s["contended"],
+                "wait_avg_s": round(s["wait_total"] / s["acquired"], 4) if s["acquired"] else 0.0,
+                "wait_total_s": round(s["wait_total"], 4),
+                "wait_max_s": round(s["wait_max"], 4),
+                "wait_p95_s": round(recent[int(len(recent) * 0.95)], 4) if recent else 0.0,
+            }
+        out["held"] = [{"path": key, "readers": lock.readers, "writer": lock.writer,
+                        "waiting_readers": lock.waiting_readers, "waiting_writers": lock.waiting_writers}
+                       for key, lock in self._locks.items()]
+        out["pools"] = dict(_POOL_SIZES)
+        out["worker"] = {"pid": os.getpid(), "workers": shared_state.WORKERS}
+        return out
+
+
+LOCKS = ProjectLocks()
+
+
+async def _locked(path: Path, mode: str, runner, fn, args, kwargs):
+    key = str(Path(path).resolve())
+    start = time.monotonic()
+
+    def call():
+        with shared_state.file_lock(key, mode):
+            # Espera total: fila do processo + flock dos outros workers
+            LOCKS.record(mode, time.monotonic() - start)
+            return fn(*args, **kwargs)
+
+    async with LOCKS.hold(key, mode):
+        return await runner(call)
+
+
+async def reading(path: Path, fn, *args, **kwargs):
+    """fn(*args) no pool de io segurando o lock de leitura do projeto."""
+    # shield: se o cliente cair, o lock só é solto quando a thread terminar de mexer na árvore
+    return await asyncio.shield(_locked(path, "read", run_io, fn, args, kwargs))
+
+
+async def writing(path: Path, fn, *args, long: bool = False, **kwargs):
+    """fn(*args) segurando o lock de escrita; long=True usa o pool de tarefas longas."""
+    return await asyncio.shield(_locked(path, "write", run_task if long else run_io, fn, args, kwargs))
+
+
+async def writing_stream(path: Path, gen_fn, *args, **kwargs):
+    """Itera o gerador síncrono gen_fn(*args) no pool de tarefas longas com o lock de escrita.
+
+    O lock vale até o fim do stream. Se o cliente cair, o gerador é fechado no próximo item
+    e o lock só é solto quando a thread termina de mexer na pasta.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def produce():
+        gen = gen_fn(*args, **kwargs)
+        try:
+            for item in gen:
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, (False, item))
+        finally:
+            gen.close()
+
+    def finished(task):
+        if not task.cancelled():
+            task.exception()  # consome o erro mesmo se o consumidor já saiu
+        queue.put_nowait((True, None))
+
+    # Tarefa própria (como o shield de writing): cancelar o stream não solta o lock antes da hora
+    task = asyncio.ensure_future(_locked(path, "write", run_task, produce, (), {}))
+    task.add_done_callback(finished)
+    try:
+        while True:
+            done, item = await queue.get()
+            if done:
+                break
+            yield item
+        task.result()
+    finally:
+        stop.set()
+
+
+def shutdown() -> None:
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        _pools.clear()
@@ -0,0 +1,240 @@
+"""
+GenLab Engine — Project Registry
+Registro em SQLite dos projetos importados e gerados: origem, stack, número de
+arquivos, tamanho e o último resultado de análise, build, testes e execução.
+A listagem sai do banco; só projetos alterados são recontados.
+"""
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+
+APP_ROOT = Path(os.environ.get("INFINITY_WORKDIR", str(Path.home() / ".infinity_agent"))).resolve()
+DB_PATH = APP_ROOT / "registry.sqlite3"
+ROOTS = {
+    "imported": APP_ROOT / "projects",
+    "generated": APP_ROOT / "generated_projects",
+}
+RESULT_FIELDS = ("analysis", "build", "test", "run")
+SORTS = {
+    "name": "id ASC",
+    "updated": "updated_at DESC, id ASC",
+    "created": "created_at DESC, id ASC",
+    "size": "bytes DESC, id ASC",
+}
+MAX_PAGE = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    origin TEXT,
+    stack TEXT,
+    file_count INTEGER,
+    bytes INTEGER,
+    stamp INTEGER,
+    dirty INTEGER NOT NULL DEFAULT 1,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    analysis TEXT,
+    build TEXT,
+    test TEXT,
+    run TEXT,
+    PRIMARY KEY (kind, id)
+);
+CREATE INDEX IF NOT EXISTS projects_updated ON projects (kind, updated_at);
+"""
+
+_lock = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+
+
+def _db() -> sqlite3.Connection:
+    global _conn
+    if _conn is None:
+        DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        _conn = sqlite3.connect(str(DB_PATH), check_same_thread=False, timeout=30)
+        _conn.row_factory = sqlite3.Row
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.executescript(_SCHEMA)
+    return _conn
+
+
+def _now() -> str:
+    return datetime.now().isoformat()
+
+
+def _check_kind(kind: str) -> None:
+    if kind not in ROOTS:
+        raise ValueError(f"Unknown project kind: {kind}")
+
+
+def _stamp(path: Path) -> Optional[int]:
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def count_tree(path: Path) -> tuple:
+    """(arquivos, bytes) sem descer em diretórios ignorados (node_modules, .venv, dist...)."""
+    from agent import load_ignore
+    spec = load_ignore(path)
+    files = size = 0
+    for root, dirs, names in os.walk(path):
+        base = os.path.relpath(root, path).replace("\\", "/")
+        base = "" if base == "." else base + "/"
+        dirs[:] = [d for d in dirs if d != ".git" and not spec.match_file(base + d + "/")]
+        for name in names:
+            try:
+                size += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                continue
+            files += 1
+    return files, size
+
+
+# ── Escrita ──
+
+def register(kind: str, project_id: str, origin: Optional[str] = None, stack: Optional[str] = None) -> None:
+    """Cria (ou reinicia) o registro de um projeto; a contagem fica para a próxima listagem."""
+    _check_kind(kind)
+    now = _now()
+    with _lock:
+        db = _db()
+        db.execute(
+            "INSERT INTO projects (kind, id, origin, stack, dirty, created_at, updated_at) VALUES (?, ?, ?, ?, 1, ?, ?) "
+            "ON CONFLICT (kind, id) DO UPDATE SET origin = COALESCE(excluded.origin, origin), "
+            "stack = COALESCE(excluded.stack, stack), dirty = 1, updated_at = excluded.updated_at",
+            (kind, project_id, origin, stack, now, now))
+        db.commit()
+
+
+def touch(kind: str, project_id: str) -> None:
+    """Marca o projeto como alterado (arquivos gravados, patch, restore...)."""
+    _check_kind(kind)
+    now = _now()
+    with _lock:
+        db = _db()
+        db.execute(
+            "INSERT INTO projects (kind, id, dirty, created_at, updated_at) VALUES (?, ?, 1, ?, ?) "
+            "ON CONFLICT (kind, id) DO UPDATE SET dirty = 1, updated_at = excluded.updated_at",
+            (kind, project_id, now, now))
+        db.commit()
+
+
+def record(kind: str, project_id: str, field: str, result: dict) -> None:
+    """Guarda o último resultado de análise, build, testes ou execução."""
+    _check_kind(kind)
+    if field not in RESULT_FIELDS:
+        raise ValueError(f"Unknown result field: {field}")
+    now = _now()
+    payload = json.dumps({**result, "at": now})
+    stack = result.get("project_type") if field == "analysis" else None
+    with _lock:
+        db = _db()
+        db.execute(
+            f"INSERT INTO projects (kind, id, stack, {field}, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?) "
+            f"ON CONFLICT (kind, id) DO UPDATE SET {field} = excluded.{field}, "
+            "stack = COALESCE(excluded.stack, stack)",
+            (kind, project_id, stack, payload, now, now))
+        db.commit()
+
+
+def record_analysis(kind: str, project_id: str, analysis: dict) -> None:
+    """Resumo da análise (a completa continua no cache do project_analyzer)."""
+    record(kind, project_id, "analysis", {
+        "project_type": analysis.get("project_type"),
+        "frameworks": analysis.get("frameworks", []),
+        "file_count": analysis.get("file_count"),
+        "lines": analysis.get("lines"),
+        "source_bytes": analysis.get("source_bytes"),
+        "languages": list(analysis.get("languages", {}))[:5],
+        "packages": [p["path"] for p in analysis.get("packages", [])],
+    })
+
+
+# ── Leitura ──
+
+def _sync(kind: str) -> None:
+    """Acrescenta pastas que ainda não estão no registro e remove as que sumiram."""
+    root = ROOTS[kind]
+    try:
+        on_disk = {d.name for d in root.iterdir() if d.is_dir()}
+    except OSError:
+        on_disk = set()
+    now = _now()
+    with _lock:
+        db = _db()
+        known = {r[0] for r in db.execute("SELECT id FROM projects WHERE kind = ?", (kind,))}
+        gone = known - on_disk
+        if gone:
+            db.executemany("DELETE FROM projects WHERE kind = ? AND id = ?", [(kind, pid) for pid in gone])
+        new = on_disk - known
+        if new:
+            db.executemany(
+                "INSERT OR IGNORE INTO projects (kind, id, dirty, created_at, updated_at) VALUES (?, ?, 1, ?, ?)",
+                [(kind, pid, now, now) for pid in new])
+        if gone or new:
+            db.commit()
+
+
+def _refresh(kind: str, row: dict) -> dict:
+    """Reconta o projeto se foi marcado como alterado ou se a pasta raiz mudou."""
+    path = ROOTS[kind] / row["id"]
+    stamp = _stamp(path)
+    if not row["dirty"] and row["stamp"] == stamp:
+        return row
+    files, size = count_tree(path)
+    with _lock:
+        db = _db()
+        # dirty só zera se ninguém marcou de novo durante a contagem
+        db.execute("UPDATE projects SET file_count = ?, bytes = ?, stamp = ?, "
+                   "dirty = CASE WHEN updated_at = ? THEN 0 ELSE dirty END WHERE kind = ? AND id = ?",
+                   (files, size, stamp, row["updated_at"], kind, row["id"]))
+        db.commit()
+    return {**row, "file_count": files, "bytes": size, "stamp": stamp, "dirty": 0}
+
+
+def _public(kind: str, row: dict) -> dict:
+    out = {
+        "id": row["id"],
+        "kind": kind,
+        "dir": str(ROOTS[kind] / row["id"]),
+        "origin": row["origin"],
+        "stack": row["stack"],
+        "file_count": row["file_count"],
+        "bytes": row["bytes"],
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+    }
+    for field in RESULT_FIELDS:
+        out[f"last_{field}"] = json.loads(row[field]) if row[field] else None
+    return out
+
+
+def list_projects(kind: str, offset: int = 0, limit: int = 50, sort: str = "name") -> dict:
+    """Página de projetos servida do registro; recontagem só dos itens da página que mudaram."""
+    _check_kind(kind)
+    if sort not in SORTS:
+        raise ValueError(f"Unknown sort: {sort} (use {', '.join(SORTS)})")
+    offset, limit = max(0, offset), max(1, min(limit, MAX_PAGE))
+    _sync(kind)
+    if sort == "size":
+        # Ordenar por tamanho exige tamanhos atuais em todas as linhas, não só na página
+        with _lock:
+            stale = [dict(r) for r in _db().execute("SELECT * FROM projects WHERE kind = ? AND dirty = 1", (kind,))]
+        for row in stale:
+            _refresh(kind, row)
+    with _lock:
+        db = _db()
+        total = db.execute("SELECT COUNT(*) FROM projects WHERE kind = ?", (kind,)).fetchone()[0]
+        rows = [dict(r) for r in db.execute(
+            f"SELECT * FROM projects WHERE kind = ? ORDER BY {SORTS[sort]} LIMIT ? OFFSET ?",
+            (kind, limit, offset))]
+    projects = [_public(kind, _refresh(kind, row)) for row in rows]
+    return {"projects": projects, "total": total, "offset": offset, "limit": limit, "sort": sort}
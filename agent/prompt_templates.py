@@ -245,27 +245,122 @@ def get_prompt(project_type: str) -> str:
     return TEMPLATES.get(project_type, TEMPLATES["unknown"])
 
 
-def build_recreation_prompt(analysis: dict, source_files: list[dict]) -> str:
-    """Constrói o prompt completo para recriação com código fonte."""
+def build_recreation_prompt(analysis: dict, source_files: list[dict], summaries: list[str] | None = None,
+                            max_chars: int | None = 8000) -> str:
+    """Constrói o prompt completo para recriação com código fonte.
+
+    Com o context packer, os arquivos já vêm dimensionados (max_chars=None) e os
+    que não couberam aparecem em `summaries`.
+    """
     ptype = analysis.get("project_type", "unknown")
     template = get_prompt(ptype)
 
     # Build source context
     source_context = "\n\n".join(
-        f"### {f['path']}\n```\n{f['content'][:8000]}\n```"
-        for f in source_files[:50]  # Limit files
+        f"### {f['path']}\n```\n{f['content'][:max_chars]}\n```"
+        for f in source_files[:50 if max_chars else None]  # Limit files
     )
+    omitted = ""
+    if summaries:
+        omitted = "\n\n## OUTROS ARQUIVOS (resumidos)\n" + "\n".join(summaries)
 
     return f"""{template}
 
-## ANÁLISE DO PROJETO ORIGINAL
-- Tipo: {ptype}
+{_analysis_block(analysis)}
+
+## CÓDIGO FONTE ORIGINAL
+{source_context}{omitted}
+"""
+
+
+def _analysis_block(analysis: dict) -> str:
+    packages = "".join(
+        f"\n  - {p['path']}: {p['project_type']} ({', '.join(p.get('frameworks', [])) or '-'})"
+        for p in analysis.get("packages", [])
+    )
+    return f"""## ANÁLISE DO PROJETO ORIGINAL
+- Tipo: {analysis.get('project_type', 'unknown')}
 - Frameworks: {', '.join(analysis.get('frameworks', []))}
 - Tem Frontend: {analysis.get('has_frontend')}
 - Tem Backend: {analysis.get('has_backend')}
 - Tem Docker: {analysis.get('has_docker')}
-- Tem Testes: {analysis.get('has_tests')}
+- Tem Testes: {analysis.get('has_tests')}""" + (f"\n- Subprojetos:{packages}" if packages else "")
 
-## CÓDIGO FONTE ORIGINAL
+
+def build_plan_prompt(analysis: dict, chunks: list[dict]) -> str:
+    """Prompt da fase de planejamento (recriação em partes).
+
+    chunks: [{"name", "summaries": [str]}] — um por módulo do projeto original.
+    """
+    ptype = analysis.get("project_type", "unknown")
+    listing = "\n\n".join(
+        f"### Módulo `{c['name']}`\n" + "\n".join(c["summaries"]) for c in chunks
+    )
+    return f"""{get_prompt(ptype)}
+
+{_analysis_block(analysis)}
+
+## MÓDULOS DO PROJETO ORIGINAL
+{listing}
+
+## TAREFA (PLANEJAMENTO)
+O projeto é grande demais para uma única resposta. NÃO gere código agora.
+Planeje o projeto recriado: para cada módulo acima, liste os arquivos de destino que ele vai gerar
+e as interfaces (exports, rotas, tipos) que outros módulos podem usar. Cada arquivo de destino
+pertence a exatamente um módulo.
+Responda APENAS com JSON no formato:
+{{"modules": [{{"name": "...", "files": ["..."], "interfaces": "..."}}]}}
+"""
+
+
+def _plan_line(m: dict, interfaces: bool = True, max_files: int | None = None) -> str:
+    files = m.get("files", [])
+    shown = ", ".join(files[:max_files]) or "(livre)"
+    if max_files is not None and len(files) > max_files:
+        shown += f", ... (+{len(files) - max_files})"
+    line = f"- {m['name']}: {shown}"
+    if interfaces and m.get("interfaces"):
+        line += f"\n  interfaces: {m['interfaces']}"
+    return line
+
+
+def _plan_block(plan: list[dict], module: dict, max_chars: int) -> str:
+    """Plano dentro de max_chars: o módulo atual completo; os outros completos se couberem,
+    senão só nome e arquivos, e cortados no limite."""
+    others = [m for m in plan if m["name"] != module["name"]]
+    head = _plan_line(module)
+    full = [_plan_line(m) for m in others]
+    if len(head) + sum(len(line) + 1 for line in full) <= max_chars:
+        return "\n".join([head] + full)
+    lines, used = [head], len(head)
+    for i, m in enumerate(others):
+        line = _plan_line(m, interfaces=False, max_files=20)
+        if used + len(line) + 1 > max_chars:
+            lines.append(f"- ... (+{len(others) - i} módulos)")
+            break
+        lines.append(line)
+        used += len(line) + 1
+    return "\n".join(lines)
+
+
+def build_module_prompt(analysis: dict, plan: list[dict], module: dict, source_files: list[dict],
+                        max_plan_chars: int = 12000) -> str:
+    """Prompt da geração de um módulo, com o plano (limitado a max_plan_chars) como contexto compartilhado."""
+    ptype = analysis.get("project_type", "unknown")
+    plan_text = _plan_block(plan, module, max_plan_chars)
+    source_context = "\n\n".join(f"### {f['path']}\n```\n{f['content']}\n```" for f in source_files)
+    targets = ", ".join(module.get("files", [])) or "os arquivos necessários para este módulo"
+    return f"""{get_prompt(ptype)}
+
+{_analysis_block(analysis)}
+
+## PLANO DO PROJETO RECRIADO
+{plan_text}
+
+## TAREFA
+Gere SOMENTE os arquivos do módulo `{module['name']}`: {targets}.
+Use exatamente os paths e as interfaces do plano para que os módulos se encaixem.
+
+## CÓDIGO FONTE ORIGINAL DESTE MÓDULO
 {source_context}
 """
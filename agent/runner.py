@@ -2,18 +2,12 @@
 GenLab Engine — Runner
 Executa projetos gerados localmente com auto-detecção de modo.
 """
-import subprocess
 import json
 from pathlib import Path
-from typing import Optional, List
+from typing import Optional
 
-
-def run_cmd(cmd: List[str], cwd: Optional[Path] = None, timeout: int = 1800) -> str:
-    p = subprocess.run(cmd, cwd=str(cwd) if cwd else None, capture_output=True, text=True, timeout=timeout)
-    out = (p.stdout or "") + (p.stderr or "")
-    if p.returncode != 0:
-        raise RuntimeError(f"Command failed: {' '.join(cmd)}\n{out[:5000]}")
-    return out
+import build_cache
+from scheduler import run_cmd
 
 
 def detect_run_mode(project_dir: Path) -> str:
@@ -58,6 +52,21 @@ def run_project(project_dir: Path, mode: str = "auto") -> dict:
         return {"ok": False, "mode": mode, "error": str(e), "logs": logs[-10000:]}
 
 
+def _build_key(project_dir: Path, target: str, entry: Optional[str] = None) -> str:
+    return build_cache.cache_key(build_cache.source_tree_hash(project_dir, target), target, entry)
+
+
+def _restore_cached(project_dir: Path, target: str, entry: Optional[str] = None) -> Optional[dict]:
+    """Restaura dist/ do cache se a árvore não mudou desde o último build."""
+    if build_cache.restore(_build_key(project_dir, target, entry), project_dir / "dist") is None:
+        return None
+    return {"ok": True, "target": target, "cached": True, "artifact_dir": str(project_dir / "dist"), "logs": ""}
+
+
+def _store_cached(project_dir: Path, target: str, entry: Optional[str] = None) -> None:
+    build_cache.store(_build_key(project_dir, target, entry), project_dir / "dist", target=target, entry=entry)
+
+
 def build_installer(project_dir: Path, target: str = "auto") -> dict:
     """Gera instalador para o projeto."""
     project_dir = Path(project_dir)
@@ -77,11 +86,17 @@ def build_installer(project_dir: Path, target: str = "auto") -> dict:
             else:
                 return {"ok": False, "error": "Cannot determine installer type"}
 
+        npm = build_cache.npm_env_prefix()
+
         if target == "electron":
             # Project already has Electron — just build
-            logs += run_cmd(["bash", "-lc", "npm install && npm run build"], cwd=project_dir, timeout=300)
-            logs += run_cmd(["bash", "-lc", "npx electron-builder --linux --mac"], cwd=project_dir, timeout=600)
-            return {"ok": True, "target": target, "logs": logs[-10000:]}
+            cached = _restore_cached(project_dir, target)
+            if cached:
+                return cached
+            logs += run_cmd(["bash", "-lc", f"{npm}npm install && npm run build"], cwd=project_dir, timeout=300)
+            logs += run_cmd(["bash", "-lc", f"{npm}npx electron-builder --linux --mac"], cwd=project_dir, timeout=600)
+            _store_cached(project_dir, target)
+            return {"ok": True, "target": target, "cached": False, "logs": logs[-10000:]}
 
         elif target == "electron-wrap":
             # Create minimal Electron wrapper around web app
@@ -111,17 +126,27 @@ app.on("window-all-closed", () => { if (process.platform !== "darwin") app.quit(
             pkg["build"]["files"] = ["dist/**/*", "electron-main.js", "icon.png"]
             (project_dir / "package.json").write_text(json.dumps(pkg, indent=2))
 
-            logs += run_cmd(["bash", "-lc", "npm install && npm run build"], cwd=project_dir, timeout=300)
-            logs += run_cmd(["bash", "-lc", "npx electron-builder --linux --mac"], cwd=project_dir, timeout=600)
-            return {"ok": True, "target": target, "logs": logs[-10000:]}
+            # Hash only after the wrapper is written so repeated runs hit the cache
+            cached = _restore_cached(project_dir, target)
+            if cached:
+                return cached
+            logs += run_cmd(["bash", "-lc", f"{npm}npm install && npm run build"], cwd=project_dir, timeout=300)
+            logs += run_cmd(["bash", "-lc", f"{npm}npx electron-builder --linux --mac"], cwd=project_dir, timeout=600)
+            _store_cached(project_dir, target)
+            return {"ok": True, "target": target, "cached": False, "logs": logs[-10000:]}
 
         elif target == "pyinstaller":
             entry = "main.py" if (project_dir / "main.py").exists() else "app.py"
+            cached = _restore_cached(project_dir, target, entry)
+            if cached:
+                return cached
+            work = build_cache.work_dir(project_dir, "pyinstaller")
             logs += run_cmd(
-                ["bash", "-lc", f"python3 -m venv .venv && . .venv/bin/activate && pip install -U pyinstaller && pyinstaller --onefile {entry} --distpath dist"],
+                ["bash", "-lc", f"python3 -m venv .venv && . .venv/bin/activate && pip install -U pyinstaller && pyinstaller --onefile {entry} --distpath dist --workpath '{work}' --specpath '{work}'"],
                 cwd=project_dir, timeout=600,
             )
-            return {"ok": True, "target": target, "logs": logs[-10000:]}
+            _store_cached(project_dir, target, entry)
+            return {"ok": True, "target": target, "cached": False, "logs": logs[-10000:]}
 
         else:
             return {"ok": False, "error": f"Unknown target: {target}"}
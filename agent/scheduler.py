@@ -0,0 +1,213 @@
+"""
+GenLab Engine — Job Scheduler
+Fila de execução de subprocessos com controle de admissão por CPU/memória
+e limites de recursos por job.
+"""
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+import metrics
+import shared_state
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# Comandos pesados (compilação/instalação) ocupam mais "slots" de CPU
+HEAVY_KINDS = {"electron-builder", "pyinstaller", "npm", "pip", "maven", "gradle", "docker"}
+SLOT_POLL = 0.25
+
+
+@dataclass
+class JobLimits:
+    """Limites aplicados ao processo do job (0 = sem limite)."""
+    address_space_mb: int = int(os.environ.get("SCHED_RLIMIT_AS_MB", "0"))
+    cpu_seconds: int = int(os.environ.get("SCHED_RLIMIT_CPU", "0"))
+    nice: int = int(os.environ.get("SCHED_NICE", "5"))
+
+
+def classify(cmd: List[str]) -> str:
+    """Classifica o comando (npm, pip, git, pyinstaller, ...) para fila e métricas."""
+    text = " ".join(cmd)
+    for kind, needles in (
+        ("electron-builder", ("electron-builder",)),
+        ("pyinstaller", ("pyinstaller ",)),
+        ("pip", ("pip install",)),
+        ("tsc", ("tsc ",)),
+        ("npm", ("npm ", "npx ")),
+        ("maven", ("mvn ", "mvnw ")),
+        ("gradle", ("gradlew ", "gradle ")),
+        ("docker", ("docker ",)),
+        ("git", ("git ",)),
+        ("unzip", ("unzip ",)),
+        ("python", ("python", "pytest")),
+    ):
+        if any(n in text + " " for n in needles):
+            return kind
+    return os.path.basename(cmd[0]) if cmd else "unknown"
+
+
+def available_memory_mb() -> Optional[int]:
+    """Memória disponível em MB (None se não for possível medir)."""
+    try:
+        with open("/proc/meminfo") as fh:
+            for line in fh:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") // (1024 * 1024)
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+# Roda no filho antes do exec: o comando já nasce com os limites (e os filhos dele os herdam).
+# Um processo intermediário em vez de preexec_fn, que não é seguro com as threads do servidor.
+_LAUNCHER = """
+import os, resource, sys
+as_mb, cpu, nice = map(int, sys.argv[1:4])
+try:
+    if as_mb:
+        resource.setrlimit(resource.RLIMIT_AS, (as_mb << 20, as_mb << 20))
+    if cpu:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu))
+    if nice:
+        os.setpriority(os.PRIO_PROCESS, 0, nice)
+except (OSError, ValueError):
+    pass
+try:
+    os.execvp(sys.argv[4], sys.argv[4:])
+except OSError as e:
+    sys.stderr.write(f"{sys.argv[4]}: {e}\\n")
+    sys.exit(127)
+"""
+
+
+def _with_limits(cmd: List[str], limits: JobLimits) -> List[str]:
+    if resource is None or not (limits.address_space_mb or limits.cpu_seconds or limits.nice):
+        return cmd
+    return [sys.executable, "-c", _LAUNCHER, str(limits.address_space_mb), str(limits.cpu_seconds),
+            str(limits.nice), *cmd]
+
+
+class JobScheduler:
+    """Admite jobs enquanto houver CPU e memória livres; os demais aguardam na fila."""
+
+    def __init__(self, capacity: Optional[int] = None, min_free_mb: Optional[int] = None):
+        # Capacidade da máquina: com vários workers as vagas ficam em shared_state
+        self.capacity = capacity or int(os.environ.get("SCHED_CAPACITY", "0")) or (os.cpu_count() or 2)
+        self.heavy_weight = max(1, self.capacity // 2)
+        self.min_free_mb = min_free_mb if min_free_mb is not None else int(os.environ.get("SCHED_MIN_FREE_MB", "1024"))
+        self._cond = threading.Condition()
+        self._used = 0
+        self._running = 0
+        self._waiting = 0
+        self._total = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._recent_waits: deque = deque(maxlen=200)
+
+    def _weight(self, kind: str) -> int:
+        return self.heavy_weight if kind in HEAVY_KINDS else 1
+
+    def _can_admit(self, kind: str, weight: int) -> bool:
+        if self._running == 0:
+            return True  # nunca bloquear com a máquina ociosa
+        if self._used + weight > self.capacity:
+            return False
+        free = available_memory_mb()
+        if free is None:
+            return True
+        needed = self.min_free_mb if kind in HEAVY_KINDS else self.min_free_mb // 4
+        return free >= needed
+
+    def _acquire(self, kind: str, weight: int) -> tuple:
+        start = time.monotonic()
+        with self._cond:
+            self._waiting += 1
+            try:
+                while True:
+                    if self._can_admit(kind, weight):
+                        slot = shared_state.try_slots("scheduler", self.capacity, weight)
+                        if slot is not None:
+                            break
+                    # timeout: memória livre e vagas de outros workers mudam sem notificação
+                    self._cond.wait(timeout=SLOT_POLL if shared_state.multi_worker() else 1.0)
+            finally:
+                self._waiting -= 1
+            self._used += weight
+            self._running += 1
+            waited = time.monotonic() - start
+            self._total += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            self._recent_waits.append(waited)
+        return slot, waited
+
+    def _release(self, weight: int, slot: shared_state.Slot) -> None:
+        slot.release()
+        with self._cond:
+            self._used -= weight
+            self._running -= 1
+            self._cond.notify_all()
+
+    def run(self, cmd: List[str], cwd: Optional[Path] = None, timeout: int = 1800,
+            limits: Optional[JobLimits] = None) -> subprocess.CompletedProcess:
+        """Executa o comando quando houver recursos. Timeout conta só a execução."""
+        kind = classify(cmd)
+        weight = self._weight(kind)
+        limits = limits or JobLimits()
+        slot, waited = self._acquire(kind, weight)
+        start = time.monotonic()
+        ok = False
+        try:
+            with subprocess.Popen(_with_limits(cmd, limits), cwd=str(cwd) if cwd else None,
+                                  stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True) as proc:
+                try:
+                    stdout, stderr = proc.communicate(timeout=timeout)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+                    proc.communicate()
+                    raise
+            ok = proc.returncode == 0
+            return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+        finally:
+            self._release(weight, slot)
+            metrics.observe_cmd(kind, time.monotonic() - start, ok, waited)
+
+    def stats(self) -> dict:
+        with self._cond:
+            recent = sorted(self._recent_waits)
+            return {
+                "capacity": self.capacity,
+                "used": self._used,
+                "running": self._running,
+                "queue_depth": self._waiting,
+                "jobs_total": self._total,
+                "wait_avg_s": round(self._wait_total / self._total, 3) if self._total else 0.0,
+                "wait_max_s": round(self._wait_max, 3),
+                "wait_p95_s": round(recent[int(len(recent) * 0.95)], 3) if recent else 0.0,
+                "free_memory_mb": available_memory_mb(),
+            }
+
+
+SCHEDULER = JobScheduler()
+
+
+def run_cmd(cmd: List[str], cwd: Optional[Path] = None, timeout: int = 1800,
+            limits: Optional[JobLimits] = None) -> str:
+    p = SCHEDULER.run(cmd, cwd=cwd, timeout=timeout, limits=limits)
+    out = (p.stdout or "") + (p.stderr or "")
+    if p.returncode != 0:
+        raise RuntimeError(f"Command failed: {' '.join(cmd)}\n{out[:5000]}")
+    return out
@@ -0,0 +1,245 @@
+"""
+GenLab Engine — Search Index
+Índice invertido de trigramas por projeto: busca por substring e regex com
+ranking BM25 e trechos de linha. Atualizado de forma incremental a partir da
+listagem de arquivos (mtime + tamanho).
+"""
+import math
+import os
+import re
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+
+MAX_FILES = int(os.environ.get("SEARCH_MAX_FILES", "20000"))
+MAX_FILE_BYTES = 1_000_000
+MAX_PROJECTS = int(os.environ.get("SEARCH_MAX_PROJECTS", "8"))
+MAX_MATCHES_PER_FILE = 1000
+REFRESH_INTERVAL = float(os.environ.get("SEARCH_REFRESH_INTERVAL", "2"))
+SNIPPET_CHARS = 200
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def _trigrams(text: str) -> set:
+    return set(map("".join, zip(text, text[1:], text[2:])))
+
+
+def _required_literals(parsed) -> List[str]:
+    """Trechos literais que toda ocorrência da regex precisa conter."""
+    out: List[str] = []
+    run: List[str] = []
+
+    def flush():
+        if run:
+            out.append("".join(run))
+            run.clear()
+
+    for op, av in parsed:
+        if op is sre_parse.LITERAL:
+            run.append(chr(av))
+            continue
+        flush()
+        if op is sre_parse.SUBPATTERN:
+            out.extend(_required_literals(av[-1]))
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[0] >= 1:
+            out.extend(_required_literals(av[2]))
+    flush()
+    return out
+
+
+class SearchIndex:
+    def __init__(self, root: Path):
+        self.root = Path(root).resolve()
+        self._lock = threading.Lock()
+        self._paths: List[Optional[str]] = []   # id -> path (None = removido)
+        self._sizes: List[int] = []
+        self._files: dict = {}                  # path -> (id, mtime_ns, size)
+        self._postings: dict = {}               # trigrama -> array de ids
+        self._total_bytes = 0
+        self._last_refresh = float("-inf")
+
+    # ── Indexação ──
+
+    def _add(self, rel: str, mtime_ns: int, size: int) -> None:
+        try:
+            data = (self.root / rel).read_bytes()
+        except OSError:
+            return
+        if b"\x00" in data[:8192]:
+            return
+        fid = len(self._paths)
+        self._paths.append(rel)
+        self._sizes.append(size)
+        self._files[rel] = (fid, mtime_ns, size)
+        self._total_bytes += size
+        for tri in _trigrams(data.decode("utf-8", errors="ignore").lower()):
+            posting = self._postings.get(tri)
+            if posting is None:
+                self._postings[tri] = array("I", (fid,))
+            else:
+                posting.append(fid)
+
+    def _remove(self, rel: str) -> None:
+        fid, _, size = self._files.pop(rel)
+        self._paths[fid] = None
+        self._total_bytes -= size
+
+    def _rebuild(self) -> None:
+        entries = [(rel, m, s) for rel, (_, m, s) in self._files.items()]
+        self._paths, self._sizes, self._files, self._postings, self._total_bytes = [], [], {}, {}, 0
+        for rel, m, s in sorted(entries):
+            self._add(rel, m, s)
+
+    def refresh(self, force: bool = False) -> Optional[dict]:
+        """Re-indexa só o que mudou (no máximo a cada REFRESH_INTERVAL); None se pulou."""
+        from agent import safe_list_files
+        if not force and time.monotonic() - self._last_refresh < REFRESH_INTERVAL:
+            return None
+        listed = safe_list_files(self.root, max_files=MAX_FILES)
+        added = removed = 0
+        with self._lock:
+            seen = set()
+            for rel in listed:
+                try:
+                    st = (self.root / rel).stat()
+                except OSError:
+                    continue
+                if st.st_size > MAX_FILE_BYTES:
+                    continue
+                seen.add(rel)
+                current = self._files.get(rel)
+                if current and current[1] == st.st_mtime_ns and current[2] == st.st_size:
+                    continue
+                if current:
+                    self._remove(rel)
+                self._add(rel, st.st_mtime_ns, st.st_size)
+                added += 1
+            for rel in [r for r in self._files if r not in seen]:
+                self._remove(rel)
+                removed += 1
+            # Postings acumulam ids mortos; compacta quando passam dos vivos
+            if len(self._paths) - len(self._files) > max(1000, len(self._files)):
+                self._rebuild()
+            self._last_refresh = time.monotonic()
+        return {"indexed": added, "removed": removed, "files": len(self._files)}
+
+    # ── Consulta ──
+
+    def _candidates(self, literals: List[str]) -> List[str]:
+        sets = [_trigrams(lit.lower()) for lit in literals if len(lit) >= 3]
+        tris = set().union(*sets) if sets else set()
+        with self._lock:
+            if not tris:
+                return sorted(self._files)
+            postings = []
+            for tri in tris:
+                posting = self._postings.get(tri)
+                if posting is None:
+                    return []
+                postings.append(posting)
+            postings.sort(key=len)
+            ids = set(postings[0])
+            for posting in postings[1:]:
+                ids.intersection_update(posting)
+                if not ids:
+                    return []
+            return sorted(p for p in (self._paths[i] for i in ids) if p is not None)
+
+    def search(self, query: str, regex: bool = False, case_sensitive: bool = False,
+               limit: int = 50, max_snippets: int = 5, refresh: bool = True) -> dict:
+        """refresh=False: consulta o índice como está (quem chama já atualizou)."""
+        if not query:
+            return {"results": [], "total": 0, "candidates": 0}
+        if regex:
+            flags = 0 if case_sensitive else re.IGNORECASE
+            pattern = re.compile(query, flags | re.MULTILINE)
+            literals = _required_literals(sre_parse.parse(query, flags))
+        else:
+            pattern = re.compile(re.escape(query), 0 if case_sensitive else re.IGNORECASE)
+            literals = [query]
+        if refresh:
+            self.refresh()
+        candidates = self._candidates(literals)
+
+        hits = []
+        for rel in candidates:
+            try:
+                text = (self.root / rel).read_text(encoding="utf-8", errors="ignore")
+            except OSError:
+                continue
+            count, snippets, line, pos = 0, [], 1, 0
+            for m in pattern.finditer(text):
+                if m.start() == m.end():
+                    continue
+                count += 1
+                if len(snippets) < max_snippets:
+                    line += text.count("\n", pos, m.start())
+                    pos = m.start()
+                    # Outra ocorrência na mesma linha não repete o trecho
+                    if not snippets or snippets[-1]["line"] != line:
+                        start = text.rfind("\n", 0, m.start()) + 1
+                        end = text.find("\n", m.start())
+                        snippets.append({"line": line,
+                                         "text": text[start:end if end != -1 else None][:SNIPPET_CHARS]})
+                if count >= MAX_MATCHES_PER_FILE:
+                    break
+            if count:
+                hits.append((rel, count, len(text), snippets))
+
+        with self._lock:
+            n = max(1, len(self._files))
+            avgdl = max(1.0, self._total_bytes / n)
+        idf = math.log(1 + (n - len(hits) + 0.5) / (len(hits) + 0.5))
+        needle = query if case_sensitive else query.lower()
+        results = []
+        for rel, count, size, snippets in hits:
+            score = idf * count * (BM25_K1 + 1) / (count + BM25_K1 * (1 - BM25_B + BM25_B * size / avgdl))
+            path = rel if case_sensitive else rel.lower()
+            if not regex and needle in path:
+                score += 2.0
+            results.append({"path": rel, "score": round(score, 4), "matches": count, "snippets": snippets})
+        results.sort(key=lambda r: (-r["score"], r["path"]))
+        return {"results": results[:limit], "total": len(results), "candidates": len(candidates)}
+
+
+_lock = threading.Lock()
+_indexes: "OrderedDict[Path, SearchIndex]" = OrderedDict()
+
+
+def get_index(root: Path) -> SearchIndex:
+    root = Path(root).resolve()
+    with _lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = _indexes[root] = SearchIndex(root)
+            while len(_indexes) > MAX_PROJECTS:
+                _indexes.popitem(last=False)
+        _indexes.move_to_end(root)
+        return index
+
+
+def search(root: Path, query: str, **kwargs) -> dict:
+    return get_index(root).search(query, **kwargs)
+
+
+def relevant_files(root: Path, terms: List[str], limit: int = 5, exclude=()) -> List[str]:
+    """Arquivos que mais citam os termos (ex.: nomes nos erros), para o contexto do LLM."""
+    index = get_index(root)
+    # Uma listagem para todos os termos (o auto-fix acabou de gravar: sem esperar o intervalo)
+    index.refresh(force=True)
+    scores: dict = {}
+    for term in dict.fromkeys(t for t in terms if len(t) >= 3):
+        for r in index.search(term, case_sensitive=True, limit=20, max_snippets=0, refresh=False)["results"]:
+            if r["path"] not in exclude:
+                scores[r["path"]] = scores.get(r["path"], 0.0) + r["score"]
+    return [p for p, _ in sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))[:limit]]
@@ -0,0 +1,167 @@
+"""
+GenLab Engine — Shared State
+Estado compartilhado entre os workers do uvicorn (--workers N): configurações
+e cache em SQLite (APP_ROOT/state.sqlite3), locks de arquivo por projeto e
+vagas de limites globais (CPU, slots de backend). Com um worker só, os locks
+e as vagas de arquivo viram no-op.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem flock, modo multi-worker fica só com o SQLite
+    fcntl = None
+
+
+APP_ROOT = Path(os.environ.get("INFINITY_WORKDIR", str(Path.home() / ".infinity_agent"))).resolve()
+DB_PATH = APP_ROOT / "state.sqlite3"
+LOCKS_DIR = APP_ROOT / "locks"
+SLOTS_DIR = APP_ROOT / "slots"
+WORKERS = max(1, int(os.environ.get("AGENT_WORKERS", "1")))
+PRUNE_EVERY = 200
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cache (
+    ns TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (ns, key)
+);
+"""
+
+_local = threading.local()
+_puts = 0
+
+
+def multi_worker() -> bool:
+    return WORKERS > 1
+
+
+def cross_process_locks() -> bool:
+    """Há flock: locks e vagas valem entre workers (no Windows, só dentro de cada um)."""
+    return fcntl is not None
+
+
+def _db() -> sqlite3.Connection:
+    # Uma conexão por thread: leituras não disputam um lock global
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(DB_PATH), timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        _local.conn = conn
+    return conn
+
+
+# ── Configurações ──
+
+def get_setting(key: str, default: Any = None) -> Any:
+    row = _db().execute("SELECT value FROM settings WHERE key = ?", (key,)).fetchone()
+    return json.loads(row[0]) if row else default
+
+
+def setting_version(key: str) -> int:
+    """Muda a cada set_setting(); 0 se a chave não existe."""
+    row = _db().execute("SELECT version FROM settings WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else 0
+
+
+def set_setting(key: str, value: Any) -> int:
+    db = _db()
+    db.execute(
+        "INSERT INTO settings (key, value, version, updated_at) VALUES (?, ?, 1, ?) "
+        "ON CONFLICT (key) DO UPDATE SET value = excluded.value, version = version + 1, "
+        "updated_at = excluded.updated_at",
+        (key, json.dumps(value), time.time()))
+    return setting_version(key)
+
+
+# ── Cache ──
+
+def cache_get(ns: str, key: str) -> Any:
+    row = _db().execute("SELECT value, expires_at FROM cache WHERE ns = ? AND key = ?", (ns, key)).fetchone()
+    if row is None or row[1] < time.time():
+        return None
+    return json.loads(row[0])
+
+
+def cache_put(ns: str, key: str, value: Any, ttl: float) -> None:
+    global _puts
+    db = _db()
+    now = time.time()
+    db.execute("INSERT OR REPLACE INTO cache (ns, key, value, expires_at) VALUES (?, ?, ?, ?)",
+               (ns, key, json.dumps(value), now + ttl))
+    _puts += 1
+    if _puts % PRUNE_EVERY == 0:
+        db.execute("DELETE FROM cache WHERE expires_at < ?", (now,))
+
+
+# ── Locks entre processos ──
+
+@contextmanager
+def file_lock(key: str, mode: str = "write"):
+    """flock compartilhado (read) ou exclusivo (write) em APP_ROOT/locks/<hash>.lock."""
+    if fcntl is None or not multi_worker():
+        yield
+        return
+    LOCKS_DIR.mkdir(parents=True, exist_ok=True)
+    path = LOCKS_DIR / (hashlib.sha1(key.encode()).hexdigest()[:20] + ".lock")
+    with open(path, "a+b") as fh:
+        fcntl.flock(fh.fileno(), fcntl.LOCK_EX if mode == "write" else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+
+# ── Vagas de limites globais ──
+
+class Slot:
+    """Vagas ocupadas; o flock é solto no release() ou quando o processo morre."""
+
+    def __init__(self, files: Optional[List] = None):
+        self._files = files or []
+
+    def release(self) -> None:
+        files, self._files = self._files, []
+        for fh in files:
+            fh.close()
+
+
+def try_slots(key: str, limit: int, count: int = 1) -> Optional[Slot]:
+    """Ocupa count das limit vagas de key (flock em APP_ROOT/slots/); None se não houver."""
+    if fcntl is None or not multi_worker():
+        return Slot()
+    SLOTS_DIR.mkdir(parents=True, exist_ok=True)
+    base = hashlib.sha1(key.encode()).hexdigest()[:20]
+    held: List = []
+    for i in range(limit):
+        fh = open(SLOTS_DIR / f"{base}.{i}.lock", "a+b")
+        try:
+            # flock é por descritor: também separa threads do mesmo processo
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            fh.close()
+            continue
+        held.append(fh)
+        if len(held) == count:
+            return Slot(held)
+    Slot(held).release()
+    return None
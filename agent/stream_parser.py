@@ -0,0 +1,128 @@
+"""
+GenLab Engine — Stream Parser
+Parser JSON incremental: reconhece cada objeto {"path", "content"} assim que
+ele fecha, sem esperar o fim da resposta do LLM.
+"""
+import json
+import re
+from typing import List, Optional
+
+
+# Caracteres relevantes fora de strings; dentro de strings só " e \ importam
+_SPECIAL = re.compile(r'[{}"\\]')
+_IN_STRING = re.compile(r'["\\]')
+
+
+class FileStreamParser:
+    """Alimente com chunks via feed(); cada chamada retorna os arquivos completos novos.
+
+    Arquivos são objetos "folha" (sem objetos aninhados) com chaves path/content,
+    então basta guardar o texto do objeto folha corrente — memória e tempo lineares.
+    """
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self._cand: Optional[List[str]] = None  # texto do objeto folha em aberto
+        self._cand_depth = 0
+        self._parts: List[str] = []
+        self.files: List[dict] = []
+
+    @property
+    def text(self) -> str:
+        """Texto completo recebido até agora."""
+        return "".join(self._parts)
+
+    def feed(self, chunk: str) -> List[dict]:
+        self._parts.append(chunk)
+        found: List[dict] = []
+        pos = 0  # início do trecho ainda não copiado para o candidato
+        i = 0
+        n = len(chunk)
+        if self.escape and n:
+            self.escape = False
+            i = 1
+        while i < n:
+            m = (_IN_STRING if self.in_string else _SPECIAL).search(chunk, i)
+            if m is None:
+                break
+            j = m.start()
+            c = chunk[j]
+            i = j + 1
+            if self.in_string:
+                if c == "\\":
+                    if i < n:
+                        i += 1  # pula o caractere escapado
+                    else:
+                        self.escape = True
+                elif c == '"':
+                    self.in_string = False
+                continue
+            if c == '"':
+                self.in_string = True
+            elif c == "{":
+                self.depth += 1
+                # Um filho novo: o objeto pai deixa de ser folha
+                self._cand = []
+                self._cand_depth = self.depth
+                pos = j
+            elif c == "}":
+                if self._cand is not None and self.depth == self._cand_depth:
+                    self._cand.append(chunk[pos:i])
+                    entry = self._close_candidate()
+                    if entry is not None:
+                        found.append(entry)
+                    pos = i
+                self.depth = max(0, self.depth - 1)
+        if self._cand is not None:
+            self._cand.append(chunk[pos:])
+        self.files.extend(found)
+        return found
+
+    def _close_candidate(self) -> Optional[dict]:
+        raw = "".join(self._cand)
+        self._cand = None
+        try:
+            obj = json.loads(raw)
+        except ValueError:
+            return None
+        if isinstance(obj, dict) and isinstance(obj.get("path"), str) and isinstance(obj.get("content"), str):
+            return obj
+        return None
+
+
+_SPECIAL_SPAN = re.compile(r'[{}\[\]"\\]')
+
+
+def top_level_spans(text: str) -> List[tuple]:
+    """Uma passada, ciente de strings: (início, fim) de cada {...}/[...] de nível 0 fechado."""
+    spans = []
+    depth = 0
+    in_string = False
+    start = 0
+    i = 0
+    n = len(text)
+    while i < n:
+        m = (_IN_STRING if in_string else _SPECIAL_SPAN).search(text, i)
+        if m is None:
+            break
+        j = m.start()
+        c = text[j]
+        i = j + 1
+        if in_string:
+            if c == "\\":
+                i += 1
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c in "{[":
+            if depth == 0:
+                start = j
+            depth += 1
+        elif c in "}]" and depth:
+            depth -= 1
+            if depth == 0:
+                spans.append((start, i))
+    return spans
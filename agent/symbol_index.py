@@ -0,0 +1,384 @@
+"""
+GenLab Engine — Symbol Index
+Tabela de símbolos por projeto (definições, classes, funções, exports e
+imports): ast para Python, scanner de tokens para JS/TS. Primeira construção
+em paralelo; depois só os arquivos alterados são relidos.
+"""
+import ast
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+import batch_analyze
+
+
+APP_ROOT = Path(os.environ.get("INFINITY_WORKDIR", str(Path.home() / ".infinity_agent"))).resolve()
+CACHE_DIR = APP_ROOT / "symbol_cache"
+PY_EXTS = (".py", ".pyi")
+JS_EXTS = (".js", ".jsx", ".mjs", ".cjs", ".ts", ".tsx", ".mts", ".cts")
+MAX_FILE_BYTES = 1_000_000
+MAX_FILES = int(os.environ.get("SYMBOLS_MAX_FILES", "20000"))
+MAX_PROJECTS = int(os.environ.get("SYMBOLS_MAX_PROJECTS", "8"))
+REFRESH_INTERVAL = float(os.environ.get("SYMBOLS_REFRESH_INTERVAL", "2"))
+PARALLEL_MIN_FILES = 200
+SAVE_INTERVAL = 30.0
+CACHE_VERSION = 1
+
+
+# ── Python ──
+
+def _py_symbol(node, kind: str, parent: Optional[str] = None) -> dict:
+    sym = {"name": node.name, "kind": kind, "line": node.lineno}
+    if parent:
+        sym["parent"] = parent
+    return sym
+
+
+def scan_python(text: str) -> dict:
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return {"symbols": [], "imports": [], "error": "syntax"}
+    symbols, imports, exported = [], [], None
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            symbols.append(_py_symbol(node, "function"))
+        elif isinstance(node, ast.ClassDef):
+            symbols.append(_py_symbol(node, "class"))
+            for item in node.body:
+                if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    symbols.append(_py_symbol(item, "method", node.name))
+        elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            for t in targets:
+                if isinstance(t, ast.Name):
+                    if t.id == "__all__" and isinstance(node.value, (ast.List, ast.Tuple)):
+                        exported = {e.value for e in node.value.elts
+                                    if isinstance(e, ast.Constant) and isinstance(e.value, str)}
+                    symbols.append({"name": t.id, "kind": "variable", "line": node.lineno})
+        elif isinstance(node, ast.Import):
+            for a in node.names:
+                imports.append({"module": a.name, "names": [a.asname or a.name.split(".")[0]], "line": node.lineno})
+        elif isinstance(node, ast.ImportFrom):
+            imports.append({"module": "." * node.level + (node.module or ""),
+                            "names": [a.asname or a.name for a in node.names], "line": node.lineno})
+    for sym in symbols:
+        if "parent" not in sym:
+            sym["exported"] = sym["name"] in exported if exported is not None else not sym["name"].startswith("_")
+    return {"symbols": symbols, "imports": imports}
+
+
+# ── JS / TS ──
+
+_JS_TOKEN = re.compile(r"""
+    (?P<nl>\n)
+  | (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<str>'(?:\\.|[^'\\\n])*'|"(?:\\.|[^"\\\n])*")
+  | (?P<tpl>`(?:\\.|[^`\\])*`)
+  | (?P<id>[A-Za-z_$][\w$]*)
+  | (?P<punct>[{}()\[\];,=*<>:])
+""", re.S | re.X)
+
+_JS_DECL = {"function": "function", "class": "class", "const": "variable", "let": "variable",
+            "var": "variable", "interface": "interface", "type": "type", "enum": "enum"}
+
+
+def _js_tokens(text: str):
+    line = 1
+    for m in _JS_TOKEN.finditer(text):
+        kind = m.lastgroup
+        value = m.group()
+        if kind == "nl":
+            line += 1
+            continue
+        if kind in ("comment", "tpl"):
+            line += value.count("\n")
+            continue
+        yield kind, value, line
+
+
+def scan_js(text: str) -> dict:
+    """Scanner de tokens: declarações no nível de topo, exports e imports."""
+    toks = list(_js_tokens(text))
+    symbols, imports = [], []
+    depth = 0
+    i, n = 0, len(toks)
+
+    def at(k: int):
+        return toks[k] if k < n else ("", "", 0)
+
+    while i < n:
+        kind, val, line = toks[i]
+        if kind == "punct":
+            if val == "{":
+                depth += 1
+            elif val == "}":
+                depth = max(0, depth - 1)
+            i += 1
+            continue
+        if kind == "id" and val == "require" and at(i + 1)[1] == "(" and at(i + 2)[0] == "str":
+            imports.append({"module": at(i + 2)[1][1:-1], "names": [], "line": line})
+            i += 3
+            continue
+        if kind != "id" or depth:
+            i += 1
+            continue
+
+        if val == "import" and at(i + 1)[1] != "(":
+            # import x, { a as b } from 'mod'  |  import 'mod'
+            j, names = i + 1, []
+            while j < n and at(j)[0] != "str" and at(j)[1] != ";":
+                if at(j)[0] == "id" and at(j)[1] not in ("from", "as", "type", "import") and at(j + 1)[1] != "as":
+                    names.append(at(j)[1])
+                j += 1
+            if at(j)[0] == "str":
+                imports.append({"module": at(j)[1][1:-1], "names": names, "line": line})
+            i = j + 1
+            continue
+
+        exported = default = False
+        j = i
+        if val == "export":
+            exported = True
+            j += 1
+            if at(j)[1] == "default":
+                default = True
+                j += 1
+            if at(j)[1] in ("{", "*"):
+                # export { a, b as c } [from 'mod']  |  export * from 'mod'
+                k, names = j, []
+                if at(j)[1] == "{":
+                    k = j + 1
+                    while k < n and at(k)[1] != "}":
+                        if at(k)[0] == "id" and at(k)[1] not in ("as", "type"):
+                            if at(k + 1)[1] != "as":
+                                names.append(at(k)[1])
+                        k += 1
+                k += 1
+                if at(k)[1] == "from" and at(k + 1)[0] == "str":
+                    imports.append({"module": at(k + 1)[1][1:-1], "names": names, "line": line, "reexport": True})
+                    k += 2
+                for name in names:
+                    symbols.append({"name": name, "kind": "export", "line": line, "exported": True})
+                i = k
+                continue
+        while at(j)[1] in ("declare", "abstract", "async", "default"):
+            j += 1
+        keyword = at(j)[1]
+        if keyword in _JS_DECL:
+            j += 1
+            if at(j)[1] == "*":
+                j += 1
+            if keyword == "const" and at(j)[1] == "enum":
+                keyword, j = "enum", j + 1
+            if at(j)[0] == "id":
+                symbols.append({"name": at(j)[1], "kind": _JS_DECL[keyword], "line": line, "exported": exported})
+                # const a = 1, b = 2  → só o primeiro nome; destructuring é ignorado
+                i = j + 1
+                continue
+        if default and keyword not in _JS_DECL:
+            symbols.append({"name": "default", "kind": "export", "line": line, "exported": True})
+        i = j + 1 if j > i else i + 1
+    return {"symbols": symbols, "imports": imports}
+
+
+def scan_file(path: str, text: str) -> dict:
+    if path.endswith(PY_EXTS):
+        return scan_python(text)
+    return scan_js(text)
+
+
+def _scan_job(args) -> tuple:
+    """Worker do pool: (rel, abs_path, mtime_ns, size) → (rel, mtime_ns, size, resultado)."""
+    rel, abs_path, mtime_ns, size = args
+    try:
+        with open(abs_path, encoding="utf-8", errors="ignore") as f:
+            text = f.read()
+    except OSError:
+        return rel, mtime_ns, size, None
+    return rel, mtime_ns, size, scan_file(rel, text)
+
+
+# ── Índice ──
+
+class SymbolIndex:
+    def __init__(self, root: Path):
+        self.root = Path(root).resolve()
+        self._lock = threading.RLock()
+        self._files: dict = {}     # rel -> {"mtime_ns", "size", "symbols", "imports"}
+        self._by_name: dict = {}   # nome -> set(rel)
+        self._last_refresh = 0.0
+        self._saved_at = 0.0
+        self._dirty = False
+        self._cache_file = CACHE_DIR / (hashlib.sha256(str(self.root).encode()).hexdigest()[:24] + ".json")
+        self._load()
+        self._saved_at = time.monotonic()
+
+    def _load(self) -> None:
+        try:
+            data = json.loads(self._cache_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        if data.get("version") != CACHE_VERSION or data.get("root") != str(self.root):
+            return
+        for rel, entry in data.get("files", {}).items():
+            self._set(rel, entry)
+
+    def _save(self, force: bool = False) -> None:
+        """Grava o cache em disco (no máximo a cada SAVE_INTERVAL). Entradas velhas no
+        disco não são problema: o mtime/tamanho é conferido ao carregar."""
+        self._dirty = True
+        if not force and time.monotonic() - self._saved_at < SAVE_INTERVAL:
+            return
+        self._saved_at = time.monotonic()
+        self._dirty = False
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = self._cache_file.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps({"version": CACHE_VERSION, "root": str(self.root), "files": self._files}),
+                       encoding="utf-8")
+        os.replace(tmp, self._cache_file)
+
+    def _set(self, rel: str, entry: Optional[dict]) -> None:
+        old = self._files.pop(rel, None)
+        if old:
+            for sym in old["symbols"]:
+                names = self._by_name.get(sym["name"])
+                if names:
+                    names.discard(rel)
+                    if not names:
+                        del self._by_name[sym["name"]]
+        if entry is None:
+            return
+        self._files[rel] = entry
+        for sym in entry["symbols"]:
+            self._by_name.setdefault(sym["name"], set()).add(rel)
+
+    def _stat_sources(self, paths: Iterable[str]) -> dict:
+        out = {}
+        for rel in paths:
+            if not rel.endswith(PY_EXTS + JS_EXTS):
+                continue
+            try:
+                st = (self.root / rel).stat()
+            except OSError:
+                continue
+            if st.st_size <= MAX_FILE_BYTES:
+                out[rel] = (st.st_mtime_ns, st.st_size)
+        return out
+
+    def _scan(self, stats: dict) -> None:
+        jobs = [(rel, str(self.root / rel), m, s) for rel, (m, s) in stats.items()
+                if rel not in self._files or (self._files[rel]["mtime_ns"], self._files[rel]["size"]) != (m, s)]
+        if not jobs:
+            return
+        if len(jobs) >= PARALLEL_MIN_FILES:
+            # Pool spawn de longa duração do batch_analyze: fork aqui copiaria locks, clientes
+            # httpx e conexões SQLite vivos das outras threads
+            results = batch_analyze.pool_map(_scan_job, jobs, chunksize=64)
+        else:
+            results = [_scan_job(j) for j in jobs]
+        for rel, m, s, scanned in results:
+            if scanned is not None:
+                self._set(rel, {"mtime_ns": m, "size": s, **scanned})
+        self._save(force=len(jobs) >= PARALLEL_MIN_FILES)
+
+    def refresh(self, force: bool = False) -> None:
+        """Relista o projeto (no máximo a cada REFRESH_INTERVAL) e relê só o que mudou."""
+        from agent import safe_list_files
+        with self._lock:
+            if not force and time.monotonic() - self._last_refresh < REFRESH_INTERVAL:
+                return
+            stats = self._stat_sources(safe_list_files(self.root, max_files=MAX_FILES))
+            removed = [rel for rel in self._files if rel not in stats]
+            for rel in removed:
+                self._set(rel, None)
+            self._scan(stats)
+            if removed or self._dirty:
+                self._save()
+            self._last_refresh = time.monotonic()
+
+    def update(self, paths: Iterable[str]) -> None:
+        """Chamado após write-file / patch: relê só esses arquivos."""
+        with self._lock:
+            paths = list(paths)
+            stats = self._stat_sources(paths)
+            for rel in paths:
+                if rel not in stats and rel in self._files:
+                    self._set(rel, None)
+            self._scan(stats)
+
+    # ── Consultas ──
+
+    def lookup(self, name: str, prefix: bool = False, kind: Optional[str] = None, limit: int = 200) -> dict:
+        self.refresh()
+        with self._lock:
+            names = [n for n in self._by_name if n.startswith(name)] if prefix else [name]
+            definitions = []
+            for n in sorted(names):
+                for rel in sorted(self._by_name.get(n, ())):
+                    for sym in self._files[rel]["symbols"]:
+                        if sym["name"] == n and (kind is None or sym["kind"] == kind):
+                            definitions.append({"file": rel, **sym})
+            importers = sorted(
+                rel for rel, entry in self._files.items()
+                if any(name in imp["names"] for imp in entry["imports"])
+            ) if not prefix else []
+        return {"name": name, "definitions": definitions[:limit], "total": len(definitions),
+                "imported_by": importers[:limit]}
+
+    def file_symbols(self, rel: str) -> Optional[dict]:
+        self.refresh()
+        with self._lock:
+            entry = self._files.get(rel)
+            if entry is None:
+                return None
+            return {"file": rel, "symbols": entry["symbols"], "imports": entry["imports"],
+                    "error": entry.get("error")}
+
+    def definition_files(self, names: Iterable[str]) -> List[str]:
+        """Arquivos que definem (não só importam) algum dos nomes — contexto preciso para o LLM."""
+        self.refresh()
+        with self._lock:
+            found = []
+            for name in names:
+                for rel in sorted(self._by_name.get(name, ())):
+                    if any(s["name"] == name and s["kind"] != "export" for s in self._files[rel]["symbols"]):
+                        found.append(rel)
+            return list(dict.fromkeys(found))
+
+    def stats(self) -> dict:
+        self.refresh()
+        with self._lock:
+            return {"files": len(self._files), "symbols": sum(len(e["symbols"]) for e in self._files.values()),
+                    "names": len(self._by_name)}
+
+
+_lock = threading.Lock()
+_indexes: "OrderedDict[Path, SymbolIndex]" = OrderedDict()
+
+
+def get_index(root: Path) -> SymbolIndex:
+    root = Path(root).resolve()
+    with _lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = _indexes[root] = SymbolIndex(root)
+            while len(_indexes) > MAX_PROJECTS:
+                _indexes.popitem(last=False)
+        _indexes.move_to_end(root)
+        return index
+
+
+def notify_changed(root: Path, paths: Iterable[str]) -> None:
+    """Atualiza o índice (se já estiver carregado) depois de uma escrita."""
+    root = Path(root).resolve()
+    with _lock:
+        index = _indexes.get(root)
+    if index is not None:
+        index.update(paths)